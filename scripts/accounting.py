@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Accounting
+Gateway calls en geschatte credits per tenant, soort call en dag, met budgetten
+die laag-prioritair werk afremmen vóór de credits echt op zijn
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import date, datetime
+from typing import Dict, Mapping
+
+# Soorten gateway calls
+LOG = "log"
+QUERY = "query"
+SUMMARY = "summary"
+RETRY = "retry"
+HEDGE = "hedge"
+KINDS = (LOG, QUERY, SUMMARY, RETRY, HEDGE)
+
+# Waar de gebruiker op wacht; de rest (geplande samenvattingen, extra pogingen,
+# parallelle kopieën) wijkt als eerste bij een krap budget
+HIGH_PRIORITY = (LOG, QUERY)
+
+# Budget status
+OK = "ok"
+THROTTLED = "throttled"  # boven de zachte grens: alleen nog hoge prioriteit
+EXHAUSTED = "exhausted"  # budget op, of de gateway gaf vandaag een 402
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    tenant TEXT NOT NULL,
+    day TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    calls INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    credits REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant, day, kind)
+);
+CREATE TABLE IF NOT EXISTS credits_exhausted (
+    tenant TEXT PRIMARY KEY,
+    day TEXT NOT NULL
+);
+"""
+
+
+class CreditLedger:
+    """
+    Boekhouding van gateway calls in SQLite (WAL, gedeeld met andere processen)
+
+    Per (tenant, dag, soort) staan calls, fouten en geschatte credits. Alleen
+    geslaagde calls kosten credits (`costs` per soort). Met een dag- of
+    maandbudget gaat de status boven `soft_limit` (fractie) naar THROTTLED:
+    laag-prioritaire soorten worden dan geweigerd, zodat de aanroeper naar de
+    cache, een lokaal antwoord of uitstel kan uitwijken. Op 100% (of na een
+    402 van de gateway, tot het eind van de dag) is de status EXHAUSTED.
+    """
+
+    def __init__(self, path: str, tenant: str, costs: Mapping[str, float] = None,
+                 daily_budget: float = 0, monthly_budget: float = 0, soft_limit: float = 0.8,
+                 busy_timeout: float = 2.0):
+        """
+        Args:
+            path: SQLite bestand
+            tenant: Tenant waarvoor geboekt wordt
+            costs: Geschatte credits per soort call (default 1)
+            daily_budget: Credits per dag (0 = geen budget)
+            monthly_budget: Credits per kalendermaand (0 = geen budget)
+            soft_limit: Fractie van een budget waarboven laag-prioritair werk wijkt
+            busy_timeout: Seconden wachten op een schrijflock van een ander proces
+        """
+        self.path = path
+        self.tenant = tenant
+        self.costs = dict(costs or {})
+        self.daily_budget = daily_budget
+        self.monthly_budget = monthly_budget
+        self.soft_limit = soft_limit
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Eén verbinding per thread (sqlite3 verbindingen zijn niet thread-safe)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def record(self, kind: str, success: bool, credits_exhausted: bool = False, day: date = None):
+        """
+        Boek één gateway call
+
+        Args:
+            kind: Soort call (LOG, QUERY, SUMMARY, RETRY of HEDGE)
+            success: Of de gateway de call uitvoerde (alleen dan kost hij credits)
+            credits_exhausted: De gateway antwoordde 402
+        """
+        day = (day or date.today()).isoformat()
+        cost = self.costs.get(kind, 1) if success else 0
+        try:
+            connection = self._connection()
+            connection.execute(
+                "INSERT INTO usage (tenant, day, kind, calls, errors, credits) VALUES (?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT (tenant, day, kind) DO UPDATE SET calls = calls + 1,"
+                " errors = errors + excluded.errors, credits = credits + excluded.credits",
+                (self.tenant, day, kind, 0 if success else 1, cost))
+            if credits_exhausted:
+                connection.execute("INSERT OR REPLACE INTO credits_exhausted (tenant, day) VALUES (?, ?)",
+                                   (self.tenant, day))
+            elif success:
+                # Een geslaagde call na een 402: er is weer bijgekocht
+                connection.execute("DELETE FROM credits_exhausted WHERE tenant = ?", (self.tenant,))
+        except sqlite3.Error as e:
+            # Boekhouding mag een call nooit breken
+            print(f"⚠️ Kon gateway call niet boeken: {e}")
+
+    def spent(self, day: date = None) -> Dict[str, float]:
+        """Credits van vandaag en van deze maand"""
+        day = day or date.today()
+        try:
+            (today,) = self._connection().execute(
+                "SELECT COALESCE(SUM(credits), 0) FROM usage WHERE tenant = ? AND day = ?",
+                (self.tenant, day.isoformat())).fetchone()
+            (month,) = self._connection().execute(
+                "SELECT COALESCE(SUM(credits), 0) FROM usage WHERE tenant = ? AND day >= ? AND day <= ?",
+                (self.tenant, day.replace(day=1).isoformat(), day.isoformat())).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Kon verbruik niet lezen: {e}")
+            return {"today": 0.0, "month": 0.0}
+        return {"today": today, "month": month}
+
+    def _exhausted_today(self, day: date) -> bool:
+        try:
+            return self._connection().execute(
+                "SELECT 1 FROM credits_exhausted WHERE tenant = ? AND day = ?",
+                (self.tenant, day.isoformat())).fetchone() is not None
+        except sqlite3.Error:
+            return False
+
+    def status(self, day: date = None) -> str:
+        """OK, THROTTLED of EXHAUSTED"""
+        day = day or date.today()
+        if self._exhausted_today(day):
+            return EXHAUSTED
+        if not (self.daily_budget or self.monthly_budget):
+            # Zonder budget is het verbruik niet nodig (scheelt twee sommen per call)
+            return OK
+        spent = self.spent(day)
+        used = max(spent["today"] / self.daily_budget if self.daily_budget else 0.0,
+                   spent["month"] / self.monthly_budget if self.monthly_budget else 0.0)
+        if used >= 1:
+            return EXHAUSTED
+        if used >= self.soft_limit:
+            return THROTTLED
+        return OK
+
+    def allow(self, kind: str, day: date = None) -> bool:
+        """
+        Of een call van deze soort nu naar de gateway mag
+
+        Hoge prioriteit (log, query) mag tot het budget op is; laag-prioritair
+        werk alleen zolang de status OK is. Zonder budget mag alles, behalve
+        laag-prioritair werk op een dag waarop de gateway al 402 gaf.
+        """
+        status = self.status(day)
+        if status == OK:
+            return True
+        if status == THROTTLED:
+            return kind in HIGH_PRIORITY
+        # Na een 402 mag de gebruiker het nog proberen (misschien is er bijgekocht)
+        return kind in HIGH_PRIORITY and not self._over_budget(day or date.today())
+
+    def _over_budget(self, day: date) -> bool:
+        spent = self.spent(day)
+        return bool((self.daily_budget and spent["today"] >= self.daily_budget)
+                    or (self.monthly_budget and spent["month"] >= self.monthly_budget))
+
+    def summary(self, day: date = None) -> Dict:
+        """
+        Returns:
+            Dict met status, budgetten, verbruik (vandaag/maand) en per soort
+            calls, errors en credits van vandaag en van deze maand
+        """
+        day = day or date.today()
+        by_kind = {"today": {}, "month": {}}
+        try:
+            rows = self._connection().execute(
+                "SELECT day, kind, calls, errors, credits FROM usage WHERE tenant = ? AND day >= ? AND day <= ?",
+                (self.tenant, day.replace(day=1).isoformat(), day.isoformat())).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️ Kon verbruik niet lezen: {e}")
+            rows = []
+        for row_day, kind, calls, errors, credits in rows:
+            periods = ("today", "month") if row_day == day.isoformat() else ("month",)
+            for period in periods:
+                totals = by_kind[period].setdefault(kind, {"calls": 0, "errors": 0, "credits": 0.0})
+                totals["calls"] += calls
+                totals["errors"] += errors
+                totals["credits"] += credits
+        spent = self.spent(day)
+        return {
+            "tenant": self.tenant,
+            "status": self.status(day),
+            "daily_budget": self.daily_budget or None,
+            "monthly_budget": self.monthly_budget or None,
+            "spent_today": spent["today"],
+            "spent_month": spent["month"],
+            "remaining_today": max(0.0, self.daily_budget - spent["today"]) if self.daily_budget else None,
+            "remaining_month": max(0.0, self.monthly_budget - spent["month"]) if self.monthly_budget else None,
+            "by_kind": by_kind,
+            "checked_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def close(self):
+        """Sluit de verbinding van deze thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+def ledger_from_config(config: Mapping, path: str, tenant: str) -> CreditLedger:
+    """CreditLedger met kosten en budgetten uit de config"""
+    return CreditLedger(path, tenant, costs=config.get("credit_costs"),
+                        daily_budget=config.get("daily_credit_budget") or 0,
+                        monthly_budget=config.get("monthly_credit_budget") or 0,
+                        soft_limit=config.get("budget_soft_limit", 0.8))
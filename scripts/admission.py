@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Admission Control
+Begrensde wachtrijen en een adaptieve concurrency limiet voor gateway calls,
+zodat een trage gateway het proces niet vastzet
+"""
+
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Mapping, Optional
+
+# Redenen voor afwijzing
+QUEUE_FULL = "queue_full"
+TENANT_QUEUE_FULL = "tenant_queue_full"
+QUEUE_TIMEOUT = "queue_timeout"
+RATE_LIMIT = "rate_limit"  # de lokale rate limiter zou langer laten wachten dan queue_timeout
+
+
+class AdmissionRejected(Exception):
+    """Call niet toegelaten: wachtrij vol of te lang gewacht"""
+
+    def __init__(self, reason: str, queue_time: float = 0.0):
+        super().__init__(f"Gateway overbelast ({reason})")
+        self.reason = reason
+        self.queue_time = queue_time
+
+
+def _queue_time_stats(queue_times: Iterable[float]) -> Dict:
+    """Wachttijd p50/p95/max in ms"""
+    times = sorted(queue_times)
+
+    def percentile(p):
+        if not times:
+            return None
+        return round(times[min(len(times) - 1, int(p * len(times)))] * 1000, 1)
+
+    return {"queue_p50_ms": percentile(0.5), "queue_p95_ms": percentile(0.95),
+            "queue_max_ms": round(times[-1] * 1000, 1) if times else None}
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limiet op basis van de gemeten gateway latency
+
+    Snelle calls verhogen de limiet met ongeveer één per "ronde" (1/limit per
+    call); een overbelaste call (timeout, 5xx, 429) of een call die duidelijk
+    trager is dan normaal verlaagt hem met `backoff`. "Normaal" is een
+    voortschrijdend gemiddelde (EWMA) van de eigen latencies: een gateway die
+    altijd 8 seconden nodig heeft is niet overbelast, en een blijvend tragere
+    gateway wordt vanzelf het nieuwe normaal, zodat de limiet weer herstelt.
+    Verlagen gebeurt hooguit één keer per latency periode, zodat een reeks
+    gelijktijdige timeouts de limiet niet in één klap naar het minimum drukt.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 8,
+                 target_latency: float = 5.0, backoff: float = 0.7, tolerance: float = 2.0,
+                 smoothing: float = 0.1):
+        """
+        Args:
+            initial: Startwaarde van de limiet
+            minimum: Ondergrens
+            maximum: Bovengrens
+            target_latency: Calls sneller dan dit (seconden) gelden nooit als traag
+            backoff: Factor waarmee de limiet bij overbelasting krimpt
+            tolerance: Calls trager dan tolerance × de normale latency gelden als traag
+            smoothing: Gewicht van een nieuwe meting in de normale latency
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.value = float(max(minimum, min(initial, maximum)))
+        self.baseline: Optional[float] = None
+        self._hold_until = 0.0
+
+    @property
+    def limit(self) -> int:
+        return int(self.value)
+
+    def observe(self, latency: float, overloaded: bool = False):
+        now = time.monotonic()
+        slow = False
+        if not overloaded:
+            if self.baseline is None:
+                self.baseline = latency
+            slow = latency > max(self.target_latency, self.tolerance * self.baseline)
+            self.baseline += self.smoothing * (latency - self.baseline)
+        if overloaded or slow:
+            if now >= self._hold_until:
+                self.value = max(float(self.minimum), self.value * self.backoff)
+                self._hold_until = now + latency
+            return
+        self.value = min(float(self.maximum), self.value + 1 / self.value)
+
+
+class AdmissionController:
+    """
+    Laat gateway calls toe binnen de adaptieve limiet, met begrensde wachtrijen
+
+    Calls boven de limiet wachten in een FIFO wachtrij (globaal en per tenant
+    begrensd). Is de wachtrij vol, of duurt het wachten langer dan
+    `queue_timeout`, dan volgt direct AdmissionRejected, zodat de aanroeper
+    snel "het is druk" kan antwoorden in plaats van tot de timeout te hangen.
+    """
+
+    def __init__(self, limit: AdaptiveLimit = None, max_queue: int = 32, max_queue_per_tenant: int = 8,
+                 queue_timeout: float = 10.0, keep: int = 500):
+        """
+        Args:
+            limit: Adaptieve concurrency limiet (default AdaptiveLimit())
+            max_queue: Maximaal aantal wachtende calls in totaal
+            max_queue_per_tenant: Maximaal aantal wachtende calls per tenant
+            queue_timeout: Maximale wachttijd in seconden
+            keep: Aantal recente wachttijden voor de percentielen
+        """
+        self.limit = limit or AdaptiveLimit()
+        self.max_queue = max_queue
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        self._queued_per_tenant: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._queue_times = deque(maxlen=keep)
+        self._counts = {"admitted": 0, "shed": 0, "timed_out": 0, "overloaded": 0}
+
+    def acquire(self, tenant: str = "default", timeout: float = None) -> float:
+        """
+        Wacht op een vrije plek
+
+        Args:
+            tenant: Tenant voor de wachtrij per tenant
+            timeout: Maximale wachttijd (default queue_timeout)
+
+        Returns:
+            Wachttijd in seconden
+
+        Raises:
+            AdmissionRejected: Wachtrij vol of queue_timeout verstreken
+        """
+        started = time.monotonic()
+        with self._cond:
+            if not self._waiters and self.in_flight < self.limit.limit:
+                return self._admit(0.0)
+
+            if len(self._waiters) >= self.max_queue:
+                self._counts["shed"] += 1
+                raise AdmissionRejected(QUEUE_FULL)
+            if self._queued_per_tenant.get(tenant, 0) >= self.max_queue_per_tenant:
+                self._counts["shed"] += 1
+                raise AdmissionRejected(TENANT_QUEUE_FULL)
+
+            waiter = object()
+            self._waiters.append(waiter)
+            self._queued_per_tenant[tenant] = self._queued_per_tenant.get(tenant, 0) + 1
+            try:
+                deadline = started + (self.queue_timeout if timeout is None else timeout)
+                while self._waiters[0] is not waiter or self.in_flight >= self.limit.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._counts["timed_out"] += 1
+                        raise AdmissionRejected(QUEUE_TIMEOUT, time.monotonic() - started)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(waiter)
+                self._queued_per_tenant[tenant] -= 1
+                if not self._queued_per_tenant[tenant]:
+                    del self._queued_per_tenant[tenant]
+                # De volgende in de rij moet opnieuw kijken
+                self._cond.notify_all()
+            return self._admit(time.monotonic() - started)
+
+    def _admit(self, queue_time: float) -> float:
+        self.in_flight += 1
+        self._counts["admitted"] += 1
+        self._queue_times.append(queue_time)
+        return queue_time
+
+    def release(self, latency: float, overloaded: bool = False):
+        """Geef de plek vrij en voed de limiet met de gemeten latency"""
+        with self._cond:
+            self.in_flight -= 1
+            if overloaded:
+                self._counts["overloaded"] += 1
+            self.limit.observe(latency, overloaded)
+            self._cond.notify_all()
+
+    @contextmanager
+    def admit(self, tenant: str = "default", timeout: float = None):
+        """
+        Context manager rond één gateway call
+
+        Een exceptie met `retryable` (timeout, 5xx, 429, transport) telt als
+        teken van overbelasting; andere fouten niet.
+
+        Args:
+            timeout: Maximale wachttijd (default queue_timeout), bijv. wat er na
+                     de rate limiter van queue_timeout over is
+        """
+        self.acquire(tenant, timeout)
+        started = time.monotonic()
+        overloaded = False
+        try:
+            yield
+        except Exception as e:
+            overloaded = bool(getattr(e, "retryable", False))
+            raise
+        finally:
+            self.release(time.monotonic() - started, overloaded)
+
+    def stats(self) -> Dict:
+        """
+        Returns:
+            Dict met limit, normale latency (baseline_ms), in_flight, queued,
+            admitted, shed, timed_out, overloaded en wachttijd p50/p95/max in ms
+        """
+        with self._cond:
+            times = list(self._queue_times)
+            baseline = self.limit.baseline
+            stats = {"limit": self.limit.limit,
+                     "baseline_ms": round(baseline * 1000, 1) if baseline is not None else None,
+                     "in_flight": self.in_flight, "queued": len(self._waiters), **self._counts}
+        stats.update(_queue_time_stats(times))
+        return stats
+
+
+class DeferredQueue:
+    """
+    Begrensde wachtrij per tenant voor werk dat de admission control afwees
+
+    Een vraag kan het beste direct "druk" antwoorden, maar een food log kan
+    wachten: de aanroeper zet hem hier neer en antwoordt "in de wachtrij".
+    Eén worker thread voert het werk uit, het oudste eerst. Wordt een taak
+    opnieuw afgewezen (`retry_on`), dan probeert de worker het na
+    `retry_delay` seconden opnieuw, tot de taak `max_age` seconden oud is.
+    Is de wachtrij van een tenant vol, dan geeft submit None en blijft
+    alleen "druk" over.
+    """
+
+    def __init__(self, max_per_tenant: int = 16, max_age: float = 600.0, retry_delay: float = 1.0,
+                 retry_on: Callable[[BaseException], bool] = None, keep: int = 500):
+        """
+        Args:
+            max_per_tenant: Maximaal aantal wachtende taken per tenant
+            max_age: Seconden na submit waarna een taak niet meer opnieuw geprobeerd wordt
+            retry_delay: Seconden tussen pogingen zolang een taak afgewezen wordt
+            retry_on: Welke fouten "nog steeds druk" betekenen (default: AdmissionRejected)
+            keep: Aantal recente wachttijden voor de percentielen
+        """
+        self.max_per_tenant = max_per_tenant
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+        self.retry_on = retry_on or (lambda error: isinstance(error, AdmissionRejected))
+        self._jobs = deque()
+        self._per_tenant: Dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._queue_times = deque(maxlen=keep)
+        self._counts = {"deferred": 0, "completed": 0, "failed": 0, "expired": 0, "rejected": 0}
+
+    def submit(self, tenant: str, fn: Callable, *args) -> Optional[Future]:
+        """
+        Zet een taak in de wachtrij van een tenant
+
+        Returns:
+            Future met het resultaat van fn(*args), of None als de wachtrij vol is
+        """
+        with self._cond:
+            if self._per_tenant.get(tenant, 0) >= self.max_per_tenant:
+                self._counts["rejected"] += 1
+                return None
+            future = Future()
+            self._jobs.append((tenant, future, fn, args, time.monotonic()))
+            self._per_tenant[tenant] = self._per_tenant.get(tenant, 0) + 1
+            self._counts["deferred"] += 1
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="dailynutri-deferred", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._jobs:
+                    self._cond.wait()
+                # Alleen deze thread haalt taken weg: de oudste blijft staan (en
+                # telt mee voor de grens) tot hij klaar is
+                tenant, future, fn, args, enqueued = self._jobs[0]
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                if not self.retry_on(e):
+                    self._finish("failed", future, enqueued, error=e)
+                elif time.monotonic() - enqueued + self.retry_delay < self.max_age:
+                    time.sleep(self.retry_delay)
+                else:
+                    self._finish("expired", future, enqueued, error=e)
+                continue
+            self._finish("completed", future, enqueued, result=result)
+
+    def _finish(self, outcome: str, future: Future, enqueued: float, result=None, error: BaseException = None):
+        with self._cond:
+            tenant = self._jobs.popleft()[0]
+            self._per_tenant[tenant] -= 1
+            if not self._per_tenant[tenant]:
+                del self._per_tenant[tenant]
+            self._counts[outcome] += 1
+            self._queue_times.append(time.monotonic() - enqueued)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> Dict:
+        """
+        Returns:
+            Dict met pending, deferred, completed, failed, expired, rejected en
+            wachttijd (submit tot afronding) p50/p95/max in ms
+        """
+        with self._cond:
+            times = list(self._queue_times)
+            stats = {"pending": len(self._jobs), **self._counts}
+        stats.update(_queue_time_stats(times))
+        return stats
+
+
+_shared: Optional[AdmissionController] = None
+_shared_deferred: Optional[DeferredQueue] = None
+_shared_lock = threading.Lock()
+
+
+def shared_controller(config: Mapping) -> AdmissionController:
+    """Eén controller per proces, zodat alle clients (tenants) dezelfde limiet delen"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = AdmissionController(
+                AdaptiveLimit(initial=min(4, config["max_concurrency"]), maximum=config["max_concurrency"],
+                              target_latency=config["target_latency"]),
+                max_queue=config["admission_queue"],
+                max_queue_per_tenant=config["admission_queue_per_tenant"],
+                queue_timeout=config["admission_queue_timeout"],
+            )
+        return _shared
+
+
+def shared_deferred(config: Mapping, retry_on: Callable[[BaseException], bool] = None) -> Optional[DeferredQueue]:
+    """Eén uitgestelde wachtrij per proces (None als deferred_queue_per_tenant 0 is)"""
+    global _shared_deferred
+    if not config["deferred_queue_per_tenant"]:
+        return None
+    with _shared_lock:
+        if _shared_deferred is None:
+            _shared_deferred = DeferredQueue(max_per_tenant=config["deferred_queue_per_tenant"],
+                                             max_age=config["deferred_max_age"], retry_on=retry_on)
+        return _shared_deferred
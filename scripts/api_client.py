@@ -5,23 +5,291 @@ Voor food logging en voedingsgeschiedenis queries via natuurlijke taal
 """
 
 import os
+import gzip
 import json
+import time
+import socket
+import threading
 import requests
-from typing import Dict, List, Optional, Union
+from types import MappingProxyType
+from urllib.parse import urlsplit
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Mapping, NamedTuple, Optional, Union
 from datetime import datetime
+from config_loader import load_config, state_path, tenant_id
+from admission import RATE_LIMIT, AdmissionRejected, shared_controller, shared_deferred
+from transport import create_transport
+from shared_cache import SharedCache
+from accounting import LOG, QUERY, SUMMARY, ledger_from_config
+from concurrency import StripedCounter, thread_stripe
+from idempotency import DedupIndex, content_key, idempotency_key, DUPLICATE, PENDING
+from nutrition_memo import NutritionMemo
+
+try:
+    import brotli  # optioneel; urllib3 pakt br responses dan zelf uit
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# Voorkeur voor gecomprimeerde responses; br alleen als we het kunnen uitpakken
+ACCEPT_ENCODING = ("br;q=1.0, gzip;q=0.9, deflate;q=0.5" if brotli is not None
+                   else "gzip;q=1.0, deflate;q=0.5")
+
+
+class DailyNutriAPIError(ValueError):
+    """
+    Basis fout voor gateway calls
+    
+    Subklasse van ValueError, zodat bestaande `except ValueError` blijft werken.
+    `code` is een korte, stabiele naam voor logs en responses; `retryable` zegt
+    of opnieuw proberen (later) zin heeft.
+    """
+    code = "api_error"
+    retryable = False
+    
+    def __init__(self, message: str, status: int = None):
+        super().__init__(message)
+        self.status = status
+
+
+class InvalidRequestError(DailyNutriAPIError):
+    """Ongeldig bericht (leeg, te lang of door de gateway afgewezen, 400)"""
+    code = "invalid_request"
+
+
+class AuthError(DailyNutriAPIError):
+    """Ongeldige of verlopen API key (401)"""
+    code = "auth"
+
+
+class CreditsExhaustedError(DailyNutriAPIError):
+    """AI credits op (402)"""
+    code = "credits"
+
+
+class ForbiddenError(DailyNutriAPIError):
+    """Rol van het account mag de gateway niet gebruiken (403)"""
+    code = "forbidden"
+
+
+class RateLimitedError(DailyNutriAPIError):
+    """Rate limit van de gateway bereikt (429); `retry_after` in seconden"""
+    code = "rate_limited"
+    retryable = True
+    
+    def __init__(self, message: str, status: int = 429, retry_after: float = 60.0):
+        super().__init__(message, status)
+        self.retry_after = retry_after
+
+
+class ServerError(DailyNutriAPIError):
+    """Fout aan de kant van de gateway (5xx)"""
+    code = "server"
+    retryable = True
+
+
+class GatewayTimeoutError(DailyNutriAPIError):
+    """Geen antwoord binnen de timeout"""
+    code = "timeout"
+    retryable = True
+
+
+class TransportError(DailyNutriAPIError):
+    """Geen verbinding of een onleesbaar antwoord"""
+    code = "transport"
+    retryable = True
+
+
+class BudgetExceededError(DailyNutriAPIError):
+    """Lokaal geweigerd: het ingestelde credit budget laat deze soort call niet meer toe"""
+    code = "budget"
+    
+    def __init__(self, message: str, kind: str = None):
+        super().__init__(message)
+        self.kind = kind
+
+
+class OverloadedError(DailyNutriAPIError):
+    """Lokaal afgewezen: te veel calls in de wachtrij (zie admission.py); `reason` zegt welke grens"""
+    code = "overloaded"
+    retryable = True
+    
+    def __init__(self, message: str, reason: str = None):
+        super().__init__(message)
+        self.reason = reason
+
+
+def _retry_after(value) -> float:
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 60.0
+
+
+def error_for_status(response) -> DailyNutriAPIError:
+    """Getypeerde fout voor een niet-200 response"""
+    status = response.status_code
+    if status == 400:
+        return InvalidRequestError(f"Ongeldig request: {response.text}", status)
+    if status == 401:
+        return AuthError("Ongeldige of verlopen API key", status)
+    if status == 402:
+        return CreditsExhaustedError("AI credits op - upgrade je account", status)
+    if status == 403:
+        return ForbiddenError("Rol niet toegestaan (alleen unlimited/admin)", status)
+    if status == 429:
+        retry_after = _retry_after(response.headers.get('Retry-After', 60))
+        return RateLimitedError(f"Rate limit bereikt. Wacht {retry_after:g} seconden", status, retry_after)
+    if status >= 500:
+        return ServerError(f"Serverfout: {response.text}", status)
+    return DailyNutriAPIError(f"Onverwachte status {status}: {response.text}", status)
+
+
+class _RateLimiter:
+    """Sliding window limiter: wacht liever kort lokaal dan een 429 van de gateway"""
+    
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._calls = deque()
+        self._lock = threading.Lock()
+    
+    def wait(self, timeout: float = None) -> bool:
+        """
+        Blokkeer tot er binnen de laatste minuut ruimte is voor een call
+
+        Returns:
+            False (zonder te wachten of een plek te nemen) als dat langer dan
+            `timeout` seconden zou duren
+        """
+        if not self.per_minute:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= 60:
+                    self._calls.popleft()
+                if len(self._calls) < self.per_minute:
+                    self._calls.append(now)
+                    return True
+                delay = 60 - (now - self._calls[0])
+            if deadline is not None and now + delay > deadline:
+                return False
+            time.sleep(delay)
+    
+    def headroom(self) -> float:
+        """Fractie van de minuut-limiet die nog vrij is (1.0 zonder limiet)"""
+        if not self.per_minute:
+            return 1.0
+        with self._lock:
+            now = time.monotonic()
+            recent = sum(1 for t in self._calls if now - t < 60)
+        return max(0.0, 1 - recent / self.per_minute)
+
+class _TransferStats:
+    """Bytes en latency per request, plus totalen sinds de start van de client"""
+    
+    def __init__(self, keep: int = 200, stripes: int = 8):
+        # Per stripe een eigen lock en recente samples, zodat threads niet op elkaar wachten
+        self._recent = [(deque(maxlen=max(1, keep // stripes)), threading.Lock()) for _ in range(stripes)]
+        self._totals = StripedCounter(("requests", "errors", "bytes_sent", "bytes_sent_raw",
+                                       "bytes_received", "bytes_received_raw", "latency_total"))
+    
+    @property
+    def recent(self) -> List[Dict]:
+        """Recente samples van alle threads, oudste eerst"""
+        samples = []
+        for recent, lock in self._recent:
+            with lock:
+                samples.extend(recent)
+        return [sample for _, sample in sorted(samples, key=lambda pair: pair[0])]
+    
+    def record(self, **sample):
+        """Registreer één request (bytes_* op de lijn en uitgepakt, latency in seconden)"""
+        recent, lock = self._recent[thread_stripe(len(self._recent))]
+        with lock:
+            recent.append((time.monotonic(), sample))
+        self._totals.add("requests")
+        if sample.get("status") != 200:
+            self._totals.add("errors")
+        for key in ("bytes_sent", "bytes_sent_raw", "bytes_received", "bytes_received_raw"):
+            if sample.get(key):
+                self._totals.add(key, sample[key])
+        self._totals.add("latency_total", sample.get("latency") or 0.0)
+    
+    def summary(self) -> Dict:
+        """Totalen, compressie ratio's en latency percentielen van recente requests"""
+        totals = self._totals.snapshot()
+        recent = self.recent
+        latencies = sorted(s["latency"] for s in recent if s.get("latency") is not None)
+        encodings = {}
+        for sample in recent:
+            encoding = sample.get("encoding") or "identity"
+            encodings[encoding] = encodings.get(encoding, 0) + 1
+        
+        def percentile(p):
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1) if latencies else None
+        
+        requests_done = totals.pop("requests")
+        latency_total = totals.pop("latency_total")
+        return {
+            "requests": requests_done,
+            **totals,
+            "response_ratio": round(totals["bytes_received"] / totals["bytes_received_raw"], 3)
+                              if totals["bytes_received_raw"] else None,
+            "request_ratio": round(totals["bytes_sent"] / totals["bytes_sent_raw"], 3)
+                             if totals["bytes_sent_raw"] else None,
+            "avg_latency_ms": round(latency_total / requests_done * 1000, 1) if requests_done else None,
+            "p50_latency_ms": percentile(0.5),
+            "p95_latency_ms": percentile(0.95),
+            "response_encodings": encodings,
+        }
+
+
+class RequestConfig(NamedTuple):
+    """
+    Onveranderlijke instellingen voor gateway calls
+
+    Een call leest één snapshot en gebruikt alleen dat; bij een gewijzigde
+    config vervangt de client het geheel, dus een call ziet nooit een half
+    bijgewerkte combinatie van endpoint, key en timeout.
+    """
+    base_url: str
+    timeout: float
+    headers: Mapping[str, str]
+    compress_requests: bool
+    compress_min_bytes: int
+    query_cache_ttl: float
+    pool_size: int
 
 class DailyNutriAPIClient:
-    """Client voor DailyNutri Hapklik API Gateway"""
+    """
+    Client voor DailyNutri Hapklik API Gateway
+    
+    Thread-safe: één client kan vanuit een thread pool gedeeld worden. Request
+    instellingen zijn een onveranderlijk RequestConfig snapshot, en caches,
+    dedup index en tellers zijn over locks per stripe of per thread verdeeld.
+    """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, config: Mapping = None, transport=None):
         """
         Initializeer de API client
         
         Args:
             api_key: Hapklik API key (begint met hk_)
-                    Als None, wordt geprobeerd uit .env te lezen
+                    Als None, wordt geprobeerd uit environment/.env/config.json te lezen
+            config: Configuratie (default: gedeelde config uit config_loader)
+            transport: HTTP laag met send(method, url, headers, body, timeout)
+                       (default: volgens `transport` in de config, zie transport.py)
         """
-        self.base_url = "https://relwosnejsszbqazxywz.supabase.co/functions/v1/api-gateway"
+        # Zonder expliciete config volgt de client wijzigingen in de config bestanden
+        self._follow_config = config is None
+        self.config = config if config is not None else load_config()
+        self._config_lock = threading.Lock()
+        self._explicit_key = bool(api_key)
         
         if api_key:
             self.api_key = api_key
@@ -35,33 +303,87 @@ class DailyNutriAPIClient:
         if not self.api_key.startswith('hk_'):
             print(f"⚠️  Waarschuwing: API key zou moeten beginnen met 'hk_' (huidige: {self.api_key[:10]}...)")
         
-        self.headers = {
-            "Content-Type": "application/json",
-            "X-API-Key": self.api_key
-        }
+        self._apply_config(self.config)
+        
+        # Tenant scheidt caches en indexen per account; zonder config een hash van de key
+        self.tenant = tenant_id(self.config, self.api_key)
+        self.dedup = DedupIndex(
+            state_path(self.config, "dedup_index.json"),
+            window=self.config["dedup_window"]
+        )
+        # Gedeeld met andere processen (bot, cron, agents): query antwoorden en de memo
+        self.cache = SharedCache(state_path(self.config, "cache.sqlite3")) if self.config["shared_cache"] else None
+        self.memo = NutritionMemo(
+            state_path(self.config, "nutrition_memo.json"),
+            max_entries=self.config["memo_max_entries"],
+            cache=self.cache
+        )
+        self._background = None
+        self._background_lock = threading.Lock()
+        self.stats = _TransferStats()
+        self.transport = transport or create_transport(self.config, self.pool_size)
+        self.ready = False
+        # Gedeeld door alle clients in dit proces: begrensde wachtrij en adaptieve limiet
+        self.admission = shared_controller(self.config)
+        # Food logs die de admission control afwees, per tenant begrensd, later alsnog versturen
+        self.deferred = shared_deferred(self.config, retry_on=lambda error: isinstance(error, OverloadedError))
+        # Calls en geschatte credits per soort, met budgetten (gedeeld met andere processen)
+        self.ledger = ledger_from_config(self.config, state_path(self.config, "accounting.sqlite3"), self.tenant)
     
-    def _get_api_key_from_env(self) -> Optional[str]:
-        """Haal API key uit .env file"""
-        env_path = "/config/.openclaw/workspace/.env"
+    def _apply_config(self, config: Mapping):
+        """Neem endpoint, timeout en rate limit over uit de configuratie"""
+        limiter = getattr(self, 'rate_limiter', None)
+        if limiter is None or limiter.per_minute != config["rate_limit"]:
+            self.rate_limiter = _RateLimiter(config["rate_limit"])
+        self.request_config = RequestConfig(
+            base_url=config["api_url"],
+            timeout=config["timeout"],
+            headers=MappingProxyType({"Content-Type": "application/json", "X-API-Key": self.api_key}),
+            compress_requests=config["compress_requests"],
+            compress_min_bytes=config["compress_min_bytes"],
+            query_cache_ttl=config["query_cache_ttl"],
+            pool_size=max(1, config["pool_size"]),
+        )
+        # Als laatste: wie deze config ziet, ziet ook het bijbehorende snapshot
+        self.config = config
+    
+    def _refresh_config(self) -> RequestConfig:
+        """
+        Goedkope check op gewijzigde config (hot reload)
         
-        try:
-            with open(env_path, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if line.startswith('DAILY_NUTRI_API_KEY='):
-                        return line.split('=', 1)[1].strip()
-                    elif line.startswith('Dailynutri_API_KEY='):
-                        return line.split('=', 1)[1].strip()
-                    elif line.startswith('HAPKLIK_API_KEY='):
-                        return line.split('=', 1)[1].strip()
-        except FileNotFoundError:
-            print(f"❌ .env file niet gevonden op {env_path}")
-        except Exception as e:
-            print(f"❌ Fout bij lezen .env: {e}")
-        
-        return None
-    
-    def send_message(self, message: str) -> Dict:
+        Returns:
+            Het RequestConfig snapshot voor de volgende call
+        """
+        if not self._follow_config:
+            return self.request_config
+        config = load_config()
+        if config is self.config:
+            return self.request_config
+        with self._config_lock:
+            if config is not self.config:
+                if not self._explicit_key and config.get("api_key"):
+                    self.api_key = config["api_key"]
+                self.ledger = ledger_from_config(config, self.ledger.path, self.tenant)
+                self._apply_config(config)
+        return self.request_config
+    
+    # Alleen-lezen toegang tot het huidige snapshot (oude attributen)
+    base_url = property(lambda self: self.request_config.base_url)
+    timeout = property(lambda self: self.request_config.timeout)
+    headers = property(lambda self: self.request_config.headers)
+    compress_requests = property(lambda self: self.request_config.compress_requests)
+    compress_min_bytes = property(lambda self: self.request_config.compress_min_bytes)
+    query_cache_ttl = property(lambda self: self.request_config.query_cache_ttl)
+    pool_size = property(lambda self: self.request_config.pool_size)
+    
+    def _get_api_key_from_env(self) -> Optional[str]:
+        """Haal API key uit environment, .env of config.json (gecached door config_loader)"""
+        api_key = self.config.get("api_key")
+        if not api_key:
+            print("❌ Geen API key gevonden in environment, .env of config.json")
+        return api_key
+    
+    def send_message(self, message: str, headers: Dict = None, kind: str = QUERY) -> Dict:
         """
         Stuur een bericht naar de API voor verwerking
         
@@ -69,73 +391,318 @@ class DailyNutriAPIClient:
             message: Bericht in natuurlijke taal (max 1000 tekens)
                     Bijv: "Ik heb een broodje kaas gegeten"
                          of "Wat heb ik gisteren gegeten?"
+            headers: Extra request headers (bijv. Idempotency-Key)
+            kind: Soort call voor de boekhouding (log, query, summary, retry, hedge)
         
         Returns:
             Dict met API response
             
         Raises:
-            ValueError: Als message te lang is of leeg
-            requests.exceptions.RequestException: Bij netwerk/API fouten
+            InvalidRequestError: Als message te lang is of leeg (of 400)
+            BudgetExceededError: Het credit budget laat deze soort call niet meer toe
+            AuthError, CreditsExhaustedError, ForbiddenError: 401, 402, 403
+            RateLimitedError: 429, met retry_after
+            OverloadedError: Te veel calls tegelijk in de lokale wachtrij
+            ServerError: 5xx
+            GatewayTimeoutError, TransportError: Timeout, geen verbinding of ongeldige JSON
         """
         if not message or not message.strip():
-            raise ValueError("Message mag niet leeg zijn")
+            raise InvalidRequestError("Message mag niet leeg zijn")
         
         if len(message) > 1000:
-            raise ValueError(f"Message te lang ({len(message)} tekens, max 1000)")
+            raise InvalidRequestError(f"Message te lang ({len(message)} tekens, max 1000)")
         
         data = {
             "message": message.strip()
         }
         
+        request = self._refresh_config()
+        if not self.ledger.allow(kind):
+            raise BudgetExceededError(f"Credit budget bereikt ({self.ledger.status()}); {kind} call niet verstuurd", kind)
+        # De rate limiter telt mee voor de queue timeout: liever direct "druk" dan een minuut hangen
+        queue_timeout = self.admission.queue_timeout
+        started = time.monotonic()
+        if not self.rate_limiter.wait(queue_timeout):
+            raise OverloadedError(f"Gateway overbelast, probeer het zo opnieuw ({RATE_LIMIT})", RATE_LIMIT)
+        
+        body = json.dumps(data).encode('utf-8')
+        request_headers = {**request.headers, "Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+        raw_size = len(body)
+        if request.compress_requests and raw_size >= request.compress_min_bytes:
+            compressed = gzip.compress(body, compresslevel=6)
+            if len(compressed) < raw_size:
+                body = compressed
+                request_headers["Content-Encoding"] = "gzip"
+        
         try:
-            response = requests.post(
-                self.base_url,
-                headers=self.headers,
-                json=data,
-                timeout=30  # 30 seconden timeout
+            with self.admission.admit(self.tenant, max(0.0, queue_timeout - (time.monotonic() - started))):
+                try:
+                    result = self._post(request, body, request_headers, raw_size)
+                except DailyNutriAPIError as e:
+                    self.ledger.record(kind, success=False, credits_exhausted=e.status == 402)
+                    raise
+                self.ledger.record(kind, success=True)
+                return result
+        except AdmissionRejected as e:
+            raise OverloadedError(f"Gateway overbelast, probeer het zo opnieuw ({e.reason})", e.reason) from None
+    
+    def _post(self, request: RequestConfig, body: bytes, request_headers: Dict, raw_size: int) -> Dict:
+        """Eén POST naar de gateway; zet HTTP en netwerk fouten om naar getypte fouten"""
+        started = time.perf_counter()
+        response = None
+        try:
+            response = self.transport.send(
+                "POST",
+                request.base_url,
+                headers=request_headers,
+                body=body,
+                timeout=request.timeout
             )
+            self._record_transfer(response, started, len(body), raw_size)
             
-            # Handle verschillende status codes
             if response.status_code == 200:
                 return response.json()
-            elif response.status_code == 400:
-                raise ValueError(f"Ongeldig request: {response.text}")
-            elif response.status_code == 401:
-                raise ValueError("Ongeldige of verlopen API key")
-            elif response.status_code == 402:
-                raise ValueError("AI credits op - upgrade je account")
-            elif response.status_code == 403:
-                raise ValueError("Rol niet toegestaan (alleen unlimited/admin)")
-            elif response.status_code == 429:
-                retry_after = response.headers.get('Retry-After', 60)
-                raise ValueError(f"Rate limit bereikt. Wacht {retry_after} seconden")
-            elif response.status_code == 500:
-                raise ValueError(f"Serverfout: {response.text}")
-            else:
-                raise ValueError(f"Onverwachte status {response.status_code}: {response.text}")
+            raise error_for_status(response)
                 
         except requests.exceptions.Timeout:
-            raise ValueError("API timeout na 30 seconden")
+            self._record_transfer(None, started, len(body), raw_size)
+            raise GatewayTimeoutError(f"API timeout na {request.timeout:g} seconden")
         except requests.exceptions.ConnectionError:
-            raise ValueError("Kon geen verbinding maken met API")
+            self._record_transfer(None, started, len(body), raw_size)
+            raise TransportError("Kon geen verbinding maken met API")
         except json.JSONDecodeError:
-            raise ValueError(f"Ongeldige JSON response: {response.text}")
+            # Vóór RequestException: requests' JSONDecodeError is ook een RequestException
+            raise TransportError(f"Ongeldige JSON response: {response.text[:200]}", response.status_code)
+        except requests.exceptions.RequestException as e:
+            raise TransportError(f"Netwerkfout: {e}")
+    
+    def _record_transfer(self, response, started: float, sent: int, sent_raw: int):
+        """Leg bytes op de lijn (voor en na compressie) en latency van een request vast"""
+        sample = {
+            "status": None,
+            "latency": time.perf_counter() - started,
+            "bytes_sent": sent,
+            "bytes_sent_raw": sent_raw,
+            "bytes_received": 0,
+            "bytes_received_raw": 0,
+            "encoding": None,
+        }
+        if response is not None:
+            received_raw = len(response.content)
+            wire = None
+            try:
+                wire = response.raw.tell()  # bytes zoals ontvangen, vóór uitpakken
+            except Exception:
+                pass
+            if not wire:
+                wire = int(response.headers.get('Content-Length') or received_raw)
+            sample.update(
+                status=response.status_code,
+                bytes_received=wire,
+                bytes_received_raw=received_raw,
+                encoding=response.headers.get('Content-Encoding'),
+            )
+        self.stats.record(**sample)
+    
+    def usage(self) -> Dict:
+        """
+        Gateway calls en geschatte credits van deze tenant
+        
+        Returns:
+            Dict met budget status, verbruik vandaag/deze maand en per soort
+            call (log, query, summary, retry, hedge) calls, errors en credits
+        """
+        return self.ledger.summary()
+    
+    def admission_stats(self) -> Dict:
+        """
+        Toelating van gateway calls (gedeeld door alle clients in dit proces)
+        
+        Returns:
+            Dict met de huidige limiet, in_flight, queued, admitted, shed,
+            timed_out, overloaded en wachttijd p50/p95/max in ms; onder
+            "deferred" de uitgestelde food logs (zie defer_log)
+        """
+        stats = self.admission.stats()
+        stats["deferred"] = self.deferred.stats() if self.deferred is not None else None
+        return stats
+    
+    def warm_up(self, connections: int = 1) -> Dict:
+        """
+        Maak de client klaar voor het eerste echte request
+        
+        Laadt config, dedup index en nutrition memo, resolvet de gateway host
+        en opent `connections` keep-alive verbindingen (TCP + TLS) met
+        OPTIONS requests. Die kosten geen credits en tellen niet mee voor de
+        rate limit. Daarna hergebruikt het eerste bericht een open verbinding.
+        
+        Args:
+            connections: Aantal verbindingen in de pool (max pool_size)
+        
+        Returns:
+            Dict met ready, host, dns_ms, connect_ms, connections, caches_ms en error
+        """
+        started = time.perf_counter()
+        request = self._refresh_config()
+        self.dedup.preload()
+        self.memo.preload()
+        report = {
+            "ready": False,
+            "host": urlsplit(request.base_url).hostname,
+            "dns_ms": None,
+            "connect_ms": None,
+            "connections": 0,
+            "caches_ms": round((time.perf_counter() - started) * 1000, 1),
+            "error": None,
+        }
+        
+        url = urlsplit(request.base_url)
+        started = time.perf_counter()
+        try:
+            socket.getaddrinfo(url.hostname, url.port or (443 if url.scheme == "https" else 80),
+                               type=socket.SOCK_STREAM)
+        except OSError as e:
+            report["error"] = f"DNS: {e}"
+            return report
+        report["dns_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        connections = max(1, min(connections, request.pool_size))
+        all_started = threading.Barrier(connections, timeout=request.timeout)
+        
+        def connect():
+            try:
+                response = self.transport.send("OPTIONS", request.base_url,
+                                               headers={"Accept-Encoding": ACCEPT_ENCODING},
+                                               timeout=request.timeout, stream=True)
+            except Exception:
+                all_started.abort()
+                raise
+            # Verbinding bezet houden tot alle requests er een hebben, anders
+            # hergebruikt een latere request een verbinding die al terug is in de pool
+            try:
+                all_started.wait()
+            except threading.BrokenBarrierError:
+                pass
+            response.content  # body lezen zodat de verbinding terug in de pool gaat
+        
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="dailynutri-warmup") as pool:
+            futures = [pool.submit(connect) for _ in range(connections)]
+        for future in futures:
+            error = future.exception()
+            if error is None:
+                report["connections"] += 1
+            else:
+                report["error"] = f"Verbinding: {error}"
+        report["connect_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        report["ready"] = self.ready = report["connections"] > 0
+        return report
+    
+    def transfer_stats(self) -> Dict:
+        """
+        Samenvatting van het netwerkverkeer van deze client
+        
+        Returns:
+            Dict met requests, bytes op de lijn en uitgepakt (verzonden/ontvangen),
+            compressie ratio's, gemiddelde/p50/p95 latency en response encodings
+        """
+        return self.stats.summary()
     
-    def log_food(self, food_description: str) -> Dict:
+    def log_food(self, food_description: str, context: str = None) -> Dict:
         """
         Log food via natuurlijke taal beschrijving
         
+        Identieke logs binnen het dedup window (dubbel tikken, herhaalde
+        request na een timeout) worden niet opnieuw verstuurd; dan komt het
+        eerdere resultaat terug met "duplicate": True.
+        
         Args:
             food_description: Beschrijving van wat gegeten/gedronken is
                             Bijv: "2 boterhammen met pindakaas en een glas melk"
+            context: Optionele maaltijd context, telt mee voor de idempotency key
         
         Returns:
             Dict met logging resultaat
         """
+        key = content_key(self.tenant, food_description, context)
+        status, previous = self.dedup.check(key)
+        if status == DUPLICATE:
+            print(f"♻️ Dubbele log overgeslagen: {food_description}")
+            return {**(previous or {}), "duplicate": True}
+        if status == PENDING:
+            return {
+                "action": "duplicate",
+                "reply": "⏳ Deze log wordt al verwerkt",
+                "duplicate": True
+            }
+        
         print(f"🍎 Food logging: {food_description}")
-        return self.send_message(food_description)
+        headers = {
+            "Idempotency-Key": idempotency_key(self.tenant, food_description, context,
+                                               bucket_seconds=self.config["dedup_window"] or 120)
+        }
+        try:
+            result = self.send_message(food_description, headers=headers, kind=LOG)
+        except Exception:
+            self.dedup.release(key)
+            raise
+        
+        self.dedup.complete(key, result)
+        self.memo.record(self.tenant, food_description, result.get('items') or [])
+        if self.cache is not None:
+            # Nieuwe log: gecachte antwoorden ("wat heb ik vandaag gegeten?") kloppen niet meer
+            self.cache.invalidate("query", tag=self.tenant)
+        return result
+    
+    def lookup_memo(self, food_description: str) -> Optional[Dict]:
+        """
+        Eerder door de gateway teruggegeven items voor deze maaltijd, zonder API call
+        
+        Returns:
+            Dict met items en totalen, of None als de maaltijd nog niet bekend is
+        """
+        return self.memo.lookup(self.tenant, food_description)
+    
+    def submit_log(self, food_description: str, context: str = None) -> Future:
+        """
+        Verstuur een food log op de achtergrond
+        
+        Returns:
+            Future met het resultaat van log_food
+        """
+        with self._background_lock:
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dailynutri-log")
+        return self._background.submit(self.log_food, food_description, context)
+    
+    def defer_log(self, food_description: str, context: str = None) -> Optional[Future]:
+        """
+        Zet een food log die met OverloadedError geweigerd werd in de uitgestelde wachtrij
+        
+        De log gaat later alsnog naar de gateway (met dezelfde dedup en
+        idempotency key), zodat de aanroeper "in de wachtrij" kan antwoorden
+        in plaats van de maaltijd te laten vallen.
+        
+        Returns:
+            Future met het resultaat van log_food, of None als de wachtrij van
+            deze tenant vol is (of uit staat); dan blijft alleen "druk" over
+        """
+        if self.deferred is None:
+            return None
+        future = self.deferred.submit(self.tenant, self.log_food, food_description, context)
+        if future is not None:
+            print(f"⏳ Gateway druk, log in de wachtrij: {food_description}")
+        return future
+    
+    def close(self, wait: bool = True):
+        """Wacht op openstaande achtergrond logs en schrijf opgespaarde memo hits weg"""
+        with self._background_lock:
+            background, self._background = self._background, None
+        if background:
+            background.shutdown(wait=wait)
+        self.memo.flush_hits()
     
-    def query_food_history(self, question: str) -> Dict:
+    def query_food_history(self, question: str, kind: str = QUERY) -> Dict:
         """
         Stel een vraag over voedingsgeschiedenis
         
@@ -144,27 +711,56 @@ class DailyNutriAPIClient:
                     Bijv: "Wat heb ik gisteren gegeten?"
                          "Hoeveel calorieën heb ik vandaag gehad?"
         
+        Antwoorden worden `query_cache_ttl` seconden gedeeld met andere
+        processen (zelfde tenant, zelfde dag) en vervallen bij een nieuwe log.
+        Laat het credit budget de call niet meer toe, dan komt een verlopen
+        antwoord uit de cache terug ("stale": True) als dat er nog is.
+        
+        Args:
+            kind: QUERY voor vragen van de gebruiker, SUMMARY voor samenvattingen
+        
         Returns:
-            Dict met query resultaat
+            Dict met query resultaat ("cached": True als het uit de cache komt)
+        
+        Raises:
+            BudgetExceededError: Budget op en geen (verlopen) antwoord in de cache
         """
+        ttl = self.request_config.query_cache_ttl
+        use_cache = self.cache is not None and ttl
+        if use_cache:
+            key = f"{self.tenant}:{datetime.now().date().isoformat()}:{' '.join(question.lower().split())}"
+            cached = self.cache.get("query", key)
+            if cached is not None:
+                print(f"📊 Query (cache): {question}")
+                return {**cached, "cached": True}
+        
+        if use_cache and not self.ledger.allow(kind):
+            stale = self.cache.get("query", key, allow_expired=True)
+            if stale is not None:
+                print(f"📊 Query (cache, budget): {question}")
+                return {**stale, "cached": True, "stale": True}
+        
         print(f"📊 Query: {question}")
-        return self.send_message(question)
+        result = self.send_message(question, kind=kind)
+        if use_cache and result.get('reply'):
+            self.cache.put("query", key, result, ttl=ttl, tag=self.tenant)
+        return result
     
     def get_today_summary(self) -> Dict:
         """Vraag samenvatting van voeding vandaag"""
-        return self.query_food_history("Geef een samenvatting van mijn voeding van vandaag")
+        return self.query_food_history("Geef een samenvatting van mijn voeding van vandaag", kind=SUMMARY)
     
     def get_yesterday_food(self) -> Dict:
         """Vraag wat er gisteren gegeten is"""
-        return self.query_food_history("Wat heb ik gisteren gegeten?")
+        return self.query_food_history("Wat heb ik gisteren gegeten?", kind=SUMMARY)
     
     def get_calories_today(self) -> Dict:
         """Vraag hoeveel calorieën vandaag geconsumeerd"""
-        return self.query_food_history("Hoeveel calorieën heb ik vandaag gehad?")
+        return self.query_food_history("Hoeveel calorieën heb ik vandaag gehad?", kind=SUMMARY)
     
     def get_protein_this_week(self) -> Dict:
         """Vraag hoeveel eiwit deze week geconsumeerd"""
-        return self.query_food_history("Hoeveel eiwit heb ik deze week gehad?")
+        return self.query_food_history("Hoeveel eiwit heb ik deze week gehad?", kind=SUMMARY)
 
 
 # Helper functies voor eenvoudig gebruik
@@ -182,6 +778,10 @@ def query_food(message: str, api_key: str = None) -> Dict:
 if __name__ == "__main__":
     """Test de API client"""
     import sys
+    from profiling import enable_from_config, pop_profile_flag
+
+    # --profile[=sample|cprofile] of DAILY_NUTRI_PROFILE; SIGUSR1 schakelt tijdens de run
+    enable_from_config("api_client", mode=pop_profile_flag(sys.argv))
     
     def print_usage():
         print("Usage: python api_client.py <command> <message>")
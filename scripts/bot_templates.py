@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Bot Templates
+Voorgecompileerde antwoorden per taal en opmaak van item details voor Telegram
+"""
+
+from functools import lru_cache
+from string import Template
+from typing import Dict, Iterable, List
+
+# Telegram accepteert maximaal 4096 tekens per bericht
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+DEFAULT_LANGUAGE = "nl"
+
+_HELP = {
+    "nl": """🍎 DailyNutri Telegram Commands:
+
+📝 Food Loggen:
+• Stuur gewoon een bericht: "Ik heb een appel gegeten"
+• Of gebruik: /log <beschrijving>
+  Bijv: /log 2 boterhammen met pindakaas
+
+📊 Queries:
+• /query <vraag> - Stel vraag over voeding
+  Bijv: /query Wat heb ik gisteren gegeten?
+• Of stel de vraag direct: "Hoeveel kcal vandaag?"
+• /today - Samenvatting van vandaag
+• /yesterday - Wat gisteren gegeten
+• /calories - Calorieën vandaag
+• /protein - Eiwit deze week
+
+ℹ️ Info:
+• /help - Toon deze help
+• Taal: API antwoordt in je Hapklik profieltaal
+• Meerdere items: "2 eieren, toast en koffie"
+• Specifiek: "150g kipfilet" ipv "kip"
+
+Voorbeelden:
+• "Net een banaan en koffie gehad"
+• "Lunch: salade met kip en dressing"
+• /query Hoeveel calorieën heb ik deze week gehad?
+""",
+    "en": """🍎 DailyNutri Telegram Commands:
+
+📝 Logging food:
+• Just send a message: "I had an apple"
+• Or use: /log <description>
+  E.g.: /log 2 slices of bread with peanut butter
+
+📊 Queries:
+• /query <question> - Ask about your nutrition
+  E.g.: /query What did I eat yesterday?
+• Or ask directly: "How many kcal today?"
+• /today - Summary of today
+• /yesterday - What you ate yesterday
+• /calories - Calories today
+• /protein - Protein this week
+
+ℹ️ Info:
+• /help - Show this help
+• Language: the API answers in your Hapklik profile language
+• Multiple items: "2 eggs, toast and coffee"
+• Be specific: "150g chicken breast" instead of "chicken"
+
+Examples:
+• "Just had a banana and coffee"
+• "Lunch: salad with chicken and dressing"
+• /query How many calories did I have this week?
+""",
+    "fr": """🍎 Commandes Telegram DailyNutri :
+
+📝 Enregistrer un repas :
+• Envoyez simplement un message : "J'ai mangé une pomme"
+• Ou utilisez : /log <description>
+  P.ex. : /log 2 tartines au beurre de cacahuète
+
+📊 Questions :
+• /query <question> - Posez une question sur votre alimentation
+  P.ex. : /query Qu'est-ce que j'ai mangé hier ?
+• Ou demandez directement : "Combien de kcal aujourd'hui ?"
+• /today - Résumé d'aujourd'hui
+• /yesterday - Ce que vous avez mangé hier
+• /calories - Calories aujourd'hui
+• /protein - Protéines cette semaine
+
+ℹ️ Info :
+• /help - Afficher cette aide
+• Langue : l'API répond dans la langue de votre profil Hapklik
+• Plusieurs aliments : "2 œufs, toast et café"
+• Soyez précis : "150g de blanc de poulet" au lieu de "poulet"
+
+Exemples :
+• "Je viens de manger une banane et un café"
+• "Déjeuner : salade au poulet et vinaigrette"
+• /query Combien de calories ai-je eu cette semaine ?
+""",
+    "de": """🍎 DailyNutri Telegram-Befehle:
+
+📝 Essen eintragen:
+• Schick einfach eine Nachricht: "Ich habe einen Apfel gegessen"
+• Oder nutze: /log <Beschreibung>
+  Z.B.: /log 2 Brote mit Erdnussbutter
+
+📊 Fragen:
+• /query <Frage> - Frage zu deiner Ernährung
+  Z.B.: /query Was habe ich gestern gegessen?
+• Oder frag direkt: "Wie viele kcal heute?"
+• /today - Zusammenfassung von heute
+• /yesterday - Was du gestern gegessen hast
+• /calories - Kalorien heute
+• /protein - Eiweiß diese Woche
+
+ℹ️ Info:
+• /help - Diese Hilfe anzeigen
+• Sprache: Die API antwortet in deiner Hapklik-Profilsprache
+• Mehrere Lebensmittel: "2 Eier, Toast und Kaffee"
+• Genau sein: "150g Hähnchenbrust" statt "Hähnchen"
+
+Beispiele:
+• "Gerade eine Banane und Kaffee gehabt"
+• "Mittagessen: Salat mit Hähnchen und Dressing"
+• /query Wie viele Kalorien hatte ich diese Woche?
+""",
+}
+
+_STRINGS: Dict[str, Dict[str, str]] = {
+    "nl": {
+        "empty": "❌ Leeg bericht. Stuur iets als: 'Ik heb een appel gegeten' of '/help' voor commands.",
+        "log_usage": "❌ Geef een beschrijving van wat je gegeten hebt. Bijv: 'Ik heb een broodje kaas gegeten'",
+        "query_usage": "❌ Stel een vraag over je voeding. Bijv: 'Wat heb ik gisteren gegeten?'",
+        "logged": "✅ Genoteerd!",
+        "logged_estimated": "✅ Genoteerd! (geschat op basis van je eerdere logs)",
+        "duplicate": "♻️ Dit had ik al genoteerd, niet dubbel gelogd.",
+        "details_header": "\n\n📋 Details:",
+        "item": "\n• ${name}: ${calories} kcal, ${protein}g eiwit",
+        "unknown_item": "Onbekend",
+        "unexpected_response": "⚠️ ${reply}",
+        "no_answer": "⚠️ Geen antwoord ontvangen",
+        "no_today": "⚠️ Geen data voor vandaag",
+        "no_yesterday": "⚠️ Geen data voor gisteren",
+        "no_calories": "⚠️ Geen calorie data voor vandaag",
+        "no_protein": "⚠️ Geen eiwit data voor deze week",
+        "error": "❌ Fout: ${error}",
+        "unexpected_error": "❌ Onverwachte fout: ${error}",
+        "rate_limited": "⏳ Even te veel berichten. Probeer het over ${seconds} seconden opnieuw.",
+        "auth_error": "🔑 De API key is ongeldig of verlopen. Controleer DAILY_NUTRI_API_KEY.",
+        "credits_exhausted": "💳 Je AI credits zijn op. Upgrade je account om verder te loggen.",
+        "forbidden": "🚫 Je account mag de API niet gebruiken (alleen unlimited/admin).",
+        "gateway_unavailable": "📡 DailyNutri is even niet bereikbaar. Probeer het later opnieuw.",
+        "busy": "⏳ Het is even erg druk. Probeer het over een paar seconden opnieuw.",
+        "queued": "⏳ Het is even druk: je maaltijd staat in de wachtrij en wordt zo gelogd.",
+        "budget_reached": "📉 Het ingestelde creditbudget is bereikt. Verhoog het budget of probeer het later opnieuw.",
+        "food_last": "🍽️ Voor het laatst ${food}: ${when} (${meal}). ${count}× gelogd${period}.",
+        "food_count": "🍽️ ${food}: ${count}× gelogd${period}, op ${days} dagen. Laatst: ${when}.",
+        "food_never": "🔍 Geen ${food} gevonden in je logs${period}.",
+        "period_today": " vandaag",
+        "period_yesterday": " gisteren",
+        "period_week": " deze week",
+        "period_month": " deze maand",
+        "unknown_command": "❌ Onbekend command: ${command}\nGebruik /help voor beschikbare commands.",
+        "not_understood": "🤔 Dat begrijp ik niet (${reason}). Beschrijf wat je gegeten hebt of stuur /help.",
+        "greeting": "👋 Hoi! Vertel wat je gegeten hebt, bijv. 'Ik heb een appel gegeten', of stuur /help.",
+        "thanks": "😊 Graag gedaan!",
+    },
+    "en": {
+        "empty": "❌ Empty message. Send something like: 'I had an apple' or '/help' for commands.",
+        "log_usage": "❌ Describe what you ate. E.g.: 'I had a cheese sandwich'",
+        "query_usage": "❌ Ask a question about your nutrition. E.g.: 'What did I eat yesterday?'",
+        "logged": "✅ Logged!",
+        "logged_estimated": "✅ Logged! (estimated from your earlier logs)",
+        "duplicate": "♻️ I already logged this, not logging it twice.",
+        "details_header": "\n\n📋 Details:",
+        "item": "\n• ${name}: ${calories} kcal, ${protein}g protein",
+        "unknown_item": "Unknown",
+        "unexpected_response": "⚠️ ${reply}",
+        "no_answer": "⚠️ No answer received",
+        "no_today": "⚠️ No data for today",
+        "no_yesterday": "⚠️ No data for yesterday",
+        "no_calories": "⚠️ No calorie data for today",
+        "no_protein": "⚠️ No protein data for this week",
+        "error": "❌ Error: ${error}",
+        "unexpected_error": "❌ Unexpected error: ${error}",
+        "rate_limited": "⏳ Too many messages. Try again in ${seconds} seconds.",
+        "auth_error": "🔑 The API key is invalid or expired. Check DAILY_NUTRI_API_KEY.",
+        "credits_exhausted": "💳 You are out of AI credits. Upgrade your account to keep logging.",
+        "forbidden": "🚫 Your account may not use the API (unlimited/admin only).",
+        "gateway_unavailable": "📡 DailyNutri can't be reached right now. Please try again later.",
+        "busy": "⏳ Things are very busy right now. Try again in a few seconds.",
+        "queued": "⏳ Things are busy: your meal is queued and will be logged shortly.",
+        "budget_reached": "📉 The configured credit budget has been reached. Raise the budget or try again later.",
+        "food_last": "🍽️ Last ${food}: ${when} (${meal}). Logged ${count}×${period}.",
+        "food_count": "🍽️ ${food}: logged ${count}×${period}, on ${days} days. Last: ${when}.",
+        "food_never": "🔍 No ${food} found in your logs${period}.",
+        "period_today": " today",
+        "period_yesterday": " yesterday",
+        "period_week": " this week",
+        "period_month": " this month",
+        "unknown_command": "❌ Unknown command: ${command}\nUse /help for available commands.",
+        "not_understood": "🤔 I don't understand that (${reason}). Describe what you ate or send /help.",
+        "greeting": "👋 Hi! Tell me what you ate, e.g. 'I had an apple', or send /help.",
+        "thanks": "😊 You're welcome!",
+    },
+    "fr": {
+        "empty": "❌ Message vide. Envoyez par exemple : 'J'ai mangé une pomme' ou '/help' pour les commandes.",
+        "log_usage": "❌ Décrivez ce que vous avez mangé. P.ex. : 'J'ai mangé un sandwich au fromage'",
+        "query_usage": "❌ Posez une question sur votre alimentation. P.ex. : 'Qu'est-ce que j'ai mangé hier ?'",
+        "logged": "✅ Enregistré !",
+        "logged_estimated": "✅ Enregistré ! (estimé d'après vos repas précédents)",
+        "duplicate": "♻️ Déjà enregistré, pas de double saisie.",
+        "details_header": "\n\n📋 Détails :",
+        "item": "\n• ${name} : ${calories} kcal, ${protein}g de protéines",
+        "unknown_item": "Inconnu",
+        "unexpected_response": "⚠️ ${reply}",
+        "no_answer": "⚠️ Aucune réponse reçue",
+        "no_today": "⚠️ Pas de données pour aujourd'hui",
+        "no_yesterday": "⚠️ Pas de données pour hier",
+        "no_calories": "⚠️ Pas de données de calories pour aujourd'hui",
+        "no_protein": "⚠️ Pas de données de protéines pour cette semaine",
+        "error": "❌ Erreur : ${error}",
+        "unexpected_error": "❌ Erreur inattendue : ${error}",
+        "rate_limited": "⏳ Trop de messages. Réessayez dans ${seconds} secondes.",
+        "auth_error": "🔑 La clé API est invalide ou expirée. Vérifiez DAILY_NUTRI_API_KEY.",
+        "credits_exhausted": "💳 Vous n'avez plus de crédits IA. Passez à un compte supérieur pour continuer.",
+        "forbidden": "🚫 Votre compte ne peut pas utiliser l'API (unlimited/admin uniquement).",
+        "gateway_unavailable": "📡 DailyNutri est momentanément injoignable. Réessayez plus tard.",
+        "busy": "⏳ Il y a beaucoup de monde en ce moment. Réessayez dans quelques secondes.",
+        "queued": "⏳ Il y a du monde : votre repas est en file d'attente et sera enregistré sous peu.",
+        "budget_reached": "📉 Le budget de crédits configuré est atteint. Augmentez-le ou réessayez plus tard.",
+        "food_last": "🍽️ Dernière fois ${food} : ${when} (${meal}). Noté ${count}×${period}.",
+        "food_count": "🍽️ ${food} : noté ${count}×${period}, sur ${days} jours. Dernière fois : ${when}.",
+        "food_never": "🔍 Aucun(e) ${food} dans vos repas${period}.",
+        "period_today": " aujourd'hui",
+        "period_yesterday": " hier",
+        "period_week": " cette semaine",
+        "period_month": " ce mois-ci",
+        "unknown_command": "❌ Commande inconnue : ${command}\nUtilisez /help pour les commandes disponibles.",
+        "not_understood": "🤔 Je ne comprends pas (${reason}). Décrivez ce que vous avez mangé ou envoyez /help.",
+        "greeting": "👋 Bonjour ! Dites-moi ce que vous avez mangé, p.ex. 'J'ai mangé une pomme', ou envoyez /help.",
+        "thanks": "😊 Avec plaisir !",
+    },
+    "de": {
+        "empty": "❌ Leere Nachricht. Schick z.B.: 'Ich habe einen Apfel gegessen' oder '/help' für Befehle.",
+        "log_usage": "❌ Beschreibe, was du gegessen hast. Z.B.: 'Ich hatte ein Käsebrot'",
+        "query_usage": "❌ Stell eine Frage zu deiner Ernährung. Z.B.: 'Was habe ich gestern gegessen?'",
+        "logged": "✅ Eingetragen!",
+        "logged_estimated": "✅ Eingetragen! (geschätzt anhand deiner früheren Einträge)",
+        "duplicate": "♻️ Schon eingetragen, nicht doppelt gespeichert.",
+        "details_header": "\n\n📋 Details:",
+        "item": "\n• ${name}: ${calories} kcal, ${protein}g Eiweiß",
+        "unknown_item": "Unbekannt",
+        "unexpected_response": "⚠️ ${reply}",
+        "no_answer": "⚠️ Keine Antwort erhalten",
+        "no_today": "⚠️ Keine Daten für heute",
+        "no_yesterday": "⚠️ Keine Daten für gestern",
+        "no_calories": "⚠️ Keine Kaloriendaten für heute",
+        "no_protein": "⚠️ Keine Eiweißdaten für diese Woche",
+        "error": "❌ Fehler: ${error}",
+        "unexpected_error": "❌ Unerwarteter Fehler: ${error}",
+        "rate_limited": "⏳ Zu viele Nachrichten. Versuch es in ${seconds} Sekunden erneut.",
+        "auth_error": "🔑 Der API-Schlüssel ist ungültig oder abgelaufen. Prüfe DAILY_NUTRI_API_KEY.",
+        "credits_exhausted": "💳 Deine KI-Credits sind aufgebraucht. Upgrade dein Konto, um weiter zu loggen.",
+        "forbidden": "🚫 Dein Konto darf die API nicht nutzen (nur unlimited/admin).",
+        "gateway_unavailable": "📡 DailyNutri ist gerade nicht erreichbar. Versuch es später erneut.",
+        "busy": "⏳ Gerade ist viel los. Versuch es in ein paar Sekunden erneut.",
+        "queued": "⏳ Gerade ist viel los: deine Mahlzeit steht in der Warteschlange und wird gleich erfasst.",
+        "budget_reached": "📉 Das eingestellte Credit-Budget ist erreicht. Erhöhe das Budget oder versuch es später erneut.",
+        "food_last": "🍽️ Zuletzt ${food}: ${when} (${meal}). ${count}× erfasst${period}.",
+        "food_count": "🍽️ ${food}: ${count}× erfasst${period}, an ${days} Tagen. Zuletzt: ${when}.",
+        "food_never": "🔍 Kein(e) ${food} in deinen Einträgen${period} gefunden.",
+        "period_today": " heute",
+        "period_yesterday": " gestern",
+        "period_week": " diese Woche",
+        "period_month": " diesen Monat",
+        "unknown_command": "❌ Unbekannter Befehl: ${command}\nNutze /help für verfügbare Befehle.",
+        "not_understood": "🤔 Das verstehe ich nicht (${reason}). Beschreib, was du gegessen hast, oder sende /help.",
+        "greeting": "👋 Hallo! Sag mir, was du gegessen hast, z.B. 'Ich habe einen Apfel gegessen', oder sende /help.",
+        "thanks": "😊 Gern geschehen!",
+    },
+}
+
+# Eenmalig opbouwen bij import, niet per bericht
+_TEMPLATES: Dict[str, Dict[str, Template]] = {
+    language: {key: Template(text) for key, text in strings.items()}
+    for language, strings in _STRINGS.items()
+}
+
+
+def _language(language: str) -> str:
+    return language if language in _TEMPLATES else DEFAULT_LANGUAGE
+
+
+@lru_cache(maxsize=None)
+def static(key: str, language: str = DEFAULT_LANGUAGE) -> str:
+    """Vast antwoord zonder variabelen (help, usage, smalltalk), gecached per taal"""
+    language = _language(language)
+    if key == "help":
+        return _HELP[language]
+    return _STRINGS[language][key]
+
+
+def render(key: str, language: str = DEFAULT_LANGUAGE, **values) -> str:
+    """Vul een template met waarden"""
+    return _TEMPLATES[_language(language)][key].substitute(values)
+
+
+def render_items(items: Iterable[Dict], language: str = DEFAULT_LANGUAGE) -> str:
+    """Details blok voor gelogde items, opgebouwd met één join"""
+    language = _language(language)
+    item = _TEMPLATES[language]["item"]
+    unknown = _STRINGS[language]["unknown_item"]
+    lines = [
+        item.substitute(
+            name=i.get('item_name', unknown),
+            calories=i.get('calories', 0),
+            protein=i.get('protein', 0)
+        )
+        for i in items
+    ]
+    if not lines:
+        return ""
+    return _STRINGS[language]["details_header"] + "".join(lines)
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """
+    Knip een antwoord in stukken die binnen het Telegram limiet passen
+
+    Er wordt bij voorkeur op regelgrenzen geknipt, zodat een item regel
+    nooit over twee berichten verdeeld raakt.
+    """
+    if len(text) <= limit:
+        return [text]
+
+    chunks = []
+    current: List[str] = []
+    size = 0
+    for line in text.split("\n"):
+        # Een enkele regel langer dan het limiet hard opknippen
+        while len(line) > limit:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            chunks.append(line[:limit])
+            line = line[limit:]
+
+        extra = len(line) + (1 if current else 0)
+        if size + extra > limit:
+            chunks.append("\n".join(current))
+            current, size = [line], len(line)
+        else:
+            current.append(line)
+            size += extra
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
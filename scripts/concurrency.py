@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Concurrency
+Hulpmiddelen voor gebruik vanuit thread pools: tellers en locks verdeeld over
+stripes, zodat threads elkaar niet op één lock laten wachten
+"""
+
+import itertools
+import threading
+import zlib
+from typing import Dict, Iterable
+
+# Aantal stripes; ruim boven het aantal cores, zodat botsingen zeldzaam zijn
+STRIPES = 16
+
+_thread_numbers = itertools.count()
+_thread_slot = threading.local()
+
+
+def thread_stripe(stripes: int = STRIPES) -> int:
+    """
+    Stripe van de huidige thread
+
+    Threads krijgen bij hun eerste gebruik een volgnummer, dus een pool van
+    N threads is gelijk verdeeld over de stripes (thread idents zelf zijn
+    adressen met steeds dezelfde laagste bits).
+    """
+    number = getattr(_thread_slot, "number", None)
+    if number is None:
+        number = _thread_slot.number = next(_thread_numbers)
+    return number % stripes
+
+
+def key_stripe(key: str, stripes: int = STRIPES) -> int:
+    """Stripe van een key, stabiel tussen processen (anders dan hash())"""
+    return zlib.crc32(key.encode('utf-8')) % stripes
+
+
+class StripedCounter:
+    """
+    Tellers verdeeld over stripes met elk een eigen lock
+
+    Elke thread telt in zijn eigen stripe; alleen `snapshot` loopt alle stripes
+    langs. Namen hoeven niet vooraf bekend te zijn.
+    """
+
+    def __init__(self, names: Iterable[str] = (), stripes: int = STRIPES):
+        """
+        Args:
+            names: Tellers die in snapshot altijd voorkomen (ook als ze 0 zijn)
+            stripes: Aantal stripes
+        """
+        self._names = tuple(names)
+        self._stripes = [({}, threading.Lock()) for _ in range(stripes)]
+
+    def add(self, name: str, amount: float = 1):
+        """Verhoog een teller"""
+        counts, lock = self._stripes[thread_stripe(len(self._stripes))]
+        with lock:
+            counts[name] = counts.get(name, 0) + amount
+
+    def snapshot(self) -> Dict[str, float]:
+        """Som van alle stripes per teller"""
+        totals = dict.fromkeys(self._names, 0)
+        for counts, lock in self._stripes:
+            with lock:
+                for name, value in counts.items():
+                    totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def __getitem__(self, name: str) -> float:
+        return self.snapshot().get(name, 0)
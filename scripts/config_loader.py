@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Configuratie
+Eén plek voor configuratie uit environment, .env en config.json, met caching en hot reload
+"""
+
+import os
+import json
+import hashlib
+import threading
+import time
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional, Tuple
+
+WORKSPACE_DIR = "/config/.openclaw/workspace"
+DEFAULT_ENV_FILE = os.path.join(WORKSPACE_DIR, ".env")
+DEFAULT_CONFIG_FILE = os.path.join(WORKSPACE_DIR, "dailynutri", "config", "config.json")
+
+DEFAULTS = {
+    "api_key": None,
+    "api_url": "https://relwosnejsszbqazxywz.supabase.co/functions/v1/api-gateway",
+    "timeout": 30.0,
+    "rate_limit": 60,  # requests per minuut, 0 = geen limiet
+    "language": "nl",
+    "compress_requests": False,  # gzip request bodies (gateway moet Content-Encoding ondersteunen)
+    "compress_min_bytes": 1024,  # kleinere bodies gaan ongecomprimeerd
+    "pool_size": 4,  # keep-alive verbindingen naar de gateway
+    "transport": "http",  # http, record of replay (zie transport.py)
+    "cassette": None,  # JSONL cassette voor record/replay
+    "replay_latency": False,  # bij replay de opgenomen latency naspelen
+    # Admission control (admission.py): adaptieve limiet op gelijktijdige gateway calls
+    "max_concurrency": 8,  # bovengrens van de limiet
+    "target_latency": 5.0,  # seconden; snellere calls verlagen de limiet nooit (zie AdaptiveLimit)
+    "admission_queue": 32,  # wachtende calls in totaal, daarboven direct "druk"
+    "admission_queue_per_tenant": 8,  # wachtende calls per tenant
+    "admission_queue_timeout": 10.0,  # maximale wachttijd in de rij
+    "deferred_queue_per_tenant": 16,  # afgewezen food logs die per tenant later verstuurd worden, 0 = uit
+    "deferred_max_age": 600.0,  # seconden dat een uitgestelde log opnieuw geprobeerd wordt
+    "log_file": os.path.join(WORKSPACE_DIR, "dailynutri", "logs", "food_log.jsonl"),
+    "max_log_entries": 0,  # maximaal aantal ruwe entries, 0 = alleen retention_days
+    "retention_days": 30,  # dagen dat entries ruw blijven; ouder gaat naar archief + dag aggregaten
+    "tenant": None,  # None = afgeleid van de API key
+    "dedup_window": 120,  # seconden waarin een identieke log als dubbel geldt, 0 = uit
+    "memo_max_entries": 500,  # beschrijvingen in de nutrition memo
+    "shared_cache": True,  # query antwoorden en memo in cache.sqlite3, gedeeld tussen processen
+    "query_cache_ttl": 300.0,  # seconden dat een query antwoord hergebruikt wordt, 0 = uit
+    # Geschatte credits per geslaagde gateway call en budgetten (0 = geen budget)
+    "credit_costs": {"log": 1, "query": 1, "summary": 1, "retry": 1, "hedge": 1},
+    "daily_credit_budget": 0.0,
+    "monthly_credit_budget": 0.0,
+    "budget_soft_limit": 0.8,  # fractie van een budget waarboven laag-prioritair werk wijkt
+    "service_address": None,  # lokale service: "unix:<pad>" of "host:port" (default: logs/service.sock)
+    "use_service": True,  # wrappers en CLI gebruiken een draaiende service als die er is
+    "local_totals": False,  # totaalvragen (kcal/eiwit per dag/week/maand) uit het lokale rollup index
+    "local_food_search": False,  # "wanneer/hoe vaak at ik X?" uit het lokale zoekindex
+    "event_queue_size": 1000,  # wachtrij per event consumer (opslaan, metrics)
+    "aggregate_window": 3.0,  # seconden waarin losse berichten één maaltijd worden, 0 = uit
+    # Geplande jobs voor de in-process scheduler (openclaw_integration.py scheduler)
+    "schedules": [
+        {"job": "summary", "at": "20:00"},
+        {"job": "report", "at": "20:30", "weekday": 6},
+    ],
+    "schedule_spread": 1800,  # seconden waarover tenants verspreid worden
+    # Profiling (zie profiling.py); "" = uit, alleen via SIGUSR1 aan te zetten
+    "profile": "",  # sample of cprofile
+    "profile_dir": None,  # None = profiles/ naast de food log
+    "profile_format": "speedscope",  # speedscope of collapsed
+    "profile_interval": 0.005,  # seconden tussen stack samples
+    "profile_window": 0.0,  # seconden per profielbestand, 0 = één per run
+}
+
+# Namen waaronder de API key in environment of .env mag staan (eerste wint)
+API_KEY_NAMES = ("DAILY_NUTRI_API_KEY", "Dailynutri_API_KEY", "HAPKLIK_API_KEY")
+
+# Environment variabele -> config sleutel
+ENV_OVERRIDES = {
+    "DAILY_NUTRI_API_URL": "api_url",
+    "DAILY_NUTRI_TIMEOUT": "timeout",
+    "DAILY_NUTRI_RATE_LIMIT": "rate_limit",
+    "DAILY_NUTRI_LANGUAGE": "language",
+    "DAILY_NUTRI_COMPRESS_REQUESTS": "compress_requests",
+    "DAILY_NUTRI_POOL_SIZE": "pool_size",
+    "DAILY_NUTRI_TRANSPORT": "transport",
+    "DAILY_NUTRI_CASSETTE": "cassette",
+    "DAILY_NUTRI_REPLAY_LATENCY": "replay_latency",
+    "DAILY_NUTRI_MAX_CONCURRENCY": "max_concurrency",
+    "DAILY_NUTRI_TARGET_LATENCY": "target_latency",
+    "DAILY_NUTRI_ADMISSION_QUEUE": "admission_queue",
+    "DAILY_NUTRI_DEFERRED_QUEUE": "deferred_queue_per_tenant",
+    "DAILY_NUTRI_LOG_FILE": "log_file",
+    "DAILY_NUTRI_MAX_LOG_ENTRIES": "max_log_entries",
+    "DAILY_NUTRI_RETENTION_DAYS": "retention_days",
+    "DAILY_NUTRI_TENANT": "tenant",
+    "DAILY_NUTRI_DEDUP_WINDOW": "dedup_window",
+    "DAILY_NUTRI_SHARED_CACHE": "shared_cache",
+    "DAILY_NUTRI_QUERY_CACHE_TTL": "query_cache_ttl",
+    "DAILY_NUTRI_AGGREGATE_WINDOW": "aggregate_window",
+    "DAILY_NUTRI_EVENT_QUEUE_SIZE": "event_queue_size",
+    "DAILY_NUTRI_LOCAL_TOTALS": "local_totals",
+    "DAILY_NUTRI_LOCAL_FOOD_SEARCH": "local_food_search",
+    "DAILY_NUTRI_SERVICE_ADDRESS": "service_address",
+    "DAILY_NUTRI_DAILY_CREDIT_BUDGET": "daily_credit_budget",
+    "DAILY_NUTRI_MONTHLY_CREDIT_BUDGET": "monthly_credit_budget",
+    "DAILY_NUTRI_BUDGET_SOFT_LIMIT": "budget_soft_limit",
+    "DAILY_NUTRI_USE_SERVICE": "use_service",
+    "DAILY_NUTRI_SCHEDULE_SPREAD": "schedule_spread",
+    "DAILY_NUTRI_PROFILE": "profile",
+    "DAILY_NUTRI_PROFILE_DIR": "profile_dir",
+    "DAILY_NUTRI_PROFILE_FORMAT": "profile_format",
+    "DAILY_NUTRI_PROFILE_WINDOW": "profile_window",
+}
+
+
+def parse_env_file(path: str) -> Dict[str, str]:
+    """Lees KEY=value regels uit een .env bestand"""
+    values = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            key = key.strip()
+            if key.startswith('export '):
+                key = key[len('export '):].strip()
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+                value = value[1:-1]
+            values[key] = value
+    return values
+
+
+def _coerce(key: str, value):
+    """Zet string waarden om naar het type van de default"""
+    default = DEFAULTS.get(key)
+    if value is None or default is None or not isinstance(value, str):
+        return value
+    if isinstance(default, bool):
+        return value.strip().lower() in ('1', 'true', 'yes', 'ja')
+    if isinstance(default, int):
+        return int(value)
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+class ConfigLoader:
+    """
+    Combineert configuratie bronnen en houdt het resultaat in cache
+
+    Volgorde (hoogste eerst): environment variabelen, .env bestand,
+    config.json, defaults. Bestanden worden alleen opnieuw gelezen als hun
+    mtime of grootte verandert; die stat check gebeurt hooguit eens per
+    `check_interval` seconden.
+    """
+
+    def __init__(self, env_file: str = None, config_file: str = None, check_interval: float = 1.0):
+        """
+        Args:
+            env_file: Pad naar .env (default: DAILY_NUTRI_ENV_FILE of de workspace .env)
+            config_file: Pad naar config.json (default: DAILY_NUTRI_CONFIG_FILE of de workspace config)
+            check_interval: Minimaal aantal seconden tussen twee stat checks
+        """
+        self.env_file = env_file or os.environ.get("DAILY_NUTRI_ENV_FILE", DEFAULT_ENV_FILE)
+        self.config_file = config_file or os.environ.get("DAILY_NUTRI_CONFIG_FILE", DEFAULT_CONFIG_FILE)
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        self._config: Optional[Mapping] = None
+        self._signature: Optional[Tuple] = None
+        self._env_snapshot: Optional[Tuple] = None
+        self._next_check = 0.0
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    @staticmethod
+    def _environ_snapshot() -> Tuple:
+        names = API_KEY_NAMES + tuple(ENV_OVERRIDES)
+        return tuple(os.environ.get(name) for name in names)
+
+    def get(self) -> Mapping:
+        """
+        Huidige configuratie (read-only mapping)
+
+        Returns:
+            Mapping met api_key, api_url, timeout, rate_limit, language,
+            log_file, max_log_entries en alle extra sleutels uit config.json
+        """
+        now = time.monotonic()
+        config = self._config
+        if config is not None and now < self._next_check:
+            return config
+
+        with self._lock:
+            signature = (self._stat(self.env_file), self._stat(self.config_file))
+            env_snapshot = self._environ_snapshot()
+            if (self._config is None or signature != self._signature
+                    or env_snapshot != self._env_snapshot):
+                self._config = self._load()
+                self._signature = signature
+                self._env_snapshot = env_snapshot
+            self._next_check = now + self.check_interval
+            return self._config
+
+    def reload(self) -> Mapping:
+        """Forceer opnieuw lezen bij de volgende get()"""
+        with self._lock:
+            self._config = None
+        return self.get()
+
+    def _load(self) -> Mapping:
+        config = dict(DEFAULTS)
+
+        # 1. config.json (geschreven door setup.py)
+        try:
+            with open(self.config_file, 'r') as f:
+                file_config = json.load(f)
+            if isinstance(file_config, dict):
+                config.update(file_config)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Kon {self.config_file} niet lezen: {e}")
+
+        # 2. .env en 3. environment; environment wint
+        try:
+            dotenv = parse_env_file(self.env_file)
+        except FileNotFoundError:
+            dotenv = {}
+        except OSError as e:
+            print(f"❌ Fout bij lezen .env: {e}")
+            dotenv = {}
+
+        for source in (dotenv, os.environ):
+            for name in API_KEY_NAMES:
+                if source.get(name):
+                    config["api_key"] = source[name].strip()
+                    break
+            for name, key in ENV_OVERRIDES.items():
+                if source.get(name):
+                    config[key] = source[name]
+
+        for key in list(config):
+            try:
+                config[key] = _coerce(key, config[key])
+            except ValueError:
+                print(f"⚠️ Ongeldige waarde voor {key}: {config[key]!r}, default gebruikt")
+                config[key] = DEFAULTS[key]
+
+        return MappingProxyType(config)
+
+
+_default_loader: Optional[ConfigLoader] = None
+_default_loader_lock = threading.Lock()
+
+
+def get_loader() -> ConfigLoader:
+    """Gedeelde loader voor dit proces"""
+    global _default_loader
+    if _default_loader is None:
+        with _default_loader_lock:
+            if _default_loader is None:
+                _default_loader = ConfigLoader()
+    return _default_loader
+
+
+def load_config() -> Mapping:
+    """Huidige configuratie via de gedeelde loader"""
+    return get_loader().get()
+
+
+def store_paths(config: Mapping) -> Tuple[str, Optional[str]]:
+    """
+    Pad van de food log en van een eventueel oud JSON array bestand
+
+    Oudere config.json bestanden verwijzen naar food_log.json; de store
+    gebruikt dan food_log.jsonl ernaast en migreert het oude bestand.
+    """
+    log_file = config["log_file"]
+    if log_file.endswith(".json"):
+        return log_file + "l", log_file
+    if log_file.endswith(".jsonl"):
+        return log_file, log_file[:-1]
+    return log_file, None
+
+
+def state_path(config: Mapping, name: str) -> str:
+    """Pad voor een hulpbestand (indexen, caches) naast de food log"""
+    return os.path.join(os.path.dirname(config["log_file"]), name)
+
+
+def tenant_id(config: Mapping, api_key: str = None) -> str:
+    """Tenant uit de config, anders een hash van de API key"""
+    if config.get("tenant"):
+        return config["tenant"]
+    api_key = api_key or config.get("api_key")
+    if not api_key:
+        return "default"
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
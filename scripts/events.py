@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Events
+Interne event bus: na een gateway antwoord gaan opslaan, metrics en andere
+nabewerking op de achtergrond, zodat de gebruiker niet op de schijf wacht
+"""
+
+import atexit
+import queue
+import threading
+import time
+import weakref
+from typing import Callable, Dict, Iterable, Tuple
+from concurrency import StripedCounter
+
+# Events
+MEAL_LOGGED = "meal_logged"
+QUERY_ANSWERED = "query_answered"
+LOG_FAILED = "log_failed"
+
+# Wat er gebeurt als de wachtrij van een consumer vol is
+BLOCK = "block"  # emit wacht (voor consumers die niets mogen missen, zoals de store writer)
+DROP = "drop"  # event vervalt en wordt geteld (metrics, caches)
+
+_STOP = object()
+
+# Open bussen; bij het afsluiten van het proces worden hun wachtrijen leeggewerkt
+_buses: "weakref.WeakSet[EventBus]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all():
+    for bus in list(_buses):
+        bus.flush()
+
+
+class _Subscriber:
+    """Eén consumer met een eigen begrensde wachtrij en worker thread"""
+
+    def __init__(self, name: str, handler: Callable[[str, Dict], None], events: Iterable[str],
+                 queue_size: int, overflow: str):
+        self.name = name
+        self.handler = handler
+        self.events = set(events)
+        self.overflow = overflow
+        self.queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        # processed en errors telt de worker, dropped elke thread die emit
+        self.counts = StripedCounter(("processed", "dropped", "errors"))
+        self.max_lag_ms = 0.0
+        self.thread = threading.Thread(target=self._run, name=f"dailynutri-events-{name}", daemon=True)
+        self.thread.start()
+
+    def offer(self, event: str, payload: Dict):
+        item = (event, payload, time.monotonic())
+        if self.overflow == BLOCK:
+            self.queue.put(item)
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.counts.add("dropped")
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is _STOP:
+                    return
+                event, payload, queued_at = item
+                self.max_lag_ms = max(self.max_lag_ms, (time.monotonic() - queued_at) * 1000)
+                try:
+                    self.handler(event, payload)
+                    self.counts.add("processed")
+                except Exception as e:
+                    self.counts.add("errors")
+                    print(f"⚠️ Event consumer {self.name} faalde op {event}: {e}")
+            finally:
+                self.queue.task_done()
+
+
+class EventBus:
+    """
+    Publiceert events naar consumers die elk in een eigen thread draaien
+
+    Elke consumer heeft een begrensde FIFO wachtrij, dus volgorde per consumer
+    blijft behouden en een trage consumer houdt de andere niet op. Bij het
+    afsluiten van het proces worden alle wachtrijen eerst leeggewerkt.
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        """
+        Args:
+            queue_size: Default grootte van de wachtrij per consumer
+        """
+        self.queue_size = queue_size
+        # Copy-on-write: emit leest de tuple zonder lock, alleen (un)subscribe schrijft
+        self._subscribers: Tuple[_Subscriber, ...] = ()
+        self._lock = threading.Lock()
+        self._emitted = StripedCounter()
+        _buses.add(self)
+
+    def subscribe(self, name: str, handler: Callable[[str, Dict], None], events: Iterable[str],
+                  queue_size: int = None, overflow: str = DROP):
+        """
+        Registreer een consumer
+
+        Args:
+            name: Naam voor stats en foutmeldingen
+            handler: Functie (event, payload)
+            events: Events waarop de consumer reageert
+            queue_size: Grootte van de wachtrij (default: die van de bus)
+            overflow: BLOCK of DROP als de wachtrij vol is
+        """
+        subscriber = _Subscriber(name, handler, events, queue_size or self.queue_size, overflow)
+        with self._lock:
+            self._subscribers = self._subscribers + (subscriber,)
+
+    def emit(self, event: str, payload: Dict):
+        """Publiceer een event; keert direct terug (behalve bij een volle BLOCK wachtrij)"""
+        self._emitted.add(event)
+        for subscriber in self._subscribers:
+            if event in subscriber.events:
+                subscriber.offer(event, payload)
+
+    def flush(self, names: Iterable[str] = None):
+        """Wacht tot de wachtrijen (van alle consumers, of van `names`) leeg zijn"""
+        for subscriber in self._subscribers:
+            if names is not None and subscriber.name not in names:
+                continue
+            if subscriber.thread.is_alive():
+                subscriber.queue.join()
+
+    def close(self):
+        """Werk alles af en stop de worker threads"""
+        self.flush()
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, ()
+        for subscriber in subscribers:
+            subscriber.queue.put(_STOP)
+            subscriber.thread.join()
+
+    def stats(self) -> Dict:
+        """
+        Returns:
+            Dict met emitted per event en per consumer queued, processed,
+            dropped, errors en max_lag_ms
+        """
+        return {
+            "emitted": self._emitted.snapshot(),
+            "consumers": {
+                s.name: {"queued": s.queue.qsize(), **s.counts.snapshot(), "max_lag_ms": round(s.max_lag_ms, 1)}
+                for s in self._subscribers
+            },
+        }
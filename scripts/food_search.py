@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Food Search
+Lokaal full-text index (SQLite FTS5) over gelogde items en maaltijdbeschrijvingen,
+zodat "wanneer at ik voor het laatst zalm?" zonder gateway call beantwoord wordt
+"""
+
+import os
+import re
+import difflib
+import sqlite3
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from bot_templates import DEFAULT_LANGUAGE, render, static
+from intent_router import normalize
+from rollup import question_period
+
+# Vragen
+LAST = "last"  # wanneer voor het laatst
+COUNT = "count"  # hoe vaak
+
+# Minimale lengte van een zoekterm voor prefix en substring matches; kortere
+# woorden ("ei") matchen alleen exact, anders telt "ei" ook eierkoek mee
+MIN_SUBSTRING = 4
+# Minimale gelijkenis (difflib ratio) voor een tikfout match
+FUZZY_CUTOFF = 0.75
+MAX_FUZZY_TERMS = 5
+
+# unicode61 met remove_diacritics vouwt accenten weg (crème = creme, Käse = kase),
+# net als intent_router.normalize; prefix indexen maken "zalm*" goedkoop
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS food_items (
+    id INTEGER PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    meal_key TEXT NOT NULL,
+    day TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    context TEXT,
+    item_name TEXT,
+    description TEXT,
+    calories REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS food_items_meal ON food_items (tenant, meal_key);
+CREATE INDEX IF NOT EXISTS food_items_day ON food_items (tenant, day);
+CREATE VIRTUAL TABLE IF NOT EXISTS food_fts USING fts5 (
+    item_name, description, content='food_items', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS food_vocab USING fts5vocab (food_fts, row);
+CREATE TRIGGER IF NOT EXISTS food_items_ai AFTER INSERT ON food_items BEGIN
+    INSERT INTO food_fts (rowid, item_name, description) VALUES (new.id, new.item_name, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS food_items_ad AFTER DELETE ON food_items BEGIN
+    INSERT INTO food_fts (food_fts, rowid, item_name, description)
+    VALUES ('delete', old.id, old.item_name, old.description);
+END;
+CREATE TABLE IF NOT EXISTS food_search_meta (
+    tenant TEXT PRIMARY KEY,
+    built_at TEXT
+);
+"""
+
+
+def food_search_path(log_path: str) -> str:
+    """SQLite bestand met het zoekindex naast de food log"""
+    base = log_path[:-len(".jsonl")] if log_path.endswith(".jsonl") else log_path
+    return base + ".search.sqlite3"
+
+
+def _day(value: Union[date, str, None]) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value[:10] if value else None
+    return value.isoformat()
+
+
+def _rows_of(entry: Dict) -> Optional[Tuple[str, List[Tuple]]]:
+    """
+    (meal_key, records) voor een geslaagde log entry, of None
+
+    Eén record per item (naam en calorieën) plus één record met de beschrijving
+    van de maaltijd, zodat die maar één keer in het index staat.
+    """
+    api_result = entry.get('api_result') or {}
+    timestamp = str(entry.get('timestamp') or '')
+    if not entry.get('success') or not timestamp:
+        return None
+    meal_key = str(api_result.get('meal_id') or timestamp)
+    day, context = timestamp[:10], entry.get('context')
+    records = [(meal_key, day, timestamp, context, None, entry.get('description') or '', 0)]
+    for item in api_result.get('items') or []:
+        if item.get('item_name'):
+            records.append((meal_key, day, timestamp, context, item['item_name'], None,
+                            item.get('calories', 0) or 0))
+    return meal_key, records
+
+
+class FoodSearchIndex:
+    """
+    Full-text index over gelogde items in SQLite FTS5 (WAL mode)
+
+    Woorden worden Unicode-bewust gesplitst en zonder accenten opgeslagen, dus
+    Nederlandse, Engelse, Franse en Duitse namen zoeken hetzelfde. Een zoekwoord
+    matcht als prefix ("appel" → appels, appeltaart), als deel van een
+    samenstelling ("lachs" → räucherlachs) en met een tikfout ("zlam" → zalm);
+    die varianten komen uit de woordenlijst van het index, niet uit de entries.
+    Het index wordt per geslaagde log bijgewerkt (`add`) en kan altijd opnieuw
+    uit de ruwe store en het archief opgebouwd worden (`rebuild`).
+    """
+
+    def __init__(self, path: str, tenant: str = None, busy_timeout: float = 5.0):
+        """
+        Args:
+            path: SQLite bestand (zie food_search_path)
+            tenant: Tenant voor lezen en schrijven (None = alleen mark_stale)
+            busy_timeout: Seconden wachten op een schrijflock van een ander proces
+        """
+        self.path = path
+        self.tenant = tenant
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Eén verbinding per thread (sqlite3 verbindingen zijn niet thread-safe)
+
+        Raises:
+            sqlite3.OperationalError: SQLite zonder FTS5
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    @property
+    def built(self) -> bool:
+        """Of het index (voor deze tenant) volledig is opgebouwd"""
+        return self._connection().execute(
+            "SELECT 1 FROM food_search_meta WHERE tenant = ? AND built_at IS NOT NULL",
+            (self.tenant,)).fetchone() is not None
+
+    def mark_stale(self):
+        """Laat de volgende gebruiker het index opnieuw opbouwen (bijv. na een import)"""
+        self._connection().execute("UPDATE food_search_meta SET built_at = NULL")
+
+    def add(self, entry: Dict) -> bool:
+        """
+        Voeg een nieuwe log entry toe
+
+        Mislukte logs en maaltijden die er al in staan (zelfde meal_id) worden overgeslagen.
+
+        Returns:
+            True als de entry toegevoegd is
+        """
+        rows = _rows_of(entry)
+        if rows is None:
+            return False
+        meal_key, records = rows
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            if connection.execute("SELECT 1 FROM food_items WHERE tenant = ? AND meal_key = ? LIMIT 1",
+                                  (self.tenant, meal_key)).fetchone():
+                connection.execute("COMMIT")
+                return False
+            self._insert(connection, records)
+            connection.execute("COMMIT")
+            return True
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def rebuild(self, entries: Iterable[Dict], built_at: str = None) -> int:
+        """
+        Bouw het index van deze tenant opnieuw op uit alle log entries
+
+        Args:
+            entries: Alle entries (archief en ruwe log), in willekeurige volgorde
+            built_at: Tijdstip van de opbouw, voor food_search_meta
+
+        Returns:
+            Aantal geïndexeerde maaltijden
+        """
+        meals: Dict[str, List[Tuple]] = {}
+        for entry in entries:
+            rows = _rows_of(entry)
+            if rows is not None:
+                meals.setdefault(*rows)
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM food_items WHERE tenant = ?", (self.tenant,))
+            for records in meals.values():
+                self._insert(connection, records)
+            connection.execute("INSERT OR REPLACE INTO food_search_meta (tenant, built_at) VALUES (?, ?)",
+                               (self.tenant, built_at or date.today().isoformat()))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return len(meals)
+
+    def _insert(self, connection: sqlite3.Connection, records: List[Tuple]):
+        connection.executemany(
+            "INSERT INTO food_items (tenant, meal_key, day, timestamp, context, item_name, description,"
+            " calories) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [(self.tenant, *record) for record in records])
+
+    def expand(self, text: str) -> List[Set[str]]:
+        """
+        Zoektermen per woord: het woord zelf, en alleen als dat niets vindt de
+        woorden uit het index die het als deel van een samenstelling bevatten
+        of er met een tikfout op lijken (anders telt "kaas" ook "haas" mee)
+
+        Returns:
+            Per zoekwoord een set termen (search zoekt termen vanaf
+            MIN_SUBSTRING letters ook als prefix)
+        """
+        words = normalize(text).split()
+        if not words:
+            return []
+        vocabulary = [term for (term,) in self._connection().execute("SELECT term FROM food_vocab")]
+        known = set(vocabulary)
+        expanded = []
+        for word in words:
+            terms = {word}
+            exact = word in known or (len(word) >= MIN_SUBSTRING
+                                      and any(term.startswith(word) for term in vocabulary))
+            if not exact:
+                if len(word) >= MIN_SUBSTRING:
+                    terms.update(term for term in vocabulary if word in term)
+                candidates = [term for term in vocabulary if abs(len(term) - len(word)) <= 2]
+                terms.update(difflib.get_close_matches(word, candidates, n=MAX_FUZZY_TERMS,
+                                                       cutoff=FUZZY_CUTOFF))
+            expanded.append(terms)
+        return expanded
+
+    def search(self, text: str, start: Union[date, str] = None, end: Union[date, str] = None,
+               limit: int = 10) -> Dict:
+        """
+        Maaltijden waarin alle woorden van `text` voorkomen (in items of omschrijving), nieuwste eerst
+
+        Args:
+            text: Item of omschrijving, bijv. "zalm" of "griekse yoghurt"
+            start: Eerste dag (inclusief, date of YYYY-MM-DD)
+            end: Laatste dag (exclusief)
+            limit: Maximaal aantal maaltijden in matches
+
+        Returns:
+            Dict met query, terms, count (aantal maaltijden), days, first en last
+            (timestamps) en matches: lijst met timestamp, day, context,
+            description, items (gevonden itemnamen) en calories
+        """
+        expanded = self.expand(text)
+        result = {"query": text, "terms": sorted(set().union(*expanded)) if expanded else [],
+                  "count": 0, "days": 0, "first": None, "last": None, "matches": []}
+        if not expanded:
+            return result
+
+        def term_query(terms: Set[str]) -> str:
+            # Lange termen ook als prefix: "zlam" → zalm → zalmfilet
+            quoted = [('"%s"*' if len(term) >= MIN_SUBSTRING else '"%s"') % term.replace('"', '""')
+                      for term in sorted(terms)]
+            return "(" + " OR ".join(quoted) + ")"
+
+        # CROSS JOIN: eerst de FTS match en dan de records, niet alle records van de tenant langs FTS
+        query = ("SELECT i.id, i.meal_key, i.timestamp, i.day, i.context, i.item_name, i.calories"
+                 " FROM food_fts CROSS JOIN food_items i ON i.id = food_fts.rowid"
+                 " WHERE food_fts MATCH ? AND i.tenant = ?")
+        params: List = [self.tenant]
+        if start is not None:
+            query += " AND i.day >= ?"
+            params.append(_day(start))
+        if end is not None:
+            query += " AND i.day < ?"
+            params.append(_day(end))
+
+        # Per woord matchen en op maaltijd samenvoegen: "kip rijst" vindt ook een
+        # maaltijd waarin kip en rijst losse items zijn
+        meals: Optional[Dict[str, Dict]] = None
+        matched_items: Set[int] = set()
+        for terms in expanded:
+            found: Dict[str, Dict] = {}
+            for row_id, meal_key, timestamp, day, context, item_name, calories in \
+                    self._connection().execute(query, [term_query(terms), *params]):
+                meal = found.setdefault(meal_key, {"timestamp": timestamp, "day": day, "context": context,
+                                                   "items": [], "calories": 0.0})
+                if item_name and row_id not in matched_items:
+                    matched_items.add(row_id)
+                    meal["items"].append(item_name)
+                    meal["calories"] += calories
+            if meals is None:
+                meals = found
+                continue
+            for meal_key in list(meals):
+                if meal_key not in found:
+                    del meals[meal_key]
+                    continue
+                for name in found[meal_key]["items"]:
+                    meals[meal_key]["items"].append(name)
+                meals[meal_key]["calories"] += found[meal_key]["calories"]
+
+        ordered = sorted(meals.items(), key=lambda pair: pair[1]["timestamp"], reverse=True)
+        for meal_key, meal in ordered[:limit]:
+            (description,) = self._connection().execute(
+                "SELECT description FROM food_items WHERE tenant = ? AND meal_key = ? AND item_name IS NULL",
+                (self.tenant, meal_key)).fetchone() or ("",)
+            meal["description"] = description
+            meal["calories"] = round(meal["calories"], 1)
+            result["matches"].append(meal)
+        result["count"] = len(meals)
+        result["days"] = len({meal["day"] for meal in meals.values()})
+        if ordered:
+            result["last"] = ordered[0][1]["timestamp"]
+            result["first"] = ordered[-1][1]["timestamp"]
+        return result
+
+    def close(self):
+        """Sluit de verbinding van deze thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class FoodQuestion(NamedTuple):
+    """Herkende vraag over een item"""
+    kind: str  # LAST of COUNT
+    food: str
+    period: Optional[str] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+
+_COUNT_QUESTION = re.compile(r"^(hoe vaak|hoeveel keer|how often|how many times|combien de fois|wie oft|"
+                             r"wie viele male|wie viel mal)\b")
+_LAST_QUESTION = re.compile(r"^(wanneer|when|quand|wann)\b")
+_EAT_VERB = re.compile(r"\b(gegeten|gedronken|eten|drinken|at|dronk|had|gehad|eat|ate|eaten|drink|drank|"
+                       r"drunk|have|mange|manger|bu|boire|gegessen|getrunken|essen|trinken|ass)\b")
+_ORIGINAL_WORD = re.compile(r"[^\W_]+")
+# Vraagwoorden, hulpwerkwoorden, lidwoorden en periodes; wat overblijft is het item
+_FILLER = set("""
+    wanneer hoe vaak hoeveel keer keren heb hebt hebben had ik je jij at dronk voor het laatst laatste
+    de een mijn welke deze week maand vandaag gisteren gegeten gedronken gehad eten drinken ooit al nog
+    op dag er wel
+    when did do i you last time times eat ate eaten have had drink drank drunk how often many the a an
+    some my this week month today yesterday ever was it
+    quand ai j je tu mange manger bu boire pour la derniere fois combien de du des le les l un une ce
+    cette semaine mois aujourd hui hier
+    wann habe hab ich du zuletzt das letzte mal male gegessen getrunken essen trinken ass wie oft viele
+    viel den die der ein eine einen diese diesen woche monat heute gestern
+""".split())
+
+
+def food_question(question: str, today: date = None) -> Optional[FoodQuestion]:
+    """
+    Herken "wanneer at ik voor het laatst X?" of "hoe vaak heb ik X gegeten?"
+    (NL/EN/FR/DE), eventueel beperkt tot vandaag, gisteren, deze week of deze maand
+
+    Returns:
+        FoodQuestion, of None als het geen vraag over een item is
+    """
+    text = normalize(question)
+    if _COUNT_QUESTION.match(text):
+        kind = COUNT
+    elif _LAST_QUESTION.match(text):
+        kind = LAST
+    else:
+        return None
+    if not _EAT_VERB.search(text):
+        return None
+    # Het item in de woorden van de gebruiker (met accenten), voor het antwoord
+    food = " ".join(word for word in _ORIGINAL_WORD.findall(question.lower())
+                    if not set(normalize(word).split()) <= _FILLER)
+    if not food:
+        return None
+    period = question_period(text, today)
+    if period is None:
+        return FoodQuestion(kind, food)
+    return FoodQuestion(kind, food, *period)
+
+
+def food_reply(question: FoodQuestion, result: Dict, language: str = DEFAULT_LANGUAGE) -> str:
+    """Antwoord op een FoodQuestion uit een search resultaat, in de taal van de bot"""
+    period = static("period_" + question.period, language) if question.period else ""
+    if not result["count"]:
+        return render("food_never", language, food=question.food, period=period)
+    last = result["matches"][0]
+    when = last["timestamp"][:16].replace("T", " ")
+    if question.kind == LAST:
+        meal = last["description"] or ", ".join(last["items"])
+        return render("food_last", language, food=question.food, when=when, meal=meal,
+                      count=result["count"], period=period)
+    return render("food_count", language, food=question.food, count=result["count"], period=period,
+                  days=result["days"], when=when)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Idempotency
+Deterministische idempotency keys en lokale deduplicatie van food logs
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from concurrency import STRIPES, key_stripe
+from log_store import FileLock, atomic_write
+
+NEW = "new"
+DUPLICATE = "duplicate"
+PENDING = "pending"
+
+
+def normalize_description(text: str) -> str:
+    """Kleine letters en enkele spaties, zodat kleine tikverschillen dezelfde key geven"""
+    return " ".join((text or "").lower().split()).strip(" .!")
+
+
+def content_key(tenant: str, description: str, context: str = None) -> str:
+    """Key voor de inhoud van een log, onafhankelijk van tijd"""
+    raw = "\x1f".join((tenant or "", normalize_description(description), (context or "").lower()))
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def idempotency_key(tenant: str, description: str, context: str = None,
+                    bucket_seconds: int = 120, now: float = None) -> str:
+    """
+    Idempotency-Key header voor de gateway
+
+    Dezelfde tenant, beschrijving en context binnen hetzelfde tijdvak geven
+    dezelfde key, zodat een herhaalde request door de gateway herkend kan worden.
+    """
+    bucket = int((now if now is not None else time.time()) // max(bucket_seconds, 1))
+    raw = f"{content_key(tenant, description, context)}:{bucket}"
+    return "dn-" + hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+class _Segment:
+    """Deel van de index met een eigen lock (lock striping op de content key)"""
+
+    __slots__ = ("entries", "pending", "lock")
+
+    def __init__(self):
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.pending = set()
+        self.lock = threading.Lock()
+
+
+class DedupIndex:
+    """
+    Begrensde index van recent verstuurde logs
+
+    Een log met dezelfde inhoud binnen `window` seconden wordt niet opnieuw
+    verstuurd; de aanroeper krijgt het eerdere resultaat terug. Met een `path`
+    wordt de index gedeeld met andere processen (cron, CLI, bot).
+
+    Veilig vanuit thread pools: keys zijn over segmenten met elk een eigen lock
+    verdeeld, en gelijktijdige logs worden in één write naar het gedeelde
+    bestand gebundeld in plaats van elk op de file lock te wachten.
+    """
+
+    def __init__(self, path: str = None, window: float = 120, max_entries: int = 1000,
+                 segments: int = STRIPES):
+        """
+        Args:
+            path: Optioneel JSON bestand om de index tussen processen te delen
+            window: Seconden waarbinnen een identieke log als dubbel geldt
+            max_entries: Maximale grootte van de index
+            segments: Aantal segmenten (elk met max_entries / segments entries)
+        """
+        self.path = path
+        self.window = window
+        self.max_entries = max_entries
+        self._segments = [_Segment() for _ in range(max(1, segments))]
+        self._segment_max = max(1, -(-max_entries // len(self._segments)))
+        self._file_lock = threading.Lock()
+        self._file_stat = None
+        # Nog niet weggeschreven entries; één thread tegelijk schrijft ze allemaal
+        self._unsaved: Dict[str, Dict] = {}
+        self._unsaved_lock = threading.Lock()
+        self._writer = threading.Lock()
+
+    def _segment(self, key: str) -> _Segment:
+        return self._segments[key_stripe(key, len(self._segments))]
+
+    def _prune(self, segment: _Segment, now: float):
+        entries = segment.entries
+        while entries:
+            key, entry = next(iter(entries.items()))
+            if now - entry["ts"] < self.window and len(entries) <= self._segment_max:
+                break
+            entries.popitem(last=False)
+
+    def _load_shared(self):
+        """Neem entries van andere processen over als het bestand gewijzigd is"""
+        if not self.path:
+            return
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._file_stat:
+            return
+        with self._file_lock:
+            if stat == self._file_stat:
+                return
+            try:
+                with open(self.path, 'r') as f:
+                    shared = json.load(f)
+            except (OSError, ValueError):
+                return
+            self._file_stat = stat
+        for key, entry in sorted(shared.items(), key=lambda kv: kv[1]["ts"]):
+            segment = self._segment(key)
+            with segment.lock:
+                current = segment.entries.get(key)
+                if current is None or current["ts"] < entry["ts"]:
+                    segment.entries[key] = entry
+                    segment.entries.move_to_end(key)
+
+    def _save_shared(self, key: str, entry: Dict):
+        if not self.path:
+            return
+        with self._unsaved_lock:
+            self._unsaved[key] = entry
+        while self._writer.acquire(blocking=False):
+            try:
+                with self._unsaved_lock:
+                    batch, self._unsaved = self._unsaved, {}
+                if batch:
+                    self._write_shared(batch)
+            finally:
+                self._writer.release()
+            # Wat tijdens het schrijven binnenkwam, schrijft deze thread ook nog weg
+            with self._unsaved_lock:
+                if not self._unsaved:
+                    return
+
+    def _write_shared(self, batch: Dict[str, Dict]):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with FileLock(self.path + ".lock", timeout=2.0):
+                try:
+                    with open(self.path, 'r') as f:
+                        shared = json.load(f)
+                except (OSError, ValueError):
+                    shared = {}
+                shared.update(batch)
+                now = time.time()
+                shared = {k: v for k, v in shared.items() if now - v["ts"] < self.window}
+                if len(shared) > self.max_entries:
+                    newest = sorted(shared.items(), key=lambda kv: kv[1]["ts"])[-self.max_entries:]
+                    shared = dict(newest)
+                atomic_write(self.path, json.dumps(shared, default=str).encode('utf-8'))
+                # Eigen write niet opnieuw inlezen; alles wat erin staat zit al in de segmenten
+                st = os.stat(self.path)
+                with self._file_lock:
+                    self._file_stat = (st.st_mtime_ns, st.st_size)
+        except Exception as e:
+            print(f"⚠️ Kon dedup index niet opslaan: {e}")
+
+    def preload(self):
+        """Lees het gedeelde bestand nu al in (warm-up), in plaats van bij het eerste gebruik"""
+        self._load_shared()
+
+    def check(self, key: str) -> Tuple[str, Optional[Dict]]:
+        """
+        Controleer een content key en reserveer hem als hij nieuw is
+
+        Returns:
+            (NEW, None) als de log verstuurd mag worden,
+            (DUPLICATE, resultaat) als hij recent al verstuurd is,
+            (PENDING, None) als dezelfde log op dit moment verstuurd wordt
+        """
+        if not self.window:
+            return NEW, None
+
+        now = time.time()
+        self._load_shared()
+        segment = self._segment(key)
+        with segment.lock:
+            self._prune(segment, now)
+            if key in segment.pending:
+                return PENDING, None
+            entry = segment.entries.get(key)
+            if entry and now - entry["ts"] < self.window:
+                return DUPLICATE, entry.get("result")
+            segment.pending.add(key)
+            return NEW, None
+
+    def complete(self, key: str, result: Dict):
+        """Registreer een geslaagde log"""
+        if not self.window:
+            return
+        entry = {"ts": time.time(), "result": result}
+        segment = self._segment(key)
+        with segment.lock:
+            segment.pending.discard(key)
+            segment.entries[key] = entry
+            segment.entries.move_to_end(key)
+            self._prune(segment, entry["ts"])
+        self._save_shared(key, entry)
+
+    def release(self, key: str):
+        """Geef een reservering vrij na een mislukte log, zodat opnieuw proberen kan"""
+        segment = self._segment(key)
+        with segment.lock:
+            segment.pending.discard(key)
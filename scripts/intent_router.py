@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Intent Router
+Lokale pre-classificatie van berichten (NL/EN/FR/DE) vóór er een API call gedaan wordt
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Intents
+LOG = "log"
+QUERY = "query"
+GREETING = "greeting"
+THANKS = "thanks"
+HELP = "help"
+JUNK = "junk"
+EMPTY = "empty"
+
+MAX_MESSAGE_LENGTH = 1000
+
+# Zinsdelen waarmee een bericht begint; matchen gebeurt op woorden zonder accenten
+_PREFIX_PHRASES: Dict[str, Dict[str, List[str]]] = {
+    QUERY: {
+        "nl": ["wat heb ik", "wat at ik", "hoeveel", "wanneer", "hoe vaak", "hoe veel",
+               "heb ik vandaag", "heb ik gisteren", "heb ik deze week", "geef een samenvatting",
+               "geef me", "toon", "laat zien", "overzicht", "samenvatting"],
+        "en": ["what did i", "what have i", "how many", "how much", "how often", "when did i",
+               "when was", "did i", "have i", "show me", "give me", "summary", "summarize"],
+        "fr": ["qu est ce que j ai", "qu ai je", "combien", "quand", "est ce que j ai",
+               "montre", "resume"],
+        "de": ["was habe ich", "was hab ich", "wie viel", "wieviel", "wie viele", "wann",
+               "wie oft", "habe ich heute", "zeig mir", "zusammenfassung"],
+    },
+    GREETING: {
+        "nl": ["hoi", "hallo", "hey", "goedemorgen", "goedemiddag", "goedenavond", "dag", "yo"],
+        "en": ["hi", "hello", "hey there", "good morning", "good afternoon", "good evening"],
+        "fr": ["bonjour", "salut", "bonsoir", "coucou"],
+        "de": ["guten morgen", "guten tag", "guten abend", "servus", "moin", "gruss gott"],
+    },
+    THANKS: {
+        "nl": ["dank je", "dankjewel", "dank u", "bedankt"],
+        "en": ["thank you", "thanks", "thx", "cheers"],
+        "fr": ["merci"],
+        "de": ["danke", "vielen dank"],
+    },
+    HELP: {
+        "nl": ["help", "hulp", "wat kan je", "wat kun je", "hoe werkt"],
+        "en": ["what can you", "how does this work", "how do i"],
+        "fr": ["aide", "comment ca marche"],
+        "de": ["hilfe", "wie funktioniert"],
+    },
+}
+
+# Korte berichten die volledig een begroeting/bedankje zijn ("hoi!", "thanks 🙏")
+_STANDALONE_INTENTS = (GREETING, THANKS, HELP)
+
+# Vulwoorden die alleen als héél bericht smalltalk zijn: "top!" is een bedankje,
+# "top pizza" en "ok banaan" zijn maaltijden
+_WHOLE_MESSAGE_PHRASES: Dict[str, Dict[str, List[str]]] = {
+    THANKS: {
+        "nl": ["top", "super", "ok", "oke", "prima"],
+        "en": ["okay"],
+    },
+}
+
+# Voedingswoorden die een vraag tot voedingsvraag maken
+_NUTRITION_WORDS = re.compile(
+    r"\b(kcal|calorie\w*|kalorie\w*|eiwit\w*|protein\w*|proteine\w*|eiweiss\w*|koolhydra\w*|carb\w*|"
+    r"vet|fat|fett|graisse\w*|suiker\w*|sugar|zucker|sucre|vezel\w*|fib\w*|ballaststoff\w*|"
+    r"gegeten|gedronken|eaten|drunk|ate|drank|mange|bu|gegessen|getrunken|"
+    r"vandaag|gisteren|week|today|yesterday|aujourd hui|hier|semaine|heute|gestern|woche)\b"
+)
+
+_WORD = re.compile(r"[a-z0-9]+")
+_LETTER = re.compile(r"[^\W\d_]", re.UNICODE)
+_VOWEL = re.compile(r"[aeiouy]")
+_REPEAT = re.compile(r"(.)\1{5,}")
+
+
+class Intent(NamedTuple):
+    """Resultaat van de classificatie"""
+    kind: str
+    language: Optional[str] = None
+    reason: str = ""
+
+
+def normalize(text: str) -> str:
+    """Kleine letters, accenten weg en leestekens naar spaties"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_WORD.findall(text))
+
+
+class _PhraseTrie:
+    """Woord-trie voor prefix matching van zinsdelen"""
+
+    __slots__ = ("children", "value")
+
+    def __init__(self):
+        self.children: Dict[str, "_PhraseTrie"] = {}
+        self.value: Optional[Tuple[str, str]] = None
+
+    def insert(self, words: List[str], value: Tuple[str, str]):
+        node = self
+        for word in words:
+            node = node.children.setdefault(word, _PhraseTrie())
+        # Eerste registratie wint, zodat QUERY voorrang houdt op gedeelde woorden
+        if node.value is None:
+            node.value = value
+
+    def longest_prefix(self, words: List[str]) -> Tuple[Optional[Tuple[str, str]], int]:
+        """Langste geregistreerde zin waarmee `words` begint"""
+        node, best, depth = self, None, 0
+        for i, word in enumerate(words):
+            node = node.children.get(word)
+            if node is None:
+                break
+            if node.value is not None:
+                best, depth = node.value, i + 1
+        return best, depth
+
+
+def _build_trie() -> _PhraseTrie:
+    trie = _PhraseTrie()
+    for intent, languages in _PREFIX_PHRASES.items():
+        for language, phrases in languages.items():
+            for phrase in phrases:
+                trie.insert(normalize(phrase).split(), (intent, language))
+    return trie
+
+
+def _build_whole_messages() -> Dict[str, Tuple[str, str]]:
+    whole = {}
+    for intent, languages in _WHOLE_MESSAGE_PHRASES.items():
+        for language, phrases in languages.items():
+            for phrase in phrases:
+                whole.setdefault(normalize(phrase), (intent, language))
+    return whole
+
+
+class IntentRouter:
+    """
+    Bepaalt lokaal of een bericht een food log, een vraag, smalltalk of rommel is
+
+    Twijfelgevallen worden als LOG geclassificeerd, zodat het gedrag van de bot
+    voor gewone maaltijdbeschrijvingen gelijk blijft.
+    """
+
+    _trie = _build_trie()
+    _whole_messages = _build_whole_messages()
+
+    def classify(self, message: str) -> Intent:
+        """
+        Classificeer een (niet-command) bericht
+
+        Args:
+            message: Ruwe tekst van de gebruiker
+
+        Returns:
+            Intent met kind, gedetecteerde taal en reden
+        """
+        if not message or not message.strip():
+            return Intent(EMPTY, reason="leeg bericht")
+
+        text = message.strip()
+        if len(text) > MAX_MESSAGE_LENGTH:
+            return Intent(JUNK, reason="te lang")
+
+        letters = _LETTER.findall(text)
+        if len(letters) < 2:
+            return Intent(JUNK, reason="geen tekst")
+
+        norm = normalize(text)
+        words = norm.split()
+        if not words:
+            return Intent(JUNK, reason="geen woorden")
+
+        if _REPEAT.search(norm.replace(" ", "")) or (len(norm) >= 6 and not _VOWEL.search(norm)):
+            return Intent(JUNK, reason="toetsenbord rommel")
+
+        if norm in self._whole_messages:
+            intent, language = self._whole_messages[norm]
+            return Intent(intent, language, "smalltalk")
+
+        match, depth = self._trie.longest_prefix(words)
+        if match:
+            intent, language = match
+            if intent == QUERY:
+                return Intent(QUERY, language, "vraagwoord")
+            # "hoi" of "bedankt!" alleen; "hoi, ik had net een appel" blijft een log
+            if intent in _STANDALONE_INTENTS and len(words) - depth <= 1:
+                return Intent(intent, language, "smalltalk")
+
+        if text.endswith("?") and _NUTRITION_WORDS.search(norm):
+            return Intent(QUERY, reason="voedingsvraag")
+
+        return Intent(LOG, reason="standaard")
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Local Service
+Langlopende JSON-RPC service (Unix socket of localhost HTTP) rond één warme
+integratie, plus een dunne client voor andere OpenClaw componenten
+"""
+
+import os
+import json
+import time
+import socket
+import itertools
+import threading
+import http.client
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+from config_loader import load_config, state_path
+
+# JSON-RPC 2.0 foutcodes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+DEFAULT_PORT = 8766
+
+
+class ServiceUnavailable(ConnectionError):
+    """Er draait geen service op het adres"""
+
+
+class ServiceError(RuntimeError):
+    """De service gaf een JSON-RPC fout terug"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def service_address(config: Mapping = None) -> str:
+    """
+    Adres van de service: `service_address` uit de config, anders een Unix
+    socket naast de food log (of localhost HTTP waar Unix sockets ontbreken)
+
+    Returns:
+        "unix:<pad>" of "<host>:<port>"
+    """
+    config = config or load_config()
+    if config.get("service_address"):
+        return config["service_address"]
+    if hasattr(socket, "AF_UNIX"):
+        return "unix:" + state_path(config, "service.sock")
+    return f"127.0.0.1:{DEFAULT_PORT}"
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    """("unix", pad) of ("tcp", (host, port))"""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    try:
+        return "tcp", (host or "127.0.0.1", int(port))
+    except ValueError:
+        raise ValueError(f"Ongeldig service adres {address!r} (verwacht unix:<pad> of host:port)")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "socketserver.BaseServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # stil; de service telt zelf
+        pass
+
+    def address_string(self) -> str:
+        return "local"
+
+    def _send(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            return self._send(200, self.server.service.dispatch("health", {}))
+        self._send(404, {"error": "Niet gevonden; gebruik POST / met JSON-RPC of GET /health"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            return self._send(200, _error(None, PARSE_ERROR, f"Ongeldige JSON: {e}"))
+        self._send(200, self.server.service.handle(request))
+
+
+def _error(request_id, code: int, message: str) -> Dict:
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class IntegrationService:
+    """
+    JSON-RPC service rond één OpenClawDailyNutriIntegration
+
+    Alle calls delen dezelfde warme client (connection pool, caches, rate
+    limiter) en dezelfde store, dus een call kost geen Python opstart, imports
+    of .env parsing meer. Methods: log, query, summary, history, report, totals,
+    search, usage en health. De Unix socket is alleen voor de eigen gebruiker (0600); TCP
+    luistert alleen op localhost, tenzij expliciet anders ingesteld.
+    """
+
+    def __init__(self, integrator=None, address: str = None):
+        """
+        Args:
+            integrator: OpenClawDailyNutriIntegration (default: een nieuwe)
+            address: "unix:<pad>" of "host:port" (default: service_address())
+        """
+        if integrator is None:
+            from openclaw_integration import OpenClawDailyNutriIntegration
+            integrator = OpenClawDailyNutriIntegration()
+        self.integrator = integrator
+        self.address = address or service_address(integrator.config)
+        self.started = time.monotonic()
+        self._calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._methods: Dict[str, Callable[..., Any]] = {
+            "log": self._log,
+            "query": integrator.query_from_openclaw,
+            "summary": integrator.get_daily_summary,
+            "history": self._history,
+            "report": lambda: {"report": integrator.generate_weekly_report()},
+            "totals": integrator.get_totals,
+            "search": integrator.search_food,
+            "usage": integrator.client.usage,
+            "health": self._health,
+        }
+
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            self._prepare_socket(target)
+            self.server = _UnixServer(target, _Handler)
+            os.chmod(target, 0o600)
+        else:
+            self.server = _TCPServer(target, _Handler)
+            self.address = "%s:%d" % self.server.server_address[:2]
+        self.server.service = self
+
+    def _prepare_socket(self, path: str):
+        """Ruim een achtergebleven socket op; weiger als er al een service luistert"""
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            return
+        try:
+            ServiceClient("unix:" + path, timeout=1.0).call("health")
+        except (ServiceUnavailable, ServiceError):
+            os.unlink(path)
+            return
+        raise RuntimeError(f"Er draait al een service op {path}")
+
+    def _log(self, description: str, context: str = None, instant: bool = False) -> Dict:
+        return self.integrator.log_from_openclaw(description, context, instant=instant)
+
+    def _history(self, limit: int = 10, before: str = None, after: str = None):
+        if before or after:
+            return self.integrator.get_log_page(limit, before=before, after=after)
+        return self.integrator.get_log_history(limit)
+
+    def _health(self) -> Dict:
+        with self._lock:
+            calls = dict(self._calls)
+        return {"status": "ok", "pid": os.getpid(), "address": self.address,
+                "uptime_s": round(time.monotonic() - self.started, 1), "calls": calls}
+
+    def dispatch(self, method: str, params) -> Any:
+        """Voer een method uit met params (dict of lijst)"""
+        function = self._methods[method]
+        with self._lock:
+            self._calls[method] = self._calls.get(method, 0) + 1
+        if isinstance(params, dict):
+            return function(**params)
+        return function(*params)
+
+    def handle(self, request) -> Dict:
+        """Eén JSON-RPC request → response"""
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "Verwacht een object met method")
+        request_id = request.get("id")
+        method = request["method"]
+        params = request.get("params") or {}
+        if method not in self._methods:
+            return _error(request_id, METHOD_NOT_FOUND, f"Onbekende method: {method}")
+        if not isinstance(params, (dict, list)):
+            return _error(request_id, INVALID_PARAMS, "params moet een object of lijst zijn")
+        try:
+            result = self.dispatch(method, params)
+        except (TypeError, ValueError) as e:
+            return _error(request_id, INVALID_PARAMS, str(e))
+        except Exception as e:
+            print(f"⚠️ Service call {method} faalde: {e}")
+            return _error(request_id, INTERNAL_ERROR, str(e))
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def serve_forever(self):
+        """Blokkeer en handel calls af tot stop() (of Ctrl+C)"""
+        try:
+            self.server.serve_forever()
+        finally:
+            self._cleanup()
+
+    def start(self) -> "IntegrationService":
+        """Draai de service in een achtergrond thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever, name="dailynutri-service",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop de service en werk openstaande logs af"""
+        self.server.shutdown()
+        if self._thread:
+            self._thread.join()
+        self._cleanup()
+
+    def _cleanup(self):
+        self.server.server_close()
+        kind, target = parse_address(self.address)
+        if kind == "unix" and os.path.exists(target):
+            os.unlink(target)
+        self.integrator.flush()
+
+    def __enter__(self) -> "IntegrationService":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over een Unix socket"""
+
+    def __init__(self, path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class ServiceClient:
+    """
+    Dunne client voor de service
+
+    Houdt per thread één keep-alive verbinding open, zodat een call rond de
+    milliseconde kost. Draait er geen service, dan volgt ServiceUnavailable
+    en kan de aanroeper terugvallen op een eigen integratie.
+    """
+
+    def __init__(self, address: str = None, timeout: float = 120.0):
+        """
+        Args:
+            address: "unix:<pad>" of "host:port" (default: service_address())
+            timeout: Seconden per call (een log kan op de gateway wachten)
+        """
+        self.address = address or service_address()
+        self.timeout = timeout
+        self._kind, self._target = parse_address(self.address)
+        self._local = threading.local()
+        self._ids = itertools.count(1)  # next() is atomair, ook vanuit een thread pool
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            if self._kind == "unix":
+                connection = _UnixHTTPConnection(self._target, timeout=self.timeout)
+            else:
+                connection = http.client.HTTPConnection(*self._target, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def call(self, method: str, **params) -> Any:
+        """
+        Roep een method aan
+
+        Raises:
+            ServiceUnavailable: Geen service op het adres
+            ServiceError: JSON-RPC fout van de service
+        """
+        body = json.dumps({"jsonrpc": "2.0", "id": next(self._ids), "method": method, "params": params})
+        for attempt in (1, 2):
+            connection = self._connection()
+            reused = connection.sock is not None
+            try:
+                connection.request("POST", "/", body, {"Content-Type": "application/json"})
+                response = json.loads(connection.getresponse().read())
+                break
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                self.close()
+                # Een keep-alive verbinding van een herstarte service: één keer opnieuw
+                if not reused or attempt == 2:
+                    raise ServiceUnavailable(f"Service op {self.address} niet bereikbaar: {e}") from e
+            except socket.timeout as e:
+                # De call kan al uitgevoerd zijn: niet terugvallen op een eigen integratie
+                self.close()
+                raise ServiceError(INTERNAL_ERROR, f"Geen antwoord van de service binnen {self.timeout}s") from e
+            except (FileNotFoundError, ConnectionRefusedError) as e:
+                self.close()
+                raise ServiceUnavailable(f"Service op {self.address} niet bereikbaar: {e}") from e
+        if "error" in response:
+            raise ServiceError(response["error"].get("code", INTERNAL_ERROR), response["error"].get("message", ""))
+        return response.get("result")
+
+    def available(self) -> bool:
+        """Of er een service draait"""
+        try:
+            self.call("health")
+            return True
+        except (ServiceUnavailable, ServiceError):
+            return False
+
+    def close(self):
+        """Sluit de verbinding van deze thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Export/Import
+Streaming export en import van de food log geschiedenis (CSV, JSONL, Parquet)
+"""
+
+import os
+import csv
+import sys
+import json
+from datetime import date, timedelta
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+from log_store import LogStore
+from retention import Compactor, load_daily
+from food_search import FoodSearchIndex, food_search_path
+from rollup import RollupIndex, rollup_path
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optioneel, alleen nodig voor Parquet
+    pyarrow = None
+
+FORMATS = ("jsonl", "csv", "parquet")
+
+# Platte kolommen voor CSV en Parquet; items gaan als JSON string mee
+COLUMNS = ("timestamp", "description", "context", "success", "error", "meal_id",
+           "items_logged", "total_calories", "total_protein", "items")
+
+BATCH_SIZE = 1000
+
+
+def detect_format(path: str) -> str:
+    """Formaat uit de extensie van het bestand"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension in (".csv", ".parquet"):
+        return extension[1:]
+    raise ValueError(f"Onbekend formaat voor {path}; gebruik --format ({', '.join(FORMATS)})")
+
+
+def _require_pyarrow():
+    if pyarrow is None:
+        raise RuntimeError("Parquet vereist 'pyarrow' (pip install pyarrow)")
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def to_row(entry: Dict) -> Dict:
+    """Platte rij voor CSV/Parquet"""
+    api_result = entry.get('api_result') or {}
+    items = api_result.get('items') or []
+    return {
+        "timestamp": entry.get('timestamp'),
+        "description": entry.get('description'),
+        "context": entry.get('context'),
+        "success": bool(entry.get('success')),
+        "error": entry.get('error'),
+        "meal_id": api_result.get('meal_id'),
+        "items_logged": len(items),
+        "total_calories": sum(item.get('calories', 0) or 0 for item in items),
+        "total_protein": sum(item.get('protein', 0) or 0 for item in items),
+        "items": json.dumps(items, ensure_ascii=False) if items else None,
+    }
+
+
+def from_row(row: Dict) -> Dict:
+    """Food log entry uit een platte rij (CSV waarden zijn strings)"""
+    success = row.get('success')
+    if isinstance(success, str):
+        success = success.strip().lower() in ('1', 'true', 'yes', 'ja')
+    entry = {
+        "timestamp": row.get('timestamp'),
+        "description": row.get('description') or None,
+        "context": row.get('context') or None,
+        "success": bool(success),
+    }
+    if row.get('error'):
+        entry["error"] = row['error']
+    if row.get('items') or row.get('meal_id'):
+        entry["api_result"] = {
+            "action": "logged" if entry["success"] else None,
+            "items": json.loads(row['items']) if row.get('items') else [],
+            "meal_id": row.get('meal_id') or None,
+        }
+    return entry
+
+
+def iter_history(store: LogStore, since: str = None, until: str = None) -> Iterator[Dict]:
+    """
+    Alle entries in [since, until), eerst uit het archief en dan uit de ruwe log
+
+    Werkt met constant geheugen: segmenten en de log worden regel voor regel gelezen.
+    """
+    compacted_before = load_daily(store.path)["compacted_before"]
+    if compacted_before and (since is None or since < compacted_before):
+        archive_end = min(until, compacted_before) if until else compacted_before
+        yield from Compactor(store).read_archive(since, archive_end)
+        since = compacted_before if since is None else max(since, compacted_before)
+    yield from store.iter_range(since, until)
+
+
+def write_jsonl(entries: Iterable[Dict], f) -> int:
+    count = 0
+    for entry in entries:
+        f.write(json.dumps(entry, default=str, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(entries: Iterable[Dict], f) -> int:
+    writer = csv.DictWriter(f, fieldnames=COLUMNS)
+    writer.writeheader()
+    count = 0
+    for entry in entries:
+        writer.writerow(to_row(entry))
+        count += 1
+    return count
+
+
+def write_parquet(entries: Iterable[Dict], path: str, batch_size: int = BATCH_SIZE) -> int:
+    """Schrijf per row group van `batch_size` entries, zodat het geheugen begrensd blijft"""
+    _require_pyarrow()
+    schema = pyarrow.schema([
+        ("timestamp", pyarrow.string()),
+        ("description", pyarrow.string()),
+        ("context", pyarrow.string()),
+        ("success", pyarrow.bool_()),
+        ("error", pyarrow.string()),
+        ("meal_id", pyarrow.string()),
+        ("items_logged", pyarrow.int64()),
+        ("total_calories", pyarrow.float64()),
+        ("total_protein", pyarrow.float64()),
+        ("items", pyarrow.string()),
+    ])
+    count = 0
+    with pyarrow.parquet.ParquetWriter(path, schema, compression="zstd") as writer:
+        for batch in _batches(entries, batch_size):
+            rows = [to_row(entry) for entry in batch]
+            for row in rows:
+                row["meal_id"] = None if row["meal_id"] is None else str(row["meal_id"])
+            writer.write_table(pyarrow.Table.from_pylist(rows, schema=schema))
+            count += len(rows)
+    return count
+
+
+def export_history(store: LogStore, path: str, fmt: str = None,
+                   since: str = None, until: str = None) -> int:
+    """
+    Exporteer de geschiedenis naar een bestand
+
+    Args:
+        store: LogStore met de ruwe log (archief en aggregaten staan ernaast)
+        path: Doelbestand ('-' = stdout, niet voor Parquet)
+        fmt: jsonl, csv of parquet (default: uit de extensie)
+        since: ISO datum/timestamp, inclusief
+        until: ISO datum/timestamp, exclusief
+
+    Returns:
+        Aantal geëxporteerde entries
+    """
+    fmt = fmt or detect_format(path)
+    entries = iter_history(store, since, until)
+    if fmt == "parquet":
+        return write_parquet(entries, path)
+
+    writer = write_csv if fmt == "csv" else write_jsonl
+    if path == "-":
+        return writer(entries, sys.stdout)
+    with open(path, 'w', newline='' if fmt == "csv" else None, encoding='utf-8') as f:
+        return writer(entries, f)
+
+
+def read_file(path: str, fmt: str = None, batch_size: int = BATCH_SIZE) -> Iterator[Dict]:
+    """Lees entries uit een export bestand, één voor één"""
+    fmt = fmt or detect_format(path)
+    if fmt == "parquet":
+        _require_pyarrow()
+        parquet = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=batch_size):
+            for row in batch.to_pylist():
+                yield from_row(row)
+        return
+
+    with open(path, 'r', newline='' if fmt == "csv" else None, encoding='utf-8') as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield from_row(row)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                print(f"⚠️ Ongeldige regel overgeslagen: {line[:80]}")
+
+
+def import_history(store: LogStore, entries: Iterable[Dict], batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Backfill entries in batches
+
+    Entries van vóór de gecompacteerde grens gaan direct naar het archief en de
+    dag aggregaten; de rest gaat per batch gesorteerd naar een tijdelijke run
+    en wordt aan het eind in één streaming merge in de ruwe log gevoegd
+    (geheugen begrensd door batch_size). Het rollup en het zoekindex worden als
+    verouderd gemarkeerd en bij het volgende gebruik opgebouwd.
+
+    Returns:
+        Dict met imported, archived en skipped (entries zonder timestamp)
+    """
+    compactor = Compactor(store)
+    stats = {"imported": 0, "archived": 0, "skipped": 0}
+
+    def valid_batches():
+        for batch in _batches(entries, batch_size):
+            valid = [e for e in batch if isinstance(e, dict) and e.get('timestamp')]
+            stats["skipped"] += len(batch) - len(valid)
+            yield valid
+
+    stats["archived"], stats["imported"] = compactor.import_batches(valid_batches(), tag="import")
+
+    if stats["imported"] or stats["archived"]:
+        # De indexen zien alleen live logs; na een backfill opnieuw opbouwen
+        if os.path.exists(rollup_path(store.path)):
+            index = RollupIndex(rollup_path(store.path))
+            index.mark_stale()
+            index.close()
+        if os.path.exists(food_search_path(store.path)):
+            search = FoodSearchIndex(food_search_path(store.path), tenant=None)
+            search.mark_stale()
+            search.close()
+
+    return stats
+
+
+if __name__ == "__main__":
+    """Export/import vanaf de command line"""
+    import argparse
+    from config_loader import load_config, store_paths
+
+    parser = argparse.ArgumentParser(description="DailyNutri log export/import")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub.add_parser("export", help="Exporteer log geschiedenis")
+    export_parser.add_argument("output", help="Doelbestand (.jsonl, .csv, .parquet of '-' voor stdout)")
+    export_parser.add_argument("--format", choices=FORMATS)
+    export_parser.add_argument("--since", help="Vanaf datum YYYY-MM-DD (inclusief)")
+    export_parser.add_argument("--until", help="Tot en met datum YYYY-MM-DD")
+
+    import_parser = sub.add_parser("import", help="Importeer log geschiedenis")
+    import_parser.add_argument("input", help="Bronbestand (.jsonl, .csv of .parquet)")
+    import_parser.add_argument("--format", choices=FORMATS)
+
+    args = parser.parse_args()
+
+    config = load_config()
+    log_file, legacy_file = store_paths(config)
+    store = LogStore(log_file, max_entries=0, legacy_path=legacy_file)
+
+    try:
+        if args.command == "export":
+            fmt = args.format or ("jsonl" if args.output == "-" else detect_format(args.output))
+            until = None
+            if args.until:
+                until = (date.fromisoformat(args.until) + timedelta(days=1)).isoformat()
+            count = export_history(store, args.output, fmt, since=args.since, until=until)
+            if args.output != "-":
+                print(f"✅ {count} entries geëxporteerd naar {args.output}")
+        else:
+            stats = import_history(store, read_file(args.input, args.format))
+            print(f"✅ {stats['imported']} entries geïmporteerd, {stats['archived']} direct gearchiveerd"
+                  f", {stats['skipped']} overgeslagen")
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"❌ Fout: {e}")
+        sys.exit(1)
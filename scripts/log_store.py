@@ -0,0 +1,695 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Log Store
+Multi-writer veilige opslag voor de food log (cron, Telegram en CLI tegelijk)
+"""
+
+import os
+import json
+import heapq
+import time
+import threading
+import tempfile
+import mmap
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class LogStoreError(Exception):
+    """Basis fout voor de log store"""
+
+
+class LockTimeoutError(LogStoreError):
+    """Lock kon niet binnen de timeout verkregen worden"""
+
+
+# Eén thread lock per lock bestand in dit proces (zie FileLock)
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: str) -> threading.Lock:
+    key = os.path.abspath(path)
+    with _thread_locks_guard:
+        lock = _thread_locks.get(key)
+        if lock is None:
+            lock = _thread_locks[key] = threading.Lock()
+        return lock
+
+
+class FileLock:
+    """
+    Advisory cross-process lock op een apart .lock bestand
+
+    Threads van hetzelfde proces wachten eerst op een gewone thread lock per
+    bestand, zodat alleen de voorste thread de file lock pollt en de rest
+    direct aan de beurt is zodra hij vrijkomt.
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0, poll_interval: float = 0.01):
+        """
+        Args:
+            path: Pad van het lock bestand
+            timeout: Maximaal aantal seconden wachten op de lock
+            poll_interval: Wachttijd tussen pogingen
+        """
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._thread_lock = _thread_lock(path)
+
+    def acquire(self):
+        """Verkrijg de lock of gooi LockTimeoutError"""
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=max(self.timeout, 0)):
+            raise LockTimeoutError(f"Lock op {self.path} niet verkregen binnen {self.timeout}s")
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+        while True:
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                self._fd = fd
+                return
+            except OSError:
+                if time.monotonic() >= deadline:
+                    os.close(fd)
+                    self._thread_lock.release()
+                    raise LockTimeoutError(f"Lock op {self.path} niet verkregen binnen {self.timeout}s")
+                time.sleep(self.poll_interval)
+
+    def release(self):
+        """Geef de lock vrij"""
+        if self._fd is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def atomic_write(path: str, data: bytes):
+    """Schrijf data naar een temp file en hernoem atomair over het doel"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        os.chmod(tmp_path, 0o644)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_directory(directory)
+
+
+def _fsync_directory(directory: str):
+    """Zorg dat een rename in `directory` zelf ook op disk staat"""
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def _timestamp(entry: Dict) -> str:
+    """Sorteersleutel van een entry"""
+    return str(entry.get('timestamp', ''))
+
+
+class _CommitTicket:
+    """Wachtbewijs voor een append in de group commit"""
+
+    __slots__ = ('entries', 'done', 'error')
+
+    def __init__(self, entries: List[Dict]):
+        self.entries = entries
+        self.done = False
+        self.error = None
+
+
+class LogStore:
+    """
+    Food log opslag met advisory locks, atomic rename-on-write en group commit
+
+    Entries staan als JSON regels in het bestand. Gelijktijdige appends binnen
+    één proces worden gebundeld tot één write; tussen processen serialiseert de
+    file lock. Lezen gebeurt via mmap van achter naar voren, zodat het ophalen
+    van de laatste N entries niet afhangt van de grootte van het bestand.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100, lock_timeout: float = 10.0,
+                 commit_window: float = 0.0, legacy_path: str = None,
+                 on_commit: Callable[[], None] = None):
+        """
+        Args:
+            path: Pad naar food_log.jsonl (één JSON entry per regel)
+            max_entries: Aantal entries dat bewaard blijft (0 = geen limiet)
+            lock_timeout: Seconden wachten op de file lock
+            commit_window: Extra seconden dat een commit-leader wacht op meer appends
+            legacy_path: Oud food_log.json (JSON array) dat eenmalig gemigreerd wordt
+            on_commit: Optionele callback na elke geslaagde write (bijv. compactie starten)
+        """
+        self.path = path
+        self.legacy_path = legacy_path
+        self.lock_path = path + ".lock"
+        self.compact_lock_path = path + ".compact.lock"
+        self.max_entries = max_entries
+        self.lock_timeout = lock_timeout
+        self.commit_window = commit_window
+        self.on_commit = on_commit
+
+        self._cond = threading.Condition()
+        self._pending: List[_CommitTicket] = []
+        self._committing = False
+        self._migrated = False
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+    def lock(self) -> FileLock:
+        """Cross-process lock op de store"""
+        return FileLock(self.lock_path, timeout=self.lock_timeout)
+
+    def compaction_lock(self) -> FileLock:
+        """
+        Cross-process lock voor wie de log vóór het einde herschrijft (compactie,
+        merge_many); altijd vóór de store lock nemen
+        """
+        return FileLock(self.compact_lock_path, timeout=self.lock_timeout)
+
+    def append(self, entry: Dict):
+        """Voeg één entry toe; retourneert pas als de entry op disk staat"""
+        self.append_many([entry])
+
+    def append_many(self, entries: List[Dict]):
+        """
+        Voeg entries toe via group commit
+
+        Raises:
+            LockTimeoutError: Als de file lock niet verkregen kon worden
+            OSError: Bij schrijffouten
+        """
+        ticket = _CommitTicket(list(entries))
+
+        with self._cond:
+            self._pending.append(ticket)
+            while not ticket.done and self._committing:
+                self._cond.wait()
+            if ticket.done:
+                if ticket.error:
+                    raise ticket.error
+                return
+            self._committing = True
+
+        # Deze thread is commit-leader
+        if self.commit_window > 0:
+            time.sleep(self.commit_window)
+
+        with self._cond:
+            batch, self._pending = self._pending, []
+
+        error = None
+        try:
+            self._write_batch([e for t in batch for e in t.entries])
+        except Exception as e:
+            error = e
+
+        with self._cond:
+            for t in batch:
+                t.done = True
+                t.error = error
+            self._committing = False
+            self._cond.notify_all()
+
+        if error:
+            raise error
+        if self.on_commit:
+            self.on_commit()
+
+    def _write_batch(self, entries: List[Dict]):
+        """
+        Eén append onder de file lock, met compactie als de helft van het bestand oud is
+
+        De timestamp wordt vóór de gateway call gezet, dus een trage call (of
+        een ander proces) kan al een nieuwere regel geschreven hebben. De log
+        blijft gesorteerd voor de binary search: een batch die ouder is dan de
+        laatste regel wordt ingevoegd zoals bij merge_many. Loopt er een
+        compactie of import, dan wacht de batch daarop; achteraan toevoegen
+        zou de cursors en range reads stilletjes verkeerde pagina's geven.
+        """
+        entries = sorted(entries, key=_timestamp)
+        if not entries:
+            return
+        with self.lock():
+            self._migrate_legacy_unlocked()
+            if not self._older_than_tail_unlocked(entries[0]):
+                self._append_unlocked(entries)
+                if self.max_entries:
+                    self._trim_unlocked()
+                return
+
+        while True:
+            try:
+                with self.compaction_lock():
+                    self._merge_unlocked(entries)
+                return
+            except LockTimeoutError:
+                print("⏳ Compactie of import bezig; entries wachten om ingevoegd te worden")
+
+    def _older_than_tail_unlocked(self, entry: Dict) -> bool:
+        """Of de entry ouder is dan de laatste regel van de log (zonder timestamp: nooit)"""
+        if not _timestamp(entry):
+            return False
+        with self._map() as mm:
+            if mm is None:
+                return False
+            for start, end in self._reverse_lines(mm, len(mm)):
+                last = self._decode(mm, start, end)
+                if last is not None:
+                    return _timestamp(entry) < _timestamp(last)
+        return False
+
+    def _append_unlocked(self, entries: List[Dict]):
+        """Schrijf entries achteraan in het bestand (lock moet vastgehouden worden)"""
+        data = b"".join(self._encode(e) for e in entries)
+        with open(self.path, 'a+b') as f:
+            # Restant van een gecrashte writer niet laten samensmelten met de nieuwe regel
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def merge_many(self, entries: List[Dict], compaction_locked: bool = False):
+        """
+        Voeg entries met willekeurige timestamps toe en houd de log gesorteerd
+
+        Entries die niet ouder zijn dan de laatste regel worden in één write
+        achteraan toegevoegd; oudere (bijv. bij een import) worden in de log
+        gevoegd met één atomaire herschrijving. Die verschuift de bytes waar
+        een compactie op rekent, dus dit gebeurt onder de compaction lock.
+
+        Args:
+            entries: Entries in willekeurige volgorde
+            compaction_locked: De aanroeper heeft compaction_lock() al
+        """
+        entries = sorted(entries, key=_timestamp)
+        if not entries:
+            return
+
+        if compaction_locked:
+            self._merge_unlocked(entries)
+        else:
+            with self.compaction_lock():
+                self._merge_unlocked(entries)
+
+        if self.on_commit:
+            self.on_commit()
+
+    def _merge_unlocked(self, entries: List[Dict]):
+        """merge_many onder de compaction lock van de aanroeper"""
+        with self.lock():
+            self._migrate_legacy_unlocked()
+            if not self._older_than_tail_unlocked(entries[0]):
+                self._append_unlocked(entries)
+                if self.max_entries:
+                    self._trim_unlocked()
+                return
+
+        run = self.write_run(entries)
+        try:
+            self._merge_runs_unlocked([run])
+        finally:
+            os.remove(run)
+
+    def write_run(self, entries: List[Dict]) -> str:
+        """
+        Schrijf entries gesorteerd naar een tijdelijk bestand naast de log
+
+        Returns:
+            Pad van de run, voor merge_runs (de aanroeper ruimt hem op)
+        """
+        fd, path = tempfile.mkstemp(prefix=".run-", suffix=".jsonl", dir=os.path.dirname(self.path) or ".")
+        with os.fdopen(fd, 'wb') as f:
+            for entry in sorted(entries, key=_timestamp):
+                f.write(self._encode(entry))
+        return path
+
+    def merge_runs(self, runs: List[str], compaction_locked: bool = False):
+        """
+        Voeg gesorteerde runs (zie write_run) in één keer in de log
+
+        Log en runs worden regel voor regel samengevoegd naar een nieuw bestand
+        dat daarna atomair de log vervangt: constant geheugen en één
+        herschrijving, hoe groot de log en hoeveel runs er ook zijn. Appends
+        lopen tijdens de merge door en komen er aan het eind achteraan bij.
+
+        Args:
+            runs: Paden van gesorteerde JSONL bestanden
+            compaction_locked: De aanroeper heeft compaction_lock() al
+        """
+        if not runs:
+            return
+        if compaction_locked:
+            self._merge_runs_unlocked(runs)
+        else:
+            with self.compaction_lock():
+                self._merge_runs_unlocked(runs)
+
+        if self.on_commit:
+            self.on_commit()
+
+    @staticmethod
+    def _iter_run(f, end: int = None) -> Iterator[Tuple[str, bytes]]:
+        """Yield (timestamp, regel) van complete regels tot byte `end`; kapotte regels vallen weg"""
+        while end is None or f.tell() < end:
+            start = f.tell()
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                # Nog in aanbouw: terug naar het begin, zodat de aanroeper hem later heel leest
+                f.seek(start)
+                return
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                print("⚠️ Onleesbare log regel overgeslagen")
+                continue
+            yield _timestamp(entry), line
+
+    def _merge_runs_unlocked(self, runs: List[str]):
+        """merge_runs onder de compaction lock van de aanroeper"""
+        self._ensure_migrated()
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+        os.close(fd)
+        os.chmod(tmp_path, 0o644)
+        try:
+            # De merge zelf zonder store lock: appends lopen door
+            merged = self._stream_merge(runs, tmp_path)
+            with self.lock():
+                if not self._swap_merged_unlocked(tmp_path, *merged):
+                    # Zeldzaam (een trim met max_entries, of een append ouder dan de
+                    # import): opnieuw, nu onder de store lock
+                    self._swap_merged_unlocked(tmp_path, *self._stream_merge(runs, tmp_path))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _stream_merge(self, runs: List[str], out_path: str) -> Tuple[int, Optional[int], str]:
+        """
+        Merge de log en de runs regel voor regel naar `out_path`
+
+        Returns:
+            (gelezen bytes van de log, inode van de log of None, laatste timestamp)
+        """
+        with open(out_path, 'wb') as out, ExitStack() as files:
+            try:
+                log = files.enter_context(open(self.path, 'rb'))
+            except FileNotFoundError:
+                log = None
+            sources = [self._iter_run(files.enter_context(open(run, 'rb'))) for run in runs]
+            if log is not None:
+                # Bij gelijke timestamps eerst de bestaande regels
+                sources.insert(0, self._iter_run(log, os.fstat(log.fileno()).st_size))
+            last = ""
+            for last, line in heapq.merge(*sources, key=lambda item: item[0]):
+                out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+            if log is None:
+                return 0, None, last
+            return log.tell(), os.fstat(log.fileno()).st_ino, last
+
+    def _swap_merged_unlocked(self, merged_path: str, consumed: int, inode: Optional[int], last: str) -> bool:
+        """
+        Zet wat na de merge achteraan kwam erbij en vervang de log (store lock vereist)
+
+        Returns:
+            False als de log intussen herschreven is of een append ouder is dan
+            de merge; dan moet de merge opnieuw
+        """
+        try:
+            current = open(self.path, 'rb')
+        except FileNotFoundError:
+            current = None
+        appended = []
+        if current is not None:
+            with current:
+                if inode is not None and os.fstat(current.fileno()).st_ino != inode:
+                    return False
+                current.seek(consumed if inode is not None else 0)
+                appended = list(self._iter_run(current))
+        if any(timestamp < last for timestamp, _ in appended):
+            return False
+        with open(merged_path, 'ab') as out:
+            for _, line in appended:
+                out.write(line)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(merged_path, self.path)
+        _fsync_directory(os.path.dirname(self.path) or ".")
+        if self.max_entries:
+            self._trim_unlocked()
+        return True
+
+    @staticmethod
+    def _encode(entry: Dict) -> bytes:
+        """Eén entry als JSON regel"""
+        return (json.dumps(entry, default=str, separators=(',', ':')) + "\n").encode('utf-8')
+
+    def _trim_unlocked(self):
+        """Houd de laatste max_entries; herschrijf pas als minstens de helft weg kan"""
+        with self._map() as mm:
+            if mm is None:
+                return
+            start = 0
+            for count, (start, _) in enumerate(self._reverse_lines(mm, len(mm)), 1):
+                if count >= self.max_entries:
+                    break
+            else:
+                return
+            if start < len(mm) // 2:
+                return
+            tail = mm[start:]
+
+        atomic_write(self.path, tail)
+
+    def _migrate_legacy_unlocked(self):
+        """Zet een oud food_log.json (JSON array) eenmalig om naar regels"""
+        if self._migrated:
+            return
+        self._migrated = True
+
+        source = None
+        if self.legacy_path and os.path.exists(self.legacy_path) and not os.path.exists(self.path):
+            source = self.legacy_path
+        elif os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                if f.read(64).lstrip().startswith(b'['):
+                    source = self.path
+
+        if not source:
+            return
+
+        with open(source, 'r') as f:
+            content = f.read()
+        try:
+            logs = json.loads(content) if content.strip() else []
+            if not isinstance(logs, list):
+                raise ValueError("food log is geen lijst")
+        except ValueError:
+            quarantine = f"{source}.corrupt-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+            os.replace(source, quarantine)
+            print(f"⚠️ Corrupt log bestand verplaatst naar {quarantine}")
+            return
+
+        atomic_write(self.path, b"".join(self._encode(e) for e in logs))
+        if source != self.path:
+            os.replace(source, source + ".migrated")
+
+    def _ensure_migrated(self):
+        """Migratie onder lock, maar alleen als er iets te migreren valt"""
+        if self._migrated:
+            return
+        if self.legacy_path and os.path.exists(self.legacy_path) or os.path.exists(self.path):
+            with self.lock():
+                self._migrate_legacy_unlocked()
+        else:
+            self._migrated = True
+
+    @contextmanager
+    def _map(self):
+        """Read-only mmap van het bestand (None bij een leeg of ontbrekend bestand)"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            yield None
+            return
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                yield None
+                return
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield mm
+            finally:
+                mm.close()
+
+    @staticmethod
+    def _reverse_lines(mm, end: int) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) van complete regels vóór `end`, van achter naar voren"""
+        # Een regel zonder afsluitende newline wordt nog geschreven: overslaan
+        newline = mm.rfind(b"\n", 0, end)
+        while newline >= 0:
+            start = mm.rfind(b"\n", 0, newline) + 1
+            if newline > start:
+                yield start, newline
+            newline = start - 1
+
+    @staticmethod
+    def _forward_lines(mm, start: int) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) van complete regels vanaf `start`"""
+        while True:
+            end = mm.find(b"\n", start)
+            if end < 0:
+                return
+            if end > start:
+                yield start, end
+            start = end + 1
+
+    def _decode(self, mm, start: int, end: int) -> Optional[Dict]:
+        """Decodeer één regel; kapotte regels worden overgeslagen"""
+        try:
+            return json.loads(mm[start:end])
+        except ValueError:
+            print(f"⚠️ Onleesbare log regel op byte {start} overgeslagen")
+            return None
+
+    def _seek_timestamp(self, mm, timestamp: str) -> int:
+        """Binary search naar de eerste regel met timestamp >= `timestamp`"""
+        # lo en hi staan altijd op een regelgrens; alles vóór lo is ouder
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            if end < 0:
+                hi = start
+                continue
+            entry = self._decode(mm, start, end)
+            if entry is None or str(entry.get('timestamp', '')) < timestamp:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def iter_range(self, start: str = None, end: str = None) -> Iterator[Dict]:
+        """
+        Entries met start <= timestamp < end (oud → nieuw), één voor één
+
+        Args:
+            start: ISO timestamp, inclusief (None = vanaf het begin)
+            end: ISO timestamp, exclusief (None = tot het einde)
+        """
+        self._ensure_migrated()
+        with self._map() as mm:
+            if mm is None:
+                return
+            pos = 0 if start is None else self._seek_timestamp(mm, start)
+            for line_start, line_end in self._forward_lines(mm, pos):
+                entry = self._decode(mm, line_start, line_end)
+                if entry is None:
+                    continue
+                if end is not None and str(entry.get('timestamp', '')) >= end:
+                    return
+                yield entry
+
+    def read_range(self, start: str = None, end: str = None) -> List[Dict]:
+        """Lees alle entries met start <= timestamp < end (oud → nieuw)"""
+        return list(self.iter_range(start, end))
+
+    def read(self, limit: Optional[int] = None) -> List[Dict]:
+        """Lees de laatste `limit` entries (alle entries als limit leeg is)"""
+        return self.read_page(limit)["entries"]
+
+    def read_page(self, limit: Optional[int] = 10, before: str = None, after: str = None) -> Dict:
+        """
+        Lees een pagina entries rond een timestamp cursor
+
+        Zonder cursor: de laatste `limit` entries. Met `before`: de `limit`
+        entries direct vóór die timestamp. Met `after`: de `limit` entries
+        direct ná die timestamp. Kosten zijn O(limit) plus een binary search.
+
+        Args:
+            limit: Maximaal aantal entries (None of 0 = alles)
+            before: ISO timestamp, exclusief
+            after: ISO timestamp, exclusief
+
+        Returns:
+            Dict met entries (oud → nieuw) en before/after cursors voor de volgende pagina
+        """
+        self._ensure_migrated()
+        # Writers appenden hele regels of vervangen het bestand atomair,
+        # dus lezen kan zonder lock
+        entries = []
+        with self._map() as mm:
+            if mm is not None:
+                if after is not None:
+                    # Eerste regel ná `after`: zoek de eerste >= after en sla gelijke over
+                    pos = self._seek_timestamp(mm, after)
+                    for start, end in self._forward_lines(mm, pos):
+                        entry = self._decode(mm, start, end)
+                        if entry is None or str(entry.get('timestamp', '')) <= after:
+                            continue
+                        entries.append(entry)
+                        if limit and len(entries) >= limit:
+                            break
+                else:
+                    end = len(mm) if before is None else self._seek_timestamp(mm, before)
+                    for start, line_end in self._reverse_lines(mm, end):
+                        entry = self._decode(mm, start, line_end)
+                        if entry is None:
+                            continue
+                        entries.append(entry)
+                        if limit and len(entries) >= limit:
+                            break
+                    entries.reverse()
+
+        return {
+            "entries": entries,
+            "before": entries[0].get('timestamp') if entries else before,
+            "after": entries[-1].get('timestamp') if entries else after
+        }
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Meal Aggregator
+Voegt snel na elkaar gestuurde berichten ("lunch", "broodje kaas", "en een appel")
+per chat samen tot één food log
+"""
+
+import re
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+from intent_router import LOG, MAX_MESSAGE_LENGTH
+from bot_templates import split_message
+
+# Een deel dat met een voegwoord begint plakt zonder komma aan het vorige
+_CONNECTOR = re.compile(r"^(en|and|et|und|met|with|avec|mit|plus)\b|^[+&]", re.I)
+
+
+def merge_parts(parts: List[str]) -> str:
+    """Eén beschrijving uit losse berichten: 'lunch, broodje kaas en een appel'"""
+    merged = ""
+    for part in parts:
+        part = part.strip().rstrip(".,;")
+        if not part:
+            continue
+        if not merged:
+            merged = part
+        elif merged.endswith(":") or _CONNECTOR.match(part):
+            merged += " " + part
+        else:
+            merged += ", " + part
+    return merged
+
+
+class _Pending:
+    """Berichten van één chat die nog op het einde van het venster wachten"""
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.started = time.monotonic()
+        self.timer: Optional[threading.Timer] = None
+
+
+class MealAggregator:
+    """
+    Debounce per chat: food logs binnen `window` seconden worden één gateway call
+
+    Elk nieuw log bericht verlengt het venster, tot hooguit `max_wait` seconden
+    na het eerste bericht. Daarna gaat de samengevoegde beschrijving als één
+    log naar de gateway en komt er één antwoord via `send`. Andere berichten
+    (commands, vragen, begroetingen) sluiten eerst een open maaltijd af, zodat
+    de antwoorden in volgorde blijven.
+    """
+
+    def __init__(self, bot, send: Callable[[Hashable, List[str]], None],
+                 window: float = None, max_wait: float = 10.0):
+        """
+        Args:
+            bot: DailyNutriTelegramBot die de berichten afhandelt
+            send: Callback (chat_id, berichten) voor antwoorden die later komen
+            window: Seconden stilte waarna een maaltijd verstuurd wordt
+                    (default: aggregate_window uit de config; 0 = niet samenvoegen)
+            max_wait: Maximale wachttijd na het eerste bericht van een maaltijd
+        """
+        self.bot = bot
+        self.send = send
+        self.window = bot.client.config.get("aggregate_window", 3.0) if window is None else window
+        self.max_wait = max_wait
+        self._pending: Dict[Hashable, _Pending] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, chat_id: Hashable, message: str) -> Optional[List[str]]:
+        """
+        Verwerk een bericht van een chat
+
+        Returns:
+            Het antwoord (in delen) als dat direct verstuurd kan worden, of None
+            als het bericht bij een maaltijd is gezet; dat antwoord komt via `send`
+        """
+        text = (message or "").strip()
+        if not self.window or not text or text.startswith('/') or self.bot.router.classify(text).kind != LOG:
+            self.flush(chat_id)
+            return self.bot.handle_message_chunks(text)
+
+        with self._lock:
+            pending = self._pending.get(chat_id)
+            if pending and len(merge_parts(pending.parts + [text])) > MAX_MESSAGE_LENGTH:
+                full, pending = pending, None
+                full.timer.cancel()
+            else:
+                full = None
+            if pending is None:
+                pending = self._pending[chat_id] = _Pending()
+            pending.parts.append(text)
+            if pending.timer:
+                pending.timer.cancel()
+            delay = max(0.0, min(self.window, pending.started + self.max_wait - time.monotonic()))
+            pending.timer = threading.Timer(delay, self._expire, args=(chat_id, pending))
+            pending.timer.daemon = True
+            pending.timer.start()
+
+        if full is not None:
+            # Te lang om nog iets bij te zetten: het vorige deel gaat nu al
+            self._send_meal(chat_id, full)
+        return None
+
+    def _expire(self, chat_id: Hashable, pending: _Pending):
+        with self._lock:
+            if self._pending.get(chat_id) is not pending:
+                return
+            del self._pending[chat_id]
+        self._send_meal(chat_id, pending)
+
+    def flush(self, chat_id: Hashable = None):
+        """Verstuur open maaltijden nu (van één chat, of van alle chats)"""
+        with self._lock:
+            chat_ids = [chat_id] if chat_id is not None else list(self._pending)
+            flushed = [(c, self._pending.pop(c)) for c in chat_ids if c in self._pending]
+        for c, pending in flushed:
+            pending.timer.cancel()
+            self._send_meal(c, pending)
+
+    def close(self):
+        """Verstuur alles wat nog openstaat (bij afsluiten van de bot)"""
+        self.flush()
+
+    def _send_meal(self, chat_id: Hashable, pending: _Pending):
+        reply = self.bot.handle_log(merge_parts(pending.parts))
+        try:
+            self.send(chat_id, split_message(reply))
+        except Exception as e:
+            print(f"⚠️ Kon antwoord aan chat {chat_id} niet versturen: {e}")
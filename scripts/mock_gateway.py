@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Mock Gateway
+Lokale stand-in voor de Hapklik API gateway, om offline te testen en te meten
+"""
+
+import re
+import gzip
+import json
+import math
+import time
+import zlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+# Responses kleiner dan dit gaan ongecomprimeerd (compressie kost dan meer dan het oplevert)
+MIN_COMPRESS_SIZE = 256
+
+_QUESTION = re.compile(r"\?|^(wat|hoeveel|wanneer|welke|what|how|when|which|combien|quand|wie|wann|was)\b", re.I)
+# Foutantwoorden zoals de gateway ze geeft
+_ERROR_BODIES = {
+    400: "Invalid request",
+    401: "Invalid API key",
+    402: "Insufficient AI credits",
+    403: "Role not allowed",
+    429: "Rate limit exceeded",
+    500: "Internal server error",
+    502: "Bad gateway",
+    503: "Service unavailable",
+    504: "Gateway timeout",
+}
+
+_SPLIT = re.compile(r"\s*(?:,|\ben\b|\band\b|\bet\b|\bund\b|\bmet\b|\bwith\b)\s*", re.I)
+
+
+def parse_latency(spec) -> Callable[[random.Random], float]:
+    """
+    Latency verdeling uit een korte spec (seconden)
+
+    "0.1" vast, "uniform:0.05:0.3", "normal:0.2:0.05" (gemiddelde, sd),
+    "lognormal:0.2:0.5" (mediaan, sigma) of "exp:0.2" (gemiddelde)
+    """
+    if spec is None or spec == "":
+        return lambda rng: 0.0
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, args = spec.partition(":")
+    try:
+        if not args:
+            value = float(kind)
+            return lambda rng: value
+        params = [float(a) for a in args.split(":")]
+        if kind == "uniform":
+            low, high = params
+            return lambda rng: rng.uniform(low, high)
+        if kind == "normal":
+            mean, sd = params
+            return lambda rng: max(0.0, rng.gauss(mean, sd))
+        if kind == "lognormal":
+            median, sigma = params
+            return lambda rng: rng.lognormvariate(math.log(median), sigma)
+        if kind == "exp":
+            mean, = params
+            return lambda rng: rng.expovariate(1 / mean)
+    except ValueError:
+        pass
+    raise ValueError(f"Onbekende latency spec: {spec!r}")
+
+
+def parse_errors(spec) -> Dict[int, float]:
+    """Foutkansen per status uit "429=0.05,503=0.02" (of een dict)"""
+    if not spec:
+        return {}
+    if isinstance(spec, dict):
+        return {int(status): float(p) for status, p in spec.items()}
+    errors = {}
+    for part in spec.split(","):
+        status, _, p = part.partition("=")
+        errors[int(status)] = float(p)
+    return errors
+
+
+def _parse_accept_encoding(header: str) -> Dict[str, float]:
+    preferences = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            q = float(match.group(1))
+        preferences[name.strip().lower()] = q
+    return preferences
+
+
+def negotiate_encoding(header: str) -> Optional[str]:
+    """Kies br, gzip of deflate volgens de q-waarden van Accept-Encoding (None = identity)"""
+    preferences = _parse_accept_encoding(header)
+    supported = ["br", "gzip", "deflate"] if brotli is not None else ["gzip", "deflate"]
+    candidates = [(preferences.get(name, preferences.get("*", 0)), -i, name)
+                  for i, name in enumerate(supported)]
+    q, _, name = max(candidates)
+    return name if q > 0 else None
+
+
+def encode_body(body: bytes, encoding: Optional[str]) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    if encoding == "deflate":
+        return zlib.compress(body)
+    return body
+
+
+def decode_body(body: bytes, encoding: Optional[str]) -> bytes:
+    encoding = (encoding or "identity").lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        return zlib.decompress(body)
+    if encoding == "br" and brotli is not None:
+        return brotli.decompress(body)
+    if encoding == "identity":
+        return body
+    raise ValueError(f"Content-Encoding {encoding} niet ondersteund")
+
+
+def _items(message: str) -> List[Dict]:
+    parts = [p for p in _SPLIT.split(message.strip().rstrip(".!")) if p]
+    items = []
+    for index, part in enumerate(parts or [message]):
+        calories = 40 + (sum(map(ord, part)) % 400)
+        items.append({
+            "item_name": part[:60],
+            "quantity": 1,
+            "unit": "portie",
+            "calories": calories,
+            "protein": round(calories * 0.05, 1),
+            "carbs": round(calories * 0.12, 1),
+            "fat": round(calories * 0.03, 1),
+            "fiber": round(calories * 0.01, 1),
+            "position": index,
+        })
+    return items
+
+
+def fake_response(message: str) -> Dict:
+    """Antwoord in de vorm van de gateway: reply, action en (bij een log) items"""
+    if _QUESTION.search(message.strip()):
+        lines = [f"• Dag {day}: {1500 + day * 37} kcal, {60 + day}g eiwit" for day in range(1, 8)]
+        return {
+            "action": "query",
+            "reply": "📊 Overzicht van je voeding:\n" + "\n".join(lines),
+        }
+    items = _items(message)
+    return {
+        "action": "logged",
+        "reply": f"✅ Gelogd! Ik heb {len(items)} item(s) toegevoegd.",
+        "items": items,
+        "meal_id": zlib.crc32(message.encode('utf-8')) % 10_000_000,
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # stil, behalve met verbose
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def _send(self, status: int, payload: Dict, headers: Dict = None):
+        raw = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        encoding = negotiate_encoding(self.headers.get("Accept-Encoding", ""))
+        if len(raw) < self.server.min_compress_size:
+            encoding = None
+        body = encode_body(raw, encoding)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        # Tellen vóór het schrijven: de client kan klaar zijn zodra de body binnen is
+        self.server.count(status, len(body), len(raw), encoding)
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        self.server.count_in(len(body))
+
+        if not self.headers.get("X-API-Key"):
+            return self._send(401, {"error": "Missing API key"})
+        try:
+            data = json.loads(decode_body(body, self.headers.get("Content-Encoding")))
+            message = data["message"]
+        except (ValueError, KeyError, OSError, zlib.error) as e:
+            return self._send(400, {"error": f"Invalid request: {e}"})
+
+        delay, status = self.server.draw()
+        if delay:
+            time.sleep(delay)
+        if status == 429:
+            return self._send(429, {"error": _ERROR_BODIES[429]}, {"Retry-After": str(self.server.retry_after)})
+        if status:
+            return self._send(status, {"error": _ERROR_BODIES.get(status, "Error")})
+        self._send(200, fake_response(message))
+
+    def do_OPTIONS(self):
+        # CORS preflight / warm-up: geen body, geen credits
+        self.send_response(204)
+        self.send_header("Allow", "OPTIONS, POST")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], min_compress_size: int, verbose: bool,
+                 latency: Callable[[random.Random], float], errors: Dict[int, float], seed: Optional[int]):
+        super().__init__(address, _Handler)
+        self.min_compress_size = min_compress_size
+        self.verbose = verbose
+        self.latency = latency
+        self.errors = errors
+        self.retry_after = 2
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "bytes_in": 0, "bytes_out": 0, "bytes_out_raw": 0,
+                      "encodings": {}, "statuses": {}}
+
+    def draw(self) -> Tuple[float, Optional[int]]:
+        """Latency en eventuele foutstatus voor het volgende request"""
+        with self._lock:
+            delay = self.latency(self._rng)
+            roll = self._rng.random()
+        for status, probability in self.errors.items():
+            if roll < probability:
+                return delay, status
+            roll -= probability
+        return delay, None
+
+    def count_connection(self):
+        with self._lock:
+            self.stats["connections"] += 1
+
+    def count_in(self, size: int):
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["bytes_in"] += size
+
+    def count(self, status: int, size: int, raw_size: int, encoding: Optional[str]):
+        with self._lock:
+            self.stats["statuses"][str(status)] = self.stats["statuses"].get(str(status), 0) + 1
+            self.stats["bytes_out"] += size
+            self.stats["bytes_out_raw"] += raw_size
+            key = encoding or "identity"
+            self.stats["encodings"][key] = self.stats["encodings"].get(key, 0) + 1
+
+
+class MockGateway:
+    """
+    Lokale gateway in een achtergrond thread
+
+    Gebruik als context manager; `url` kan als api_url in de config van de
+    client. Ondersteunt Accept-Encoding (br/gzip/deflate), gecomprimeerde
+    request bodies en OPTIONS (warm-up), en telt verbindingen, statussen en
+    bytes in/uit in `stats`. Met `latency` en `errors` gedraagt hij zich als
+    een trage of haperende gateway; `seed` maakt dat reproduceerbaar.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 min_compress_size: int = MIN_COMPRESS_SIZE, verbose: bool = False,
+                 latency=None, errors=None, seed: int = None):
+        """
+        Args:
+            latency: Seconden of spec voor parse_latency, bijv. "lognormal:0.2:0.5"
+            errors: Foutkans per status, bijv. {429: 0.05, 503: 0.02} of "429=0.05,503=0.02"
+            seed: Seed voor latency en fouten
+        """
+        self.server = _Server((host, port), min_compress_size, verbose,
+                              parse_latency(latency), parse_errors(errors), seed)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    @property
+    def stats(self) -> Dict:
+        with self.server._lock:
+            return json.loads(json.dumps(self.server.stats))
+
+    def start(self) -> "MockGateway":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="dailynutri-mock-gateway",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "MockGateway":
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    """Start de mock gateway (Ctrl+C om te stoppen)"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DailyNutri mock gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--min-compress-size", type=int, default=MIN_COMPRESS_SIZE)
+    parser.add_argument("--latency", help='Latency verdeling, bijv. "0.1", "uniform:0.05:0.3", "lognormal:0.2:0.5"')
+    parser.add_argument("--errors", help='Foutkans per status, bijv. "429=0.05,503=0.02"')
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    gateway = MockGateway(args.host, args.port, args.min_compress_size, args.verbose,
+                          latency=args.latency, errors=args.errors, seed=args.seed)
+    print(f"🧪 Mock gateway op {gateway.url}")
+    print(f"   Gebruik: DAILY_NUTRI_API_URL={gateway.url}")
+    try:
+        gateway.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {json.dumps(gateway.stats)}")
+        gateway.server.server_close()
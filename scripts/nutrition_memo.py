@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Nutrition Memo
+Onthoudt de items die de gateway teruggaf per genormaliseerde beschrijving,
+zodat herhaalde maaltijden direct getoond of vooraf ingevuld kunnen worden
+"""
+
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from log_store import FileLock, atomic_write
+
+# Telwoorden NL/EN/FR/DE; "een"/"un"/"ein" als lidwoord betekent ook 1 stuk
+_NUMBER_WORDS = {
+    "een": "1", "twee": "2", "drie": "3", "vier": "4", "vijf": "5",
+    "zes": "6", "zeven": "7", "acht": "8", "negen": "9", "tien": "10", "half": "0.5", "halve": "0.5",
+    "a": "1", "an": "1", "one": "1", "two": "2", "three": "3", "four": "4", "five": "5",
+    "six": "6", "seven": "7", "eight": "8", "nine": "9", "ten": "10",
+    "un": "1", "une": "1", "deux": "2", "trois": "3", "quatre": "4", "cinq": "5", "demi": "0.5",
+    "ein": "1", "eine": "1", "einen": "1", "zwei": "2", "drei": "3", "funf": "5", "halbe": "0.5",
+}
+
+_UNITS = {
+    "g": "g", "gr": "g", "gram": "g", "grams": "g", "gramm": "g", "gramme": "g", "grammes": "g",
+    "kg": "kg", "kilo": "kg", "kilogram": "kg",
+    "ml": "ml", "milliliter": "ml", "millilitre": "ml",
+    "cl": "cl", "dl": "dl",
+    "l": "l", "liter": "l", "litre": "l",
+    "el": "el", "eetlepel": "el", "eetlepels": "el", "tbsp": "el", "tablespoon": "el",
+    "tl": "tl", "theelepel": "tl", "theelepels": "tl", "tsp": "tl", "teaspoon": "tl",
+    "stuk": "st", "stuks": "st", "st": "st", "pcs": "st", "piece": "st", "pieces": "st",
+}
+
+# Vulwoorden die niets zeggen over wat er gegeten is
+_FILLER = {
+    "ik", "heb", "had", "net", "zojuist", "vandaag", "gegeten", "gedronken", "genomen", "gehad",
+    "i", "just", "ate", "have", "eaten", "drank", "drunk",
+    "j", "ai", "je", "viens", "de", "mange", "bu",
+    "ich", "habe", "hatte", "gerade", "gegessen", "getrunken",
+}
+
+# Scheidingstekens tussen losse onderdelen van een maaltijd
+_SEPARATORS = re.compile(r"\s*(?:,|;|\+|&|\ben\b|\band\b|\bet\b|\bund\b)\s*")
+_TOKEN = re.compile(r"\d+(?:[.,]\d+)?|[a-z]+")
+
+
+def _strip_accents(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _canonical_part(part: str) -> str:
+    tokens = []
+    for token in _TOKEN.findall(part):
+        token = token.replace(",", ".")
+        token = _NUMBER_WORDS.get(token, token)
+        if token in _FILLER:
+            continue
+        unit = _UNITS.get(token)
+        # "150 gram" -> "150g", maar "g" los blijft staan als er geen getal voor staat
+        if unit and tokens and re.fullmatch(r"\d+(?:\.\d+)?", tokens[-1]):
+            tokens[-1] += unit
+            continue
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def canonicalize(description: str) -> str:
+    """
+    Canonieke vorm van een maaltijdbeschrijving
+
+    Kleine letters, zonder accenten, telwoorden als cijfers, eenheden
+    genormaliseerd en onderdelen gesorteerd, zodat bijv. "Twee boterhammen
+    met pindakaas en koffie" en "koffie, 2 boterhammen met pindakaas"
+    dezelfde key geven.
+    """
+    text = _strip_accents((description or "").lower())
+    # Context prefix ("lunch: ...") hoort niet bij de maaltijd zelf
+    text = re.sub(r"^\s*[a-z ]{2,20}:\s*", "", text)
+    parts = [_canonical_part(p) for p in _SEPARATORS.split(text)]
+    return " + ".join(sorted(p for p in parts if p))
+
+
+class NutritionMemo:
+    """
+    Begrensde LRU memo van gateway items per tenant en canonieke beschrijving
+
+    Wordt gedeeld tussen processen via een JSON bestand; lezen gebeurt uit
+    geheugen en het bestand wordt alleen opnieuw gelezen als het gewijzigd is.
+    Met een SharedCache staat de memo in plaats daarvan in SQLite (namespace
+    "memo"), zonder het hele bestand bij elke record te herschrijven. Een
+    lookup is dan alleen een read; hits worden in het geheugen opgespaard en
+    hooguit elke `hit_flush_interval` seconden in één transactie bijgeschreven.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = 500, cache=None,
+                 hit_flush_interval: float = 5.0):
+        """
+        Args:
+            path: Optioneel JSON bestand om de memo te bewaren en te delen
+            max_entries: Maximaal aantal beschrijvingen in de memo
+            cache: Optionele SharedCache; een bestaand JSON bestand wordt
+                   dan eenmalig overgenomen
+            hit_flush_interval: Seconden dat hits (met cache) opgespaard worden
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.cache = cache
+        self.hit_flush_interval = hit_flush_interval
+        self._entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_stat = None
+        self._pending_hits: Dict[str, int] = {}
+        self._flush_timer: Optional[threading.Timer] = None
+        if cache is not None:
+            cache.max_entries["memo"] = max_entries
+            if path and os.path.exists(path) and not cache.count("memo"):
+                self._load_shared()
+                for key, entry in self._entries.items():
+                    cache.put("memo", key, entry)
+                self._entries.clear()
+
+    @staticmethod
+    def _key(tenant: str, description: str) -> str:
+        return f"{tenant or ''}:{canonicalize(description)}"
+
+    def _load_shared(self):
+        if not self.path:
+            return
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return
+        stat = (st.st_mtime_ns, st.st_size)
+        if stat == self._file_stat:
+            return
+        try:
+            with open(self.path, 'r') as f:
+                shared = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._file_stat = stat
+        for key, entry in shared.items():
+            current = self._entries.get(key)
+            if current is None or current["updated"] < entry["updated"]:
+                self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def preload(self):
+        """Lees het gedeelde bestand nu al in (warm-up), in plaats van bij het eerste gebruik"""
+        if self.cache is not None:
+            self.cache.count("memo")  # opent de verbinding
+            return
+        with self._lock:
+            self._load_shared()
+
+    def lookup(self, tenant: str, description: str) -> Optional[Dict]:
+        """
+        Zoek eerder teruggegeven items voor een beschrijving
+
+        Returns:
+            Dict met items, total_calories, total_protein, hits en updated, of None
+        """
+        key = self._key(tenant, description)
+        if key.endswith(":"):
+            return None
+        if self.cache is not None:
+            # Alleen lezen: de hit (en de LRU) gaat later met de rest in één transactie
+            entry = self.cache.get("memo", key, touch=False)
+            if entry is None:
+                return None
+            with self._lock:
+                pending = self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.hit_flush_interval, self.flush_hits)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+            return {**entry, "hits": entry.get("hits", 0) + pending}
+        with self._lock:
+            self._load_shared()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            entry["hits"] = entry.get("hits", 0) + 1
+            return dict(entry)
+
+    def flush_hits(self):
+        """Schrijf opgespaarde hits in één transactie naar de gedeelde cache (ook bij afsluiten)"""
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, {}
+            timer, self._flush_timer = self._flush_timer, None
+        if timer is not None:
+            timer.cancel()
+        if not pending or self.cache is None:
+            return
+
+        def add_hits(count):
+            return lambda entry: None if entry is None else {**entry, "hits": entry.get("hits", 0) + count}
+
+        self.cache.update_many("memo", {key: add_hits(count) for key, count in pending.items()})
+
+    def record(self, tenant: str, description: str, items: List[Dict]):
+        """Bewaar de items die de gateway voor een beschrijving teruggaf"""
+        key = self._key(tenant, description)
+        if not items or key.endswith(":"):
+            return
+        entry = {
+            "description": description,
+            "items": items,
+            "total_calories": sum(item.get('calories', 0) or 0 for item in items),
+            "total_protein": sum(item.get('protein', 0) or 0 for item in items),
+            "hits": 0,
+            "updated": time.time(),
+        }
+        if self.cache is not None:
+            self.cache.update("memo", key, lambda previous: {**entry, "hits": (previous or {}).get("hits", 0)})
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous:
+                entry["hits"] = previous.get("hits", 0)
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save_shared(key, entry)
+
+    def _save_shared(self, key: str, entry: Dict):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with FileLock(self.path + ".lock", timeout=2.0):
+                try:
+                    with open(self.path, 'r') as f:
+                        shared = json.load(f)
+                except (OSError, ValueError):
+                    shared = {}
+                shared.pop(key, None)
+                shared[key] = entry
+                if len(shared) > self.max_entries:
+                    newest = sorted(shared.items(), key=lambda kv: kv[1]["updated"])[-self.max_entries:]
+                    shared = dict(newest)
+                atomic_write(self.path, json.dumps(shared, default=str).encode('utf-8'))
+        except Exception as e:
+            print(f"⚠️ Kon nutrition memo niet opslaan: {e}")
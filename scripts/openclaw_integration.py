@@ -7,9 +7,21 @@ Integreert DailyNutri API met OpenClaw voor automatische food logging
 import os
 import sys
 import json
-from datetime import datetime
-from typing import Dict, List, Optional
-from api_client import DailyNutriAPIClient
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from itertools import chain
+from typing import Dict, List, Optional, Union
+from api_client import DailyNutriAPIClient, OverloadedError
+from accounting import OK, SUMMARY
+from food_search import FoodSearchIndex, food_question, food_reply, food_search_path
+from log_store import LogStore
+from retention import Compactor, load_daily
+from rollup import RollupIndex, rollup_path, totals_question
+from config_loader import load_config, state_path, store_paths
+from scheduler import JobScheduler, Schedule, tenant_offset
+from events import BLOCK, LOG_FAILED, MEAL_LOGGED, QUERY_ANSWERED, EventBus
+from local_service import IntegrationService, ServiceClient, ServiceUnavailable, service_address
 
 class OpenClawDailyNutriIntegration:
     """Integratie tussen OpenClaw en DailyNutri"""
@@ -21,77 +33,218 @@ class OpenClawDailyNutriIntegration:
         Args:
             api_key: DailyNutri API key
         """
+        self.config = load_config()
         self.client = DailyNutriAPIClient(api_key)
-        self.log_file = "/config/.openclaw/workspace/dailynutri/logs/food_log.json"
+        # Oude food_log.json (één JSON array) wordt bij eerste gebruik omgezet
+        self.log_file, legacy_file = store_paths(self.config)
         
         # Maak logs directory aan
         os.makedirs(os.path.dirname(self.log_file), exist_ok=True)
+        self.store = LogStore(self.log_file, max_entries=0, legacy_path=legacy_file)
+        # Oude entries worden niet weggegooid maar gearchiveerd en per dag samengevat
+        self.compactor = Compactor(self.store, retention_days=self.config["retention_days"],
+                                   max_entries=self.config["max_log_entries"])
+        self.store.on_commit = self.compactor.maybe_compact
+        # Totalen per dag en context voor vragen en rapporten over een periode
+        self.rollup = RollupIndex(rollup_path(self.log_file), tenant=self.client.tenant)
+        # Full-text index over items voor "wanneer/hoe vaak at ik X?"
+        self.food_search = FoodSearchIndex(food_search_path(self.log_file), tenant=self.client.tenant)
+        
+        # Opslaan en metrics gebeuren na het gateway antwoord, op de achtergrond
+        self.metrics = {"meals_logged": 0, "calories_logged": 0, "queries": 0, "cached_queries": 0,
+                        "failures": {}}
+        self._metrics_lock = threading.Lock()  # de consumer schrijft, event_stats leest
+        self.events = EventBus(queue_size=self.config["event_queue_size"])
+        self.events.subscribe("store", self._store_event, (MEAL_LOGGED, LOG_FAILED), overflow=BLOCK)
+        self.events.subscribe("rollup", self._rollup_event, (MEAL_LOGGED, LOG_FAILED), overflow=BLOCK)
+        self.events.subscribe("search", self._search_event, (MEAL_LOGGED,), overflow=BLOCK)
+        self.events.subscribe("metrics", self._count_event, (MEAL_LOGGED, QUERY_ANSWERED, LOG_FAILED))
     
-    def log_from_openclaw(self, food_description: str, context: str = None) -> Dict:
+    def log_from_openclaw(self, food_description: str, context: str = None, instant: bool = False) -> Dict:
         """
         Log food vanuit OpenClaw met context
         
         Args:
             food_description: Beschrijving van food
             context: Optionele context (bijv. "breakfast", "lunch", "dinner", "snack")
+            instant: Bij een bekende maaltijd direct antwoorden uit de nutrition memo
+                     en de echte log op de achtergrond versturen
         
         Returns:
             Dict met resultaat
         """
         timestamp = datetime.now().isoformat()
         
-        try:
-            # Voeg context toe aan beschrijving indien aanwezig
-            if context:
-                full_description = f"{context}: {food_description}"
-            else:
-                full_description = food_description
-            
-            # Log naar DailyNutri API
-            api_result = self.client.log_food(full_description)
-            
-            # Sla lokaal op
-            log_entry = {
-                "timestamp": timestamp,
-                "description": food_description,
-                "context": context,
-                "api_result": api_result,
-                "success": api_result.get('action') == 'logged'
-            }
-            
-            self._save_log_entry(log_entry)
-            
-            # Maak mooie response voor OpenClaw
-            response = {
-                "status": "success" if log_entry["success"] else "partial",
-                "message": api_result.get('reply', '✅ Food gelogd'),
+        # Voeg context toe aan beschrijving indien aanwezig
+        if context:
+            full_description = f"{context}: {food_description}"
+        else:
+            full_description = food_description
+        
+        # Alleen met instant wordt de memo gebruikt; anders kost een lookup alleen tijd
+        memo = self.client.lookup_memo(full_description) if instant else None
+        
+        if memo:
+            future = self.client.submit_log(full_description, context)
+            future.add_done_callback(
+                lambda f: self._finish_background_log(f, timestamp, food_description, context)
+            )
+            return {
+                "status": "pending",
+                "message": f"✅ Genoteerd (geschat op basis van eerdere logs): {memo['total_calories']} kcal",
                 "details": {
-                    "items_logged": len(api_result.get('items', [])),
-                    "total_calories": sum(item.get('calories', 0) for item in api_result.get('items', [])),
-                    "meal_id": api_result.get('meal_id')
+                    "items_logged": len(memo["items"]),
+                    "total_calories": memo["total_calories"],
+                    "meal_id": None,
+                    "estimated": True
                 },
-                "log_entry": log_entry
+                "memo": memo
             }
-            
-            return response
-            
-        except Exception as e:
-            # Sla failed attempt ook op
-            error_entry = {
-                "timestamp": timestamp,
-                "description": food_description,
-                "context": context,
-                "error": str(e),
-                "success": False
+        
+        try:
+            # Log naar DailyNutri API
+            api_result = self.client.log_food(full_description, context=context)
+            return self._log_response(api_result, timestamp, food_description, context)
+        
+        except OverloadedError as e:
+            # Gateway druk: de log gaat later alsnog, tenzij ook de uitgestelde wachtrij vol is
+            future = self.client.defer_log(full_description, context)
+            if future is None:
+                return self._log_error(e, timestamp, food_description, context)
+            future.add_done_callback(
+                lambda f: self._finish_background_log(f, timestamp, food_description, context)
+            )
+            return {
+                "status": "queued",
+                "message": "⏳ Het is even druk: je maaltijd staat in de wachtrij en wordt zo gelogd",
+                "reason": e.reason,
+                "details": {"items_logged": 0, "total_calories": 0, "meal_id": None}
             }
-            
-            self._save_log_entry(error_entry)
-            
+        except Exception as e:
+            return self._log_error(e, timestamp, food_description, context)
+    
+    def _log_response(self, api_result: Dict, timestamp: str, food_description: str, context: str) -> Dict:
+        """Sla een gateway resultaat lokaal op en maak de response voor OpenClaw"""
+        items = api_result.get('items', [])
+        details = {
+            "items_logged": len(items),
+            "total_calories": sum(item.get('calories', 0) for item in items),
+            "meal_id": api_result.get('meal_id')
+        }
+        
+        if api_result.get('duplicate'):
+            # Al eerder gelogd (dubbel verstuurd): niet nog eens lokaal opslaan
             return {
-                "status": "error",
-                "message": f"❌ Fout bij loggen: {str(e)}",
-                "log_entry": error_entry
+                "status": "duplicate",
+                "message": api_result.get('reply', '♻️ Al gelogd'),
+                "details": details
             }
+        
+        # Sla lokaal op
+        log_entry = {
+            "timestamp": timestamp,
+            "description": food_description,
+            "context": context,
+            "api_result": api_result,
+            "success": api_result.get('action') == 'logged'
+        }
+        
+        self.events.emit(MEAL_LOGGED, {"entry": log_entry, "api_result": api_result})
+        
+        # Maak mooie response voor OpenClaw
+        return {
+            "status": "success" if log_entry["success"] else "partial",
+            "message": api_result.get('reply', '✅ Food gelogd'),
+            "details": details,
+            "log_entry": log_entry
+        }
+    
+    def _log_error(self, error: Exception, timestamp: str, food_description: str, context: str) -> Dict:
+        """Sla een mislukte log lokaal op en maak de error response"""
+        error_entry = {
+            "timestamp": timestamp,
+            "description": food_description,
+            "context": context,
+            "error": str(error),
+            **self._error_fields(error),
+            "success": False
+        }
+        
+        self.events.emit(LOG_FAILED, {"entry": error_entry})
+        
+        return {
+            "status": "error",
+            "message": f"❌ Fout bij loggen: {str(error)}",
+            **self._error_fields(error),
+            "log_entry": error_entry
+        }
+    
+    @staticmethod
+    def _error_fields(error: Exception) -> Dict:
+        """Type fout en of opnieuw proberen zin heeft, voor responses en de log"""
+        fields = {
+            "error_type": getattr(error, "code", "invalid_request" if isinstance(error, ValueError) else "internal"),
+            "retryable": getattr(error, "retryable", False)
+        }
+        if getattr(error, "retry_after", None) is not None:
+            fields["retry_after"] = error.retry_after
+        return fields
+    
+    def _finish_background_log(self, future, timestamp: str, food_description: str, context: str):
+        """Verwerk het resultaat van een log die op de achtergrond verstuurd is"""
+        try:
+            self._log_response(future.result(), timestamp, food_description, context)
+        except Exception as e:
+            print(f"⚠️ Achtergrond log mislukt: {e}")
+            self._log_error(e, timestamp, food_description, context)
+    
+    def _store_event(self, event: str, payload: Dict):
+        """Event consumer: schrijf de log entry naar de store"""
+        self._save_log_entry(payload["entry"])
+    
+    def _rollup_event(self, event: str, payload: Dict):
+        """Event consumer: werk het rollup index bij (een nog niet opgebouwd index volgt bij de opbouw)"""
+        if self.rollup.built:
+            self.rollup.add(payload["entry"])
+    
+    def _search_event(self, event: str, payload: Dict):
+        """Event consumer: zet de items van een log in het zoekindex (als dat al opgebouwd is)"""
+        if self.food_search.built:
+            self.food_search.add(payload["entry"])
+    
+    def _count_event(self, event: str, payload: Dict):
+        """Event consumer: tellers voor logs, calorieën, queries en fouten"""
+        with self._metrics_lock:
+            self._count(event, payload)
+    
+    def _count(self, event: str, payload: Dict):
+        if event == MEAL_LOGGED:
+            self.metrics["meals_logged"] += 1
+            items = (payload.get("api_result") or {}).get('items') or []
+            self.metrics["calories_logged"] += sum(item.get('calories', 0) or 0 for item in items)
+        elif event == QUERY_ANSWERED:
+            self.metrics["queries"] += 1
+            self.metrics["cached_queries"] += 1 if payload.get("cached") else 0
+        elif event == LOG_FAILED:
+            error_type = payload["entry"].get("error_type", "internal")
+            self.metrics["failures"][error_type] = self.metrics["failures"].get(error_type, 0) + 1
+    
+    def event_stats(self) -> Dict:
+        """Event bus (wachtrijen, verwerkt, gedropt, lag) en de metrics consumer"""
+        with self._metrics_lock:
+            metrics = json.loads(json.dumps(self.metrics))
+        return {**self.events.stats(), "metrics": metrics}
+    
+    def flush(self):
+        """Wacht tot alle achtergrond logs verstuurd en opgeslagen zijn"""
+        self.client.close(wait=True)
+        self.events.flush()
+        self.compactor.wait()
+    
+    def close(self):
+        """Werk alles af en stop de achtergrond threads van deze integratie"""
+        self.flush()
+        self.events.close()
     
     def query_from_openclaw(self, question: str) -> Dict:
         """
@@ -104,7 +257,18 @@ class OpenClawDailyNutriIntegration:
             Dict met resultaat
         """
         try:
+            # Bij een krap credit budget gaan totaalvragen altijd lokaal
+            use_local = self.config["local_totals"] or self.client.ledger.status() != OK
+            local = self._local_totals(question) if use_local else None
+            if local is None and (self.config["local_food_search"] or use_local):
+                local = self._local_food_answer(question)
+            if local is not None:
+                self.events.emit(QUERY_ANSWERED, {"question": question, "reply": local['reply'], "cached": True})
+                return {"status": "success", "action": "query", "reply": local['reply'], "raw_response": local}
+            
             result = self.client.query_food_history(question)
+            self.events.emit(QUERY_ANSWERED, {"question": question, "reply": result.get('reply'),
+                                              "cached": bool(result.get('cached'))})
             
             return {
                 "status": "success",
@@ -116,13 +280,16 @@ class OpenClawDailyNutriIntegration:
         except Exception as e:
             return {
                 "status": "error",
-                "message": f"❌ Fout bij query: {str(e)}"
+                "message": f"❌ Fout bij query: {str(e)}",
+                **self._error_fields(e)
             }
     
     def get_daily_summary(self) -> Dict:
         """Haal dagelijkse samenvatting op"""
         try:
             result = self.client.get_today_summary()
+            self.events.emit(QUERY_ANSWERED, {"question": "summary", "reply": result.get('reply'),
+                                              "cached": bool(result.get('cached'))})
             
             return {
                 "status": "success",
@@ -133,46 +300,147 @@ class OpenClawDailyNutriIntegration:
         except Exception as e:
             return {
                 "status": "error",
-                "message": f"❌ Fout bij ophalen samenvatting: {str(e)}"
+                "message": f"❌ Fout bij ophalen samenvatting: {str(e)}",
+                **self._error_fields(e)
             }
     
     def _save_log_entry(self, entry: Dict):
         """Sla log entry op in JSON file"""
         try:
-            # Lees bestaande logs
-            logs = []
-            if os.path.exists(self.log_file):
-                with open(self.log_file, 'r') as f:
-                    try:
-                        logs = json.load(f)
-                    except json.JSONDecodeError:
-                        logs = []
-            
-            # Voeg nieuwe entry toe
-            logs.append(entry)
-            
-            # Bewaar (laatste 100 entries)
-            if len(logs) > 100:
-                logs = logs[-100:]
-            
-            with open(self.log_file, 'w') as f:
-                json.dump(logs, f, indent=2, default=str)
-                
+            # Locking, atomic write en bundelen van gelijktijdige appends zit in de store
+            self.store.append(entry)
         except Exception as e:
             print(f"⚠️ Kon log entry niet opslaan: {e}")
     
     def get_log_history(self, limit: int = 10) -> List[Dict]:
         """Haal log geschiedenis op"""
+        self.events.flush(["store"])  # eigen, nog wachtende logs eerst
         try:
-            if os.path.exists(self.log_file):
-                with open(self.log_file, 'r') as f:
-                    logs = json.load(f)
-                return logs[-limit:] if limit else logs
-            return []
+            return self.store.read(limit)
         except Exception as e:
             print(f"⚠️ Kon log geschiedenis niet lezen: {e}")
             return []
     
+    def get_log_page(self, limit: int = 10, before: str = None, after: str = None) -> Dict:
+        """
+        Haal een pagina log geschiedenis op rond een timestamp cursor
+        
+        Args:
+            limit: Aantal entries per pagina
+            before: Alleen entries van vóór deze ISO timestamp
+            after: Alleen entries van ná deze ISO timestamp
+        
+        Returns:
+            Dict met entries en before/after cursors voor de volgende pagina
+        """
+        self.events.flush(["store"])
+        try:
+            return self.store.read_page(limit, before=before, after=after)
+        except Exception as e:
+            print(f"⚠️ Kon log geschiedenis niet lezen: {e}")
+            return {"entries": [], "before": before, "after": after}
+    
+    def _rebuild_index(self, index: Union[RollupIndex, FoodSearchIndex]) -> int:
+        """Bouw een index opnieuw op uit het archief en de ruwe log"""
+        self.store._ensure_migrated()
+        # Onder de store lock komen er geen entries bij tijdens het lezen
+        with self.store.lock():
+            compacted_before = load_daily(self.log_file)["compacted_before"]
+            archived = self.compactor.read_archive(end=compacted_before) if compacted_before else ()
+            return index.rebuild(chain(archived, self.store.iter_range(compacted_before)),
+                                 built_at=datetime.now().isoformat())
+    
+    def rebuild_rollup(self) -> int:
+        """
+        Bouw het rollup index opnieuw op uit het archief en de ruwe log
+        
+        Returns:
+            Aantal records
+        """
+        return self._rebuild_index(self.rollup)
+    
+    def rebuild_food_search(self) -> int:
+        """
+        Bouw het zoekindex opnieuw op uit het archief en de ruwe log
+        
+        Returns:
+            Aantal geïndexeerde maaltijden
+        """
+        return self._rebuild_index(self.food_search)
+    
+    def get_totals(self, start: Union[date, str] = None, end: Union[date, str] = None,
+                   group_by: str = None) -> Dict:
+        """
+        Totalen (calorieën, eiwit, items, maaltijden) uit het rollup index
+        
+        Args:
+            start: Eerste dag (inclusief, date of YYYY-MM-DD)
+            end: Laatste dag (exclusief)
+            group_by: None, "day", "context", "week" of "month"
+        
+        Returns:
+            Dict met totalen, zie RollupIndex.get_totals
+        """
+        self.events.flush(["store", "rollup"])
+        if not self.rollup.built:
+            self.rebuild_rollup()
+        return self.rollup.get_totals(start, end, group_by)
+    
+    def _local_totals(self, question: str) -> Optional[Dict]:
+        """Beantwoord een totaalvraag ("hoeveel kcal vandaag?") uit het rollup index, of None"""
+        parsed = totals_question(question)
+        if parsed is None:
+            return None
+        metric, period, start, end = parsed
+        totals = self.get_totals(start, end)
+        labels = {"today": "Vandaag", "yesterday": "Gisteren", "week": "Deze week", "month": "Deze maand"}
+        if metric == "calories":
+            amount = f"🔥 {totals['calories']:.0f} kcal"
+        else:
+            amount = f"💪 {totals['protein']:.1f}g eiwit"
+        reply = f"{labels[period]}: {amount} ({totals['meals']} maaltijden)"
+        return {"action": "query", "reply": reply, "source": "local", "totals": totals}
+    
+    def search_food(self, text: str, start: Union[date, str] = None, end: Union[date, str] = None,
+                    limit: int = 10) -> Dict:
+        """
+        Zoek gelogde maaltijden op item of omschrijving (prefix, samenstelling en tikfouten)
+        
+        Args:
+            text: Bijv. "zalm" of "griekse yoghurt"
+            start: Eerste dag (inclusief, date of YYYY-MM-DD)
+            end: Laatste dag (exclusief)
+            limit: Maximaal aantal maaltijden in matches
+        
+        Returns:
+            Dict met count, days, first, last en matches, zie FoodSearchIndex.search
+        """
+        self.events.flush(["store", "search"])
+        if not self.food_search.built:
+            self.rebuild_food_search()
+        return self.food_search.search(text, start, end, limit)
+    
+    def _local_food_answer(self, question: str) -> Optional[Dict]:
+        """
+        Beantwoord "wanneer/hoe vaak at ik X?" uit het zoekindex, of None
+
+        Zonder lokale treffer beslist de gateway: het index kent alleen de logs
+        van dit apparaat, dus "nooit gegeten" is lokaal niet te zeggen.
+        """
+        parsed = food_question(question)
+        if parsed is None:
+            return None
+        try:
+            result = self.search_food(parsed.food, parsed.start, parsed.end, limit=1)
+        except sqlite3.Error as e:
+            # Bijv. SQLite zonder FTS5: de gateway beantwoordt de vraag
+            print(f"⚠️ Lokaal zoekindex niet beschikbaar: {e}")
+            return None
+        if not result["count"]:
+            return None
+        reply = food_reply(parsed, result, self.config["language"])
+        return {"action": "query", "reply": reply, "source": "local", "search": result}
+    
     def generate_weekly_report(self) -> str:
         """Genereer wekelijkse rapportage"""
         logs = self.get_log_history(limit=50)  # Laatste 50 entries
@@ -183,6 +451,9 @@ class OpenClawDailyNutriIntegration:
         successful_logs = [log for log in logs if log.get('success')]
         failed_logs = [log for log in logs if not log.get('success')]
         
+        today = date.today()
+        week = self.get_totals(today - timedelta(days=6), today + timedelta(days=1))
+        
         report = f"""📊 Weekly Food Log Report
 Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
 
@@ -191,6 +462,10 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
 • Successful: {len(successful_logs)} ({len(successful_logs)/max(len(logs), 1)*100:.1f}%)
 • Failed: {len(failed_logs)} ({len(failed_logs)/max(len(logs), 1)*100:.1f}%)
 
+🔥 Last 7 days:
+• {week['calories']} kcal, {week['protein']}g protein
+• {week['meals']} meals on {week['days_logged']} days ({week['calories'] / max(week['days_logged'], 1):.0f} kcal/day)
+
 🍽️ Recent Successful Logs:"""
         
         for log in successful_logs[-5:]:  # Laatste 5 successen
@@ -211,28 +486,143 @@ Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}
         report += "\n• Gebruik context (breakfast, lunch, dinner, snack)"
         
         return report
+    
+    # Geplande jobs die de gateway aanspreken; de rest (rapport uit het lokale
+    # log, compactie) gebruikt geen rate limit of credits
+    GATEWAY_JOBS = frozenset({"summary"})
+    
+    def scheduled_jobs(self) -> Dict:
+        """Jobs die de scheduler kan draaien, op naam"""
+        return {
+            "summary": self.get_daily_summary,
+            "report": self.generate_weekly_report,
+            "compact": self.compactor.compact,
+        }
+    
+    def create_scheduler(self, schedules: List[Dict] = None) -> JobScheduler:
+        """
+        Maak een in-process scheduler voor terugkerende samenvattingen en rapporten
+        
+        Jobs hergebruiken deze integratie (warme client, geladen config) in plaats
+        van per run een nieuw Python proces te starten. Jobs in GATEWAY_JOBS
+        draaien als laag-prioritair werk: bij weinig ruimte in de rate limit of
+        een krap credit budget worden ze uitgesteld. Lokale jobs (rapport,
+        compactie) draaien altijd op tijd.
+        Elke tenant krijgt een vaste verschuiving binnen `schedule_spread`, zodat
+        niet alle tenants tegelijk om 20:00 de gateway aanspreken.
+        
+        Args:
+            schedules: Lijst met {"job", "at" | "every", "weekday"} (default uit config)
+        
+        Returns:
+            JobScheduler (nog niet gestart)
+        """
+        results = LogStore(state_path(self.config, "scheduled_results.jsonl"))
+        
+        def on_result(job_name: str, tenant: str, result):
+            results.append({
+                "timestamp": datetime.now().isoformat(),
+                "job": job_name,
+                "tenant": tenant,
+                "result": result
+            })
+        
+        scheduler = JobScheduler(
+            can_run=lambda: self.client.rate_limiter.headroom() >= 0.25 and self.client.ledger.allow(SUMMARY),
+            on_result=on_result
+        )
+        
+        jobs = self.scheduled_jobs()
+        tenant = self.client.tenant
+        offset = tenant_offset(tenant, self.config["schedule_spread"])
+        for spec in schedules if schedules is not None else self.config["schedules"]:
+            if spec.get("job") not in jobs:
+                print(f"⚠️ Onbekende geplande job: {spec.get('job')}")
+                continue
+            scheduler.add_job(spec["job"], jobs[spec["job"]], Schedule.from_dict(spec, offset), tenant,
+                              low_priority=spec["job"] in self.GATEWAY_JOBS)
+        
+        return scheduler
+
+
+_NO_SERVICE = object()
+_service_client: Optional[ServiceClient] = None
+_service_client_lock = threading.Lock()
+
+
+def _shared_service_client(config) -> ServiceClient:
+    """
+    Eén ServiceClient per proces (keep-alive verbinding per thread); alleen
+    opnieuw gemaakt als het service adres in de config verandert
+    """
+    global _service_client
+    address = service_address(config)
+    client = _service_client
+    if client is None or client.address != address:
+        with _service_client_lock:
+            if _service_client is None or _service_client.address != address:
+                _service_client = ServiceClient(address)
+            client = _service_client
+    return client
+
+
+def _via_service(method: str, api_key: str = None, **params):
+    """
+    Resultaat van een draaiende lokale service, of _NO_SERVICE
+    
+    Met een eigen api_key wordt de service (die zijn eigen key heeft) overgeslagen.
+    """
+    config = load_config()  # gecachet; hooguit eens per seconde een stat check
+    if api_key or not config["use_service"]:
+        return _NO_SERVICE
+    try:
+        return _shared_service_client(config).call(method, **params)
+    except ServiceUnavailable:
+        return _NO_SERVICE
 
 
 # Eenvoudige wrapper functies voor OpenClaw
 def log_food_openclaw(food_description: str, context: str = None, api_key: str = None) -> Dict:
     """Log food vanuit OpenClaw"""
+    result = _via_service("log", api_key, description=food_description, context=context)
+    if result is not _NO_SERVICE:
+        return result
     integrator = OpenClawDailyNutriIntegration(api_key)
-    return integrator.log_from_openclaw(food_description, context)
+    try:
+        return integrator.log_from_openclaw(food_description, context)
+    finally:
+        integrator.close()
 
 def query_food_openclaw(question: str, api_key: str = None) -> Dict:
     """Query food vanuit OpenClaw"""
+    result = _via_service("query", api_key, question=question)
+    if result is not _NO_SERVICE:
+        return result
     integrator = OpenClawDailyNutriIntegration(api_key)
-    return integrator.query_from_openclaw(question)
+    try:
+        return integrator.query_from_openclaw(question)
+    finally:
+        integrator.close()
 
 def get_daily_summary_openclaw(api_key: str = None) -> Dict:
     """Haal dagelijkse samenvatting op"""
+    result = _via_service("summary", api_key)
+    if result is not _NO_SERVICE:
+        return result
     integrator = OpenClawDailyNutriIntegration(api_key)
-    return integrator.get_daily_summary()
+    try:
+        return integrator.get_daily_summary()
+    finally:
+        integrator.close()
 
 
 if __name__ == "__main__":
     """Test de OpenClaw integratie"""
     import sys
+    from profiling import enable_from_config, pop_profile_flag
+
+    # --profile[=sample|cprofile] of DAILY_NUTRI_PROFILE; SIGUSR1 schakelt tijdens de run
+    enable_from_config("openclaw_integration", mode=pop_profile_flag(sys.argv))
     
     def print_usage():
         print("Usage: python openclaw_integration.py <command> [args]")
@@ -240,8 +630,21 @@ if __name__ == "__main__":
         print("  log <description> [context] - Log food")
         print("  query <question>            - Stel vraag")
         print("  summary                     - Dagelijkse samenvatting")
-        print("  history [limit]             - Toon log geschiedenis")
+        print("  history [limit] [--before TS] [--after TS]")
+        print("                              - Toon log geschiedenis (pagina's via timestamp cursor)")
         print("  report                      - Genereer wekelijks rapport")
+        print("  scheduler                   - Draai geplande samenvattingen/rapporten (blijft actief)")
+        print("  compact                     - Archiveer oude logs en werk dag aggregaten bij")
+        print("  totals [start] [end] [--by day|context|week|month]")
+        print("                              - Totalen per periode uit het rollup index (datums inclusief)")
+        print("  rollup                      - Bouw het rollup index opnieuw op uit de log")
+        print("  search <tekst>              - Zoek gelogde maaltijden op item (prefix, tikfouten)")
+        print("  warmup                      - Verbind met de gateway en toon readiness")
+        print("  usage                       - Gateway calls, credits en budget status")
+        print("  serve [address]             - Draai de lokale service (unix:<pad> of host:port)")
+        print("\nOpties:")
+        print("  --profile[=sample|cprofile]  - Profiel van deze run (zie profiling.py)")
+        print("\nDraait er een service (serve), dan gaan log, query, summary, history, search en report daarheen.")
         print("\nVoorbeeld:")
         print('  python openclaw_integration.py log "Ik heb een appel gegeten" breakfast')
         print('  python openclaw_integration.py query "Wat heb ik gisteren gegeten?"')
@@ -253,7 +656,30 @@ if __name__ == "__main__":
     
     command = sys.argv[1].lower()
     
+    def run_via_service():
+        """Resultaat van een draaiende service voor dit command, of _NO_SERVICE"""
+        args = sys.argv[2:]
+        if command == "log" and args:
+            return _via_service("log", description=args[0], context=args[1] if len(args) >= 2 else None)
+        if command == "query" and args:
+            return _via_service("query", question=' '.join(args))
+        if command == "summary":
+            return _via_service("summary")
+        if command == "history" and "--before" not in args and "--after" not in args:
+            return _via_service("history", limit=int(args[0]) if args else 10)
+        if command == "search" and args:
+            return _via_service("search", text=' '.join(args))
+        if command == "report":
+            result = _via_service("report")
+            return result if result is _NO_SERVICE else result["report"]
+        return _NO_SERVICE
+    
     try:
+        result = run_via_service()
+        if result is not _NO_SERVICE:
+            print(result if isinstance(result, str) else json.dumps(result, indent=2, default=str))
+            sys.exit(0)
+        
         integrator = OpenClawDailyNutriIntegration()
         
         if command == "log" and len(sys.argv) >= 3:
@@ -261,6 +687,7 @@ if __name__ == "__main__":
             context = sys.argv[3] if len(sys.argv) >= 4 else None
             result = integrator.log_from_openclaw(description, context)
             print(json.dumps(result, indent=2, default=str))
+            integrator.flush()
         
         elif command == "query" and len(sys.argv) >= 3:
             question = ' '.join(sys.argv[2:])
@@ -272,14 +699,77 @@ if __name__ == "__main__":
             print(json.dumps(result, indent=2, default=str))
         
         elif command == "history":
-            limit = int(sys.argv[2]) if len(sys.argv) >= 3 else 10
-            history = integrator.get_log_history(limit)
-            print(json.dumps(history, indent=2, default=str))
+            args = sys.argv[2:]
+            cursors = {}
+            for flag in ("--before", "--after"):
+                if flag in args:
+                    i = args.index(flag)
+                    cursors[flag[2:]] = args[i + 1]
+                    del args[i:i + 2]
+            limit = int(args[0]) if args else 10
+            if cursors:
+                page = integrator.get_log_page(limit, **cursors)
+                print(json.dumps(page, indent=2, default=str))
+            else:
+                history = integrator.get_log_history(limit)
+                print(json.dumps(history, indent=2, default=str))
         
         elif command == "report":
             report = integrator.generate_weekly_report()
             print(report)
         
+        elif command == "compact":
+            result = integrator.compactor.compact()
+            print(json.dumps(result, indent=2))
+        
+        elif command == "totals":
+            args = sys.argv[2:]
+            group_by = None
+            if "--by" in args:
+                i = args.index("--by")
+                group_by = args[i + 1]
+                del args[i:i + 2]
+            today = date.today()
+            start = date.fromisoformat(args[0]) if args else today - timedelta(days=6)
+            end = date.fromisoformat(args[1]) if len(args) >= 2 else today
+            totals = integrator.get_totals(start, end + timedelta(days=1), group_by)
+            print(json.dumps(totals, indent=2))
+        
+        elif command == "rollup":
+            records = integrator.rebuild_rollup()
+            print(f"✅ Rollup index opgebouwd: {records} records")
+        
+        elif command == "search" and len(sys.argv) >= 3:
+            result = integrator.search_food(' '.join(sys.argv[2:]))
+            print(json.dumps(result, indent=2, ensure_ascii=False))
+        
+        elif command == "usage":
+            print(json.dumps(integrator.client.usage(), indent=2))
+        
+        elif command == "warmup":
+            report = integrator.client.warm_up(integrator.client.pool_size)
+            print(json.dumps(report, indent=2))
+            if not report["ready"]:
+                sys.exit(1)
+        
+        elif command == "serve":
+            import signal
+            import threading
+            service = IntegrationService(integrator, sys.argv[2] if len(sys.argv) >= 3 else None)
+            # SIGTERM stopt netjes: openstaande logs worden eerst opgeslagen
+            signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=service.server.shutdown).start())
+            print(f"🔌 DailyNutri service op {service.address}")
+            try:
+                service.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        
+        elif command == "scheduler":
+            scheduler = integrator.create_scheduler()
+            print("⏰ Geplande jobs:")
+            print(json.dumps(scheduler.next_runs(), indent=2))
+            scheduler.run_forever()
+        
         else:
             print_usage()
     
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Profiling
+Opt-in profiling voor de CLI's en langlopende processen: cProfile of periodieke
+stack sampling, met collapsed-stack of speedscope output
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import signal
+import cProfile
+import pstats
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+MODES = ("sample", "cprofile")
+FORMATS = ("collapsed", "speedscope")
+
+
+def _frame_name(code) -> str:
+    # ';' scheidt frames in collapsed stacks en mag dus niet in een naam staan
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+class StackSampler:
+    """
+    Sampling profiler: neemt elke `interval` seconden de stacks van alle threads
+
+    Werkt met sys._current_frames vanuit een eigen thread, dus zonder tracing
+    overhead in de geprofileerde code. Identieke stacks worden geteld in plaats
+    van bewaard, zodat het geheugen begrensd blijft bij lange runs.
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        """
+        Args:
+            interval: Seconden tussen twee samples
+            include_idle: Ook threads meetellen die staan te wachten (lock, sleep, select)
+        """
+        self.interval = interval
+        self.include_idle = include_idle
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="dailynutri-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def take(self) -> Tuple[Counter, int, float, float]:
+        """Haal de verzamelde stacks op en begin opnieuw (voor tijdvensters)"""
+        with self._lock:
+            counts, samples, started = self.counts, self.samples, self.started_at
+            self.counts, self.samples, self.started_at = Counter(), 0, time.time()
+        return counts, samples, started or time.time(), time.time()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if not self.include_idle and frame.f_code.co_name in ("wait", "sleep", "select", "poll", "accept"):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self.samples += 1
+                self.counts.update(stacks)
+
+
+def write_collapsed(counts: Counter, path: str):
+    """Collapsed stacks (flamegraph.pl / speedscope / inferno): 'a;b;c 12' per regel"""
+    with open(path, 'w') as f:
+        for stack, count in counts.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def write_speedscope(counts: Counter, path: str, name: str, interval: float, start: float, end: float):
+    """Speedscope 'sampled' profiel, één profiel per thread"""
+    frames: Dict[str, int] = {}
+    profiles: Dict[str, Dict] = {}
+    for stack, count in counts.items():
+        thread, *parts = stack.split(";")
+        indexes = [frames.setdefault(part, len(frames)) for part in parts]
+        profile = profiles.setdefault(thread, {
+            "type": "sampled", "name": f"{name} · {thread}", "unit": "seconds",
+            "startValue": 0, "endValue": round(end - start, 6), "samples": [], "weights": [],
+        })
+        profile["samples"].append(indexes)
+        profile["weights"].append(round(count * interval, 6))
+
+    document = {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "dailynutri-profiling",
+        "activeProfileIndex": 0,
+        "shared": {"frames": [{"name": frame} for frame in frames]},
+        "profiles": list(profiles.values()),
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f)
+
+
+class Profiler:
+    """
+    Start/stop profiling en schrijf per run (of per tijdvenster) een bestand
+
+    mode "sample": StackSampler, output als collapsed stacks of speedscope.
+    mode "cprofile": cProfile van de thread die start() aanroept, output als
+    .prof (pstats/snakeviz) plus een tekst top 30.
+    """
+
+    def __init__(self, name: str, mode: str = "sample", output_dir: str = ".", fmt: str = "speedscope",
+                 interval: float = 0.005, window: float = 0):
+        """
+        Args:
+            name: Naam van het proces, komt in de bestandsnaam
+            mode: sample of cprofile
+            output_dir: Map voor de profielen
+            fmt: collapsed of speedscope (alleen voor sample)
+            interval: Sample interval in seconden
+            window: Schrijf elke `window` seconden een apart bestand (0 = één per run)
+        """
+        if mode not in MODES:
+            raise ValueError(f"Profiling mode moet een van {', '.join(MODES)} zijn")
+        if fmt not in FORMATS:
+            raise ValueError(f"Profiling formaat moet een van {', '.join(FORMATS)} zijn")
+        self.name = name
+        self.mode = mode
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.interval = interval
+        self.window = window
+        self._sampler: Optional[StackSampler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._window_timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+
+    @property
+    def running(self) -> bool:
+        return self._sampler is not None or self._cprofile is not None
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            if self.mode == "cprofile":
+                self._cprofile = cProfile.Profile()
+                self._cprofile.enable()
+            else:
+                self._sampler = StackSampler(self.interval)
+                self._sampler.start()
+                self._schedule_window()
+            print(f"🔬 Profiling gestart ({self.mode})", file=sys.stderr)
+
+    def stop(self) -> Optional[str]:
+        """Stop en schrijf het profiel; retourneert het pad"""
+        with self._lock:
+            if self._window_timer:
+                self._window_timer.cancel()
+                self._window_timer = None
+            if self._cprofile is not None:
+                profile, self._cprofile = self._cprofile, None
+                profile.disable()
+                return self._write_cprofile(profile)
+            if self._sampler is not None:
+                sampler, self._sampler = self._sampler, None
+                sampler.stop()
+                return self._write_samples(sampler)
+        return None
+
+    def toggle(self) -> Optional[str]:
+        """Start als profiling uit staat, anders stoppen en schrijven"""
+        if self.running:
+            return self.stop()
+        self.start()
+        return None
+
+    def _schedule_window(self):
+        if not self.window:
+            return
+        self._window_timer = threading.Timer(self.window, self._rotate)
+        self._window_timer.daemon = True
+        self._window_timer.start()
+
+    def _rotate(self):
+        with self._lock:
+            if self._sampler is None:
+                return
+            self._write_samples(self._sampler)
+            self._schedule_window()
+
+    def _path(self, extension: str) -> str:
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        return os.path.join(self.output_dir, f"{self.name}-{os.getpid()}-{stamp}{extension}")
+
+    def _write_samples(self, sampler: StackSampler) -> str:
+        counts, samples, start, end = sampler.take()
+        if self.fmt == "collapsed":
+            path = self._path(".collapsed")
+            write_collapsed(counts, path)
+        else:
+            path = self._path(".speedscope.json")
+            write_speedscope(counts, path, self.name, self.interval, start, end)
+        print(f"🔬 Profiel ({samples} samples) opgeslagen in {path}", file=sys.stderr)
+        return path
+
+    def _write_cprofile(self, profile: cProfile.Profile) -> str:
+        path = self._path(".prof")
+        profile.dump_stats(path)
+        with open(path[:-len(".prof")] + ".txt", 'w') as f:
+            pstats.Stats(profile, stream=f).sort_stats("cumulative").print_stats(30)
+        print(f"🔬 cProfile opgeslagen in {path}", file=sys.stderr)
+        return path
+
+
+def install_signal_toggle(profiler: Profiler, signum: int = None) -> bool:
+    """
+    Schakel profiling aan/uit met een signaal (default SIGUSR1), bijv. `kill -USR1 <pid>`
+
+    Returns:
+        False als het platform of de thread geen signal handlers toestaat
+    """
+    signum = signum or getattr(signal, "SIGUSR1", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def handler(_signum, _frame):
+        if profiler.mode == "cprofile":
+            # cProfile meet alleen de thread die enable() aanroept: de main thread
+            profiler.toggle()
+            return
+        # Niet in de handler zelf schrijven: die onderbreekt willekeurige code
+        threading.Thread(target=profiler.toggle, name="dailynutri-profile-toggle", daemon=True).start()
+
+    signal.signal(signum, handler)
+    return True
+
+
+def pop_profile_flag(argv: List[str]) -> Optional[str]:
+    """
+    Haal `--profile` of `--profile=<mode>` uit argv (in place)
+
+    Returns:
+        De mode ("sample" zonder waarde), of None als de vlag ontbreekt
+    """
+    for index, arg in enumerate(argv):
+        if arg == "--profile" or arg.startswith("--profile="):
+            del argv[index]
+            return arg.partition("=")[2] or "sample"
+    return None
+
+
+_enabled: Dict[str, Profiler] = {}
+_enabled_lock = threading.Lock()
+
+
+def enable_from_config(name: str, config=None, mode: str = None) -> Optional[Profiler]:
+    """
+    Profiling voor een CLI entry point of resident proces volgens de config
+
+    Met `profile` = sample/cprofile (of `mode`, bijv. uit --profile) start
+    profiling meteen en wordt bij het afsluiten geschreven. Daarnaast kan het
+    altijd met SIGUSR1 aan- en uitgezet worden. Een tweede aanroep met
+    dezelfde naam (bijv. __main__ en daarna de constructor van de bot) geeft
+    de bestaande Profiler terug.
+
+    Returns:
+        De Profiler (ook als hij nog niet draait)
+    """
+    with _enabled_lock:
+        profiler = _enabled.get(name)
+        if profiler is None:
+            profiler = _enable(name, config, mode)
+            if profiler is not None:
+                _enabled[name] = profiler
+        elif mode and not profiler.running:
+            profiler.start()
+        return profiler
+
+
+def _enable(name: str, config, mode: Optional[str]) -> Optional[Profiler]:
+    if config is None:
+        from config_loader import load_config
+        config = load_config()
+    from config_loader import state_path
+
+    mode = mode or config.get("profile")
+    try:
+        profiler = Profiler(
+            name,
+            mode=mode or "sample",
+            output_dir=config.get("profile_dir") or state_path(config, "profiles"),
+            fmt=config.get("profile_format") or "speedscope",
+            interval=config.get("profile_interval") or 0.005,
+            window=config.get("profile_window") or 0,
+        )
+    except ValueError as e:
+        print(f"⚠️ Profiling uitgeschakeld: {e}", file=sys.stderr)
+        return None
+
+    install_signal_toggle(profiler)
+    if mode:
+        profiler.start()
+    atexit.register(profiler.stop)
+    return profiler
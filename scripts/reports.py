@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Rapportage
+Bulk rapporten over alle tenants en periodes, parallel over een process pool
+"""
+
+import os
+import io
+import csv
+import sys
+import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+from log_store import LogStore
+from retention import load_daily
+from rollup import RollupIndex, rollup_path
+from config_loader import load_config, state_path, store_paths, tenant_id
+
+PERIODS = ("week", "month")
+FORMATS = ("text", "json", "csv")
+
+CSV_FIELDS = ("tenant", "period", "start", "end", "logs", "successful", "failed",
+              "days_logged", "total_calories", "total_protein", "avg_calories_per_day", "top_foods")
+
+
+def _period_start(day: date, period: str) -> date:
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Onbekende periode: {period}")
+
+
+def _next_period(start: date, period: str) -> date:
+    if period == "week":
+        return start + timedelta(days=7)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def _period_label(start: date, period: str) -> str:
+    if period == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    return start.strftime("%Y-%m")
+
+
+def period_ranges(since: date, until: date, period: str = "week") -> List[Tuple[str, date, date]]:
+    """
+    Hele weken (maandag t/m zondag) of maanden die [since, until] overlappen
+
+    Returns:
+        Lijst met (label, start, end), end exclusief
+    """
+    ranges = []
+    start = _period_start(since, period)
+    while start <= until:
+        end = _next_period(start, period)
+        ranges.append((_period_label(start, period), start, end))
+        start = end
+    return ranges
+
+
+def _shards(tenant: str, path: str, label: str, start: date, end: date,
+            shard_days: int) -> Iterable[Tuple]:
+    """Deel een periode op in stukken van hooguit `shard_days` dagen"""
+    while start < end:
+        shard_end = min(start + timedelta(days=shard_days), end)
+        yield (tenant, path, label, start.isoformat(), shard_end.isoformat())
+        start = shard_end
+
+
+def _empty_aggregate() -> Dict:
+    return {
+        "logs": 0,
+        "successful": 0,
+        "failed": 0,
+        "total_calories": 0.0,
+        "total_protein": 0.0,
+        "days": set(),
+        "foods": Counter(),
+        "errors": Counter(),
+    }
+
+
+def aggregate_shard(task: Tuple) -> Tuple[str, str, Dict]:
+    """
+    Tel één tenant × datumbereik op (draait in een worker proces)
+
+    Als de store een opgebouwd rollup index heeft, komt alles uit dat index
+    (één record per dag en context). Anders komen dagen die al gecompacteerd
+    zijn uit de dag aggregaten en wordt de rest uit de ruwe log gelezen.
+
+    Args:
+        task: (tenant, pad naar de food log, periode label, start, end)
+
+    Returns:
+        (tenant, label, deel aggregaat)
+    """
+    tenant, path, label, start, end = task
+    aggregate = _empty_aggregate()
+
+    if os.path.exists(rollup_path(path)):
+        index = RollupIndex(rollup_path(path))
+        try:
+            if index.built:
+                for row in index.rows(start, end):
+                    _add_day(aggregate, row["day"],
+                             dict(row, total_calories=row["calories"], total_protein=row["protein"]))
+                return tenant, label, aggregate
+        finally:
+            index.close()
+
+    daily = load_daily(path)
+    raw_start = start
+    if daily["compacted_before"]:
+        for day, counts in daily["days"].items():
+            if start <= day < end:
+                _add_day(aggregate, day, counts)
+        raw_start = max(start, daily["compacted_before"])
+
+    for entry in LogStore(path, max_entries=0).read_range(raw_start, end):
+        aggregate["logs"] += 1
+        if not entry.get('success'):
+            aggregate["failed"] += 1
+            aggregate["errors"][str(entry.get('error') or 'Unknown error')[:50]] += 1
+            continue
+        aggregate["successful"] += 1
+        aggregate["days"].add(str(entry.get('timestamp', ''))[:10])
+        for item in (entry.get('api_result') or {}).get('items') or []:
+            aggregate["total_calories"] += item.get('calories', 0) or 0
+            aggregate["total_protein"] += item.get('protein', 0) or 0
+            if item.get('item_name'):
+                aggregate["foods"][item['item_name'].lower()] += 1
+
+    return tenant, label, aggregate
+
+
+def _add_day(aggregate: Dict, day: str, counts: Dict):
+    """Tel een dag aggregaat uit het archief (of een rollup record) mee"""
+    for key in ("logs", "successful", "failed", "total_calories", "total_protein"):
+        aggregate[key] += counts.get(key, 0)
+    if counts.get("successful"):
+        aggregate["days"].add(day)
+    aggregate["foods"].update(counts.get("foods", {}))
+    aggregate["errors"].update(counts.get("errors", {}))
+
+
+def merge_aggregates(partials: Iterable[Tuple[str, str, Dict]]) -> Dict[Tuple[str, str], Dict]:
+    """Voeg deel aggregaten samen per (tenant, periode)"""
+    merged: Dict[Tuple[str, str], Dict] = {}
+    for tenant, label, partial in partials:
+        total = merged.setdefault((tenant, label), _empty_aggregate())
+        for key in ("logs", "successful", "failed", "total_calories", "total_protein"):
+            total[key] += partial[key]
+        total["days"] |= partial["days"]
+        total["foods"].update(partial["foods"])
+        total["errors"].update(partial["errors"])
+    return merged
+
+
+def discover_stores(config: Mapping = None, root: str = None) -> Dict[str, str]:
+    """
+    Food logs per tenant
+
+    De eigen log hoort bij de tenant uit de config; andere tenants staan
+    als <root>/<tenant>/food_log.jsonl (default root: logs/tenants).
+    """
+    config = config or load_config()
+    stores = {tenant_id(config): store_paths(config)[0]}
+    root = root or state_path(config, "tenants")
+    try:
+        names = sorted(os.listdir(root))
+    except FileNotFoundError:
+        names = []
+    for name in names:
+        path = os.path.join(root, name, "food_log.jsonl")
+        if os.path.isfile(path):
+            stores[name] = path
+    return stores
+
+
+class ReportEngine:
+    """
+    Bouwt rapporten voor veel tenants en periodes tegelijk
+
+    Elke tenant × periode wordt in shards van hooguit een week opgedeeld;
+    de shards lezen hun store onafhankelijk in een process pool en de deel
+    aggregaten worden daarna samengevoegd. Een volledige rebuild schaalt zo
+    met het aantal cores.
+    """
+
+    def __init__(self, stores: Mapping[str, str], workers: Optional[int] = None, shard_days: int = 7):
+        """
+        Args:
+            stores: Tenant -> pad naar food_log.jsonl
+            workers: Aantal processen (default: aantal cores, 1 = in dit proces)
+            shard_days: Maximaal aantal dagen per shard
+        """
+        self.stores = dict(stores)
+        self.workers = workers or os.cpu_count() or 1
+        self.shard_days = max(1, shard_days)
+
+    def tasks(self, since: date, until: date, period: str = "week") -> List[Tuple]:
+        """Alle shards voor [since, until]"""
+        tasks = []
+        for label, start, end in period_ranges(since, until, period):
+            for tenant, path in self.stores.items():
+                tasks.extend(_shards(tenant, path, label, start, end, self.shard_days))
+        return tasks
+
+    def build(self, since: date, until: date, period: str = "week") -> List[Dict]:
+        """
+        Rapporten per tenant en periode
+
+        Returns:
+            Lijst met rapport dicts, gesorteerd op tenant en periode
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Periode moet een van {', '.join(PERIODS)} zijn")
+
+        tasks = self.tasks(since, until, period)
+        if self.workers <= 1 or len(tasks) <= 1:
+            partials = map(aggregate_shard, tasks)
+            merged = merge_aggregates(partials)
+        else:
+            chunksize = max(1, len(tasks) // (self.workers * 4))
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+                merged = merge_aggregates(pool.map(aggregate_shard, tasks, chunksize=chunksize))
+
+        bounds = {label: (start, end) for label, start, end in period_ranges(since, until, period)}
+        reports = []
+        for (tenant, label), aggregate in sorted(merged.items()):
+            start, end = bounds[label]
+            days = len(aggregate["days"])
+            reports.append({
+                "tenant": tenant,
+                "period": label,
+                "start": start.isoformat(),
+                "end": (end - timedelta(days=1)).isoformat(),
+                "logs": aggregate["logs"],
+                "successful": aggregate["successful"],
+                "failed": aggregate["failed"],
+                "days_logged": days,
+                "total_calories": round(aggregate["total_calories"], 1),
+                "total_protein": round(aggregate["total_protein"], 1),
+                "avg_calories_per_day": round(aggregate["total_calories"] / days, 1) if days else 0.0,
+                "top_foods": [name for name, _ in aggregate["foods"].most_common(5)],
+                "top_errors": [error for error, _ in aggregate["errors"].most_common(3)],
+            })
+        return reports
+
+
+def render_text(reports: List[Dict]) -> str:
+    """Leesbare rapportage, één blok per tenant en periode"""
+    if not reports:
+        return "📊 Geen food logs gevonden voor rapportage."
+
+    blocks = []
+    for report in reports:
+        success_rate = report["successful"] / max(report["logs"], 1) * 100
+        block = f"""📊 {report['period']} ({report['start']} – {report['end']}) · tenant {report['tenant']}
+• Logs: {report['logs']} ({success_rate:.1f}% succesvol, {report['failed']} mislukt)
+• Dagen gelogd: {report['days_logged']}
+• Totaal: {report['total_calories']} kcal, {report['total_protein']}g eiwit
+• Gemiddeld per dag: {report['avg_calories_per_day']} kcal"""
+        if report["top_foods"]:
+            block += f"\n• Meest gelogd: {', '.join(report['top_foods'])}"
+        if report["top_errors"]:
+            block += f"\n• Fouten: {'; '.join(report['top_errors'])}"
+        blocks.append(block)
+    return "\n\n".join(blocks)
+
+
+def render_json(reports: List[Dict]) -> str:
+    return json.dumps(reports, indent=2, ensure_ascii=False)
+
+
+def render_csv(reports: List[Dict]) -> str:
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for report in reports:
+        writer.writerow(dict(report, top_foods="; ".join(report["top_foods"])))
+    return out.getvalue()
+
+
+RENDERERS = {"text": render_text, "json": render_json, "csv": render_csv}
+
+
+if __name__ == "__main__":
+    """Bulk rapporten vanaf de command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="DailyNutri bulk rapportage")
+    parser.add_argument("--period", choices=PERIODS, default="week")
+    parser.add_argument("--since", help="Startdatum YYYY-MM-DD (default: 4 weken of 3 maanden terug)")
+    parser.add_argument("--until", help="Einddatum YYYY-MM-DD (default: vandaag)")
+    parser.add_argument("--format", choices=FORMATS, default="text")
+    parser.add_argument("--workers", type=int, default=None, help="Aantal processen (default: aantal cores)")
+    parser.add_argument("--root", help="Map met <tenant>/food_log.jsonl (default: logs/tenants)")
+    parser.add_argument("--output", help="Schrijf naar bestand in plaats van stdout")
+    args = parser.parse_args()
+
+    try:
+        until = date.fromisoformat(args.until) if args.until else date.today()
+        if args.since:
+            since = date.fromisoformat(args.since)
+        else:
+            since = until - timedelta(weeks=4 if args.period == "week" else 13)
+    except ValueError as e:
+        print(f"❌ Ongeldige datum: {e}")
+        sys.exit(1)
+
+    engine = ReportEngine(discover_stores(root=args.root), workers=args.workers)
+    output = RENDERERS[args.format](engine.build(since, until, args.period))
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            f.write(output)
+        print(f"✅ Rapport opgeslagen in {args.output}")
+    else:
+        print(output)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Retentie
+Compactie van de food log: recente entries blijven ruw, oudere gaan gecomprimeerd
+naar het archief en worden samengevat in dag aggregaten
+"""
+
+import os
+import io
+import gzip
+import json
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from log_store import FileLock, LockTimeoutError, LogStore, atomic_write
+
+try:
+    import zstandard
+except ImportError:  # optioneel; gzip is altijd beschikbaar
+    zstandard = None
+
+# Aantal meest gelogde items / fouten dat per dag bewaard blijft
+TOP_ITEMS_PER_DAY = 20
+
+
+def archive_dir(log_path: str) -> str:
+    """Map met gecomprimeerde segmenten naast de food log"""
+    return log_path + ".archive"
+
+
+def aggregates_path(log_path: str) -> str:
+    """Bestand met dag aggregaten naast de food log"""
+    base = log_path[:-len(".jsonl")] if log_path.endswith(".jsonl") else log_path
+    return base + ".daily.json"
+
+
+def _compress(data: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return ".zst", zstandard.ZstdCompressor(level=10).compress(data)
+    return ".gz", gzip.compress(data, compresslevel=9)
+
+
+def _open_segment(path: str):
+    """Open een segment als stroom van regels, zonder het hele bestand uit te pakken"""
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{path} is met zstd gecomprimeerd; installeer 'zstandard' om het te lezen")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')))
+    return gzip.open(path, 'rb')
+
+
+def load_daily(log_path: str) -> Dict:
+    """
+    Dag aggregaten van een food log
+
+    Returns:
+        Dict met compacted_before (ISO timestamp; alles daarvoor zit in het
+        archief) en days (datum -> aggregaat)
+    """
+    try:
+        with open(aggregates_path(log_path), 'r') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        state = {}
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Kon dag aggregaten niet lezen: {e}")
+        state = {}
+    state.setdefault("compacted_before", None)
+    state.setdefault("days", {})
+    return state
+
+
+def _add_to_day(day: Dict, entry: Dict):
+    day["logs"] = day.get("logs", 0) + 1
+    if not entry.get('success'):
+        day["failed"] = day.get("failed", 0) + 1
+        errors = Counter(day.get("errors", {}))
+        errors[str(entry.get('error') or 'Unknown error')[:50]] += 1
+        day["errors"] = dict(errors.most_common(TOP_ITEMS_PER_DAY))
+        return
+    day["successful"] = day.get("successful", 0) + 1
+    foods = Counter(day.get("foods", {}))
+    for item in (entry.get('api_result') or {}).get('items') or []:
+        day["total_calories"] = day.get("total_calories", 0) + (item.get('calories', 0) or 0)
+        day["total_protein"] = day.get("total_protein", 0) + (item.get('protein', 0) or 0)
+        if item.get('item_name'):
+            foods[item['item_name'].lower()] += 1
+    day["foods"] = dict(foods.most_common(TOP_ITEMS_PER_DAY))
+
+
+class Compactor:
+    """
+    Verplaatst oude food log entries naar archief segmenten en dag aggregaten
+
+    Entries ouder dan `retention_days` (en, met `max_entries`, alles boven dat
+    aantal) worden per maand gecomprimeerd weggeschreven (zstd als
+    `zstandard` geïnstalleerd is, anders gzip) en per dag opgeteld. Archiveren
+    gebeurt zonder de store lock; alleen het afknippen van de ruwe log houdt de
+    lock kort vast. Een onderbroken compactie kan veilig opnieuw: segmenten
+    worden atomair overschreven en `compacted_before` voorkomt dubbel tellen.
+    """
+
+    def __init__(self, store: LogStore, retention_days: int = 30, max_entries: int = 0,
+                 check_interval: float = 300.0):
+        """
+        Args:
+            store: De LogStore met de ruwe food log
+            retention_days: Dagen dat entries ruw bewaard blijven (0 = geen leeftijdsgrens)
+            max_entries: Maximaal aantal ruwe entries (0 = geen limiet)
+            check_interval: Minimaal aantal seconden tussen twee achtergrond compacties
+        """
+        if store.max_entries:
+            raise ValueError("Compactor vereist een LogStore zonder max_entries (de compactor knipt zelf af)")
+        self.store = store
+        self.retention_days = retention_days
+        self.max_entries = max_entries
+        self.check_interval = check_interval
+        self.archive_dir = archive_dir(store.path)
+        self.aggregates_path = aggregates_path(store.path)
+        self.compact_lock_path = store.compact_lock_path
+
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._next_check = 0.0
+
+    def maybe_compact(self):
+        """Start een compactie op de achtergrond als dat lang genoeg geleden is"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check or (self._thread and self._thread.is_alive()):
+                return
+            self._next_check = now + self.check_interval
+            self._thread = threading.Thread(target=self._compact_quietly,
+                                            name="dailynutri-compactor", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: float = None):
+        """Wacht op een lopende achtergrond compactie"""
+        thread = self._thread
+        if thread:
+            thread.join(timeout)
+
+    def _compact_quietly(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"⚠️ Compactie van de food log mislukt: {e}")
+
+    def _cut_offset(self, mm, now: datetime) -> Tuple[int, Optional[str]]:
+        """
+        Byte offset tot waar entries gearchiveerd worden
+
+        Returns:
+            (offset, grens): alles vóór de grens timestamp gaat naar het archief
+        """
+        cut, boundary = 0, None
+        if self.retention_days:
+            boundary = (now - timedelta(days=self.retention_days)).date().isoformat()
+            cut = self.store._seek_timestamp(mm, boundary)
+        if self.max_entries:
+            start = None
+            for count, (start, _) in enumerate(self.store._reverse_lines(mm, len(mm)), 1):
+                if count >= self.max_entries:
+                    break
+            else:
+                start = None
+            if start is not None and start > cut:
+                # Niet midden in een reeks gelijke timestamps knippen
+                first = self.store._decode(mm, start, mm.find(b"\n", start)) or {}
+                boundary = str(first.get('timestamp', ''))
+                cut = self.store._seek_timestamp(mm, boundary)
+        return cut, boundary
+
+    def compact(self, now: datetime = None) -> Dict:
+        """
+        Archiveer en aggregeer oude entries en knip ze van de ruwe log af
+
+        Returns:
+            Dict met archived (aantal entries), segments en compacted_before
+        """
+        now = now or datetime.now()
+        try:
+            compact_lock = FileLock(self.compact_lock_path, timeout=0)
+            compact_lock.acquire()
+        except LockTimeoutError:
+            return {"archived": 0, "segments": [], "compacted_before": None, "skipped": "busy"}
+
+        try:
+            self.store._ensure_migrated()
+            # Alleen wie de compaction lock heeft (wij, of merge_many/merge_runs bij een import)
+            # herschrijft de log; appends komen achteraan, dus het stuk vóór `cut`
+            # verandert niet zolang wij de compaction lock hebben
+            with self.store._map() as mm:
+                if mm is None:
+                    return {"archived": 0, "segments": [], "compacted_before": None}
+                cut, boundary = self._cut_offset(mm, now)
+                if not cut:
+                    done_before = load_daily(self.store.path)["compacted_before"]
+                    return {"archived": 0, "segments": [], "compacted_before": done_before}
+                entries = [
+                    entry for entry in (self.store._decode(mm, line_start, line_end)
+                                        for line_start, line_end in self.store._forward_lines(mm, 0)
+                                        if line_end < cut)
+                    if entry is not None
+                ]
+
+            state = load_daily(self.store.path)
+            done_before = state["compacted_before"] or ""
+            fresh = [e for e in entries if str(e.get('timestamp', '')) >= done_before]
+            segments = self._write_segments(fresh)
+            for entry in fresh:
+                day = str(entry.get('timestamp', ''))[:10] or "unknown"
+                _add_to_day(state["days"].setdefault(day, {}), entry)
+
+            # Volgende run (en de rapportage) telt alles vanaf deze grens als ruw
+            state["compacted_before"] = max(boundary, done_before)
+            atomic_write(self.aggregates_path, json.dumps(state, sort_keys=True).encode('utf-8'))
+
+            with self.store.lock():
+                with self.store._map() as mm:
+                    tail = mm[cut:] if mm is not None and len(mm) >= cut else None
+                if tail is not None:
+                    atomic_write(self.store.path, tail)
+
+            return {"archived": len(fresh), "segments": segments, "compacted_before": state["compacted_before"]}
+        finally:
+            compact_lock.release()
+
+    def _write_segments(self, entries: List[Dict], tag: str = None) -> List[str]:
+        """Schrijf entries per maand naar een gecomprimeerd segment"""
+        by_month: Dict[str, List[Dict]] = {}
+        for entry in entries:
+            month = str(entry.get('timestamp', ''))[:7] or "unknown"
+            by_month.setdefault(month, []).append(entry)
+
+        written = []
+        for month, month_entries in sorted(by_month.items()):
+            directory = os.path.join(self.archive_dir, month)
+            os.makedirs(directory, exist_ok=True)
+            # Naam naar de eerste entry: een herhaalde run overschrijft hetzelfde segment
+            name = str(month_entries[0].get('timestamp', 'unknown')).replace(':', '-')
+            if tag:
+                name += "-" + tag
+            extension, data = _compress(b"".join(LogStore._encode(e) for e in month_entries))
+            path = os.path.join(directory, name + ".jsonl" + extension)
+            atomic_write(path, data)
+            written.append(path)
+        return written
+
+    def read_archive(self, start: str = None, end: str = None) -> Iterator[Dict]:
+        """Gearchiveerde entries met start <= timestamp < end, segment voor segment gestreamd"""
+        try:
+            months = sorted(os.listdir(self.archive_dir))
+        except FileNotFoundError:
+            return
+        for month in months:
+            if (start and month < start[:7]) or (end and month > end[:7]):
+                continue
+            directory = os.path.join(self.archive_dir, month)
+            for name in sorted(os.listdir(directory)):
+                with _open_segment(os.path.join(directory, name)) as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        timestamp = str(entry.get('timestamp', ''))
+                        if (start is None or timestamp >= start) and (end is None or timestamp < end):
+                            yield entry
+
+    def archive_entries(self, entries: List[Dict], tag: str = None) -> List[str]:
+        """
+        Zet entries direct in het archief en de dag aggregaten (backfill van oude data)
+
+        Args:
+            entries: Entries ouder dan compacted_before
+            tag: Optioneel achtervoegsel voor de segmentnamen, zodat ze naast
+                 segmenten van de compactor kunnen staan
+
+        Returns:
+            Paden van de geschreven segmenten
+        """
+        if not entries:
+            return []
+        with self.store.compaction_lock():
+            return self._archive_unlocked(entries, tag)
+
+    def _archive_unlocked(self, entries: List[Dict], tag: str = None) -> List[str]:
+        state = load_daily(self.store.path)
+        segments = self._write_segments(entries, tag)
+        for entry in entries:
+            day = str(entry.get('timestamp', ''))[:10] or "unknown"
+            _add_to_day(state["days"].setdefault(day, {}), entry)
+        atomic_write(self.aggregates_path, json.dumps(state, sort_keys=True).encode('utf-8'))
+        return segments
+
+    def import_batches(self, batches: Iterable[List[Dict]], tag: str = "import") -> Tuple[int, int]:
+        """
+        Backfill: entries van vóór compacted_before naar het archief, de rest in de ruwe log
+
+        De hele import loopt onder één compaction lock, zodat een gelijktijdige
+        compactie de grens niet tussendoor verschuift. Oude entries gaan per
+        batch naar het archief; nieuwe gaan per batch gesorteerd naar een run,
+        en aan het eind voegt één streaming merge alle runs in de log. Zo blijft
+        het geheugen begrensd door de batch en wordt de log één keer herschreven.
+
+        Returns:
+            (archived, imported)
+        """
+        archived = imported = 0
+        runs = []
+        with self.store.compaction_lock():
+            try:
+                compacted_before = load_daily(self.store.path)["compacted_before"] or ""
+                for entries in batches:
+                    old = sorted((e for e in entries if str(e['timestamp']) < compacted_before),
+                                 key=lambda e: str(e['timestamp']))
+                    new = [e for e in entries if str(e['timestamp']) >= compacted_before]
+                    if old:
+                        self._archive_unlocked(old, tag)
+                    if new:
+                        runs.append(self.store.write_run(new))
+                    archived += len(old)
+                    imported += len(new)
+                self.store.merge_runs(runs, compaction_locked=True)
+            finally:
+                for run in runs:
+                    os.remove(run)
+        return archived, imported
+
+    def daily(self, start: date = None, end: date = None) -> Dict[str, Dict]:
+        """Dag aggregaten met start <= dag < end"""
+        days = load_daily(self.store.path)["days"]
+        return {
+            day: aggregate for day, aggregate in sorted(days.items())
+            if (start is None or day >= start.isoformat()) and (end is None or day < end.isoformat())
+        }
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Rollup Index
+Totalen per (tenant, dag, maaltijd context), zodat vragen en rapporten over een
+periode een handvol kleine records lezen in plaats van alle ruwe log entries
+"""
+
+import os
+import re
+import json
+import sqlite3
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from intent_router import normalize
+
+GROUP_BY = ("day", "context", "week", "month")
+
+# Aantal meest gelogde items / fouten dat per record bewaard blijft
+TOP_ITEMS_PER_ROW = 20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    tenant TEXT NOT NULL,
+    day TEXT NOT NULL,
+    context TEXT NOT NULL,
+    logs INTEGER NOT NULL DEFAULT 0,
+    successful INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    items INTEGER NOT NULL DEFAULT 0,
+    calories REAL NOT NULL DEFAULT 0,
+    protein REAL NOT NULL DEFAULT 0,
+    meal_ids TEXT NOT NULL DEFAULT '[]',
+    foods TEXT NOT NULL DEFAULT '{}',
+    errors TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (tenant, day, context)
+);
+CREATE TABLE IF NOT EXISTS rollup_meta (
+    tenant TEXT PRIMARY KEY,
+    built_at TEXT
+);
+"""
+
+_COUNTERS = ("logs", "successful", "failed", "items", "calories", "protein")
+
+
+def rollup_path(log_path: str) -> str:
+    """SQLite bestand met het rollup index naast de food log"""
+    base = log_path[:-len(".jsonl")] if log_path.endswith(".jsonl") else log_path
+    return base + ".rollup.sqlite3"
+
+
+def _day(value: Union[date, str, None]) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value[:10] if value else None
+    return value.isoformat()
+
+
+def _group_key(day: str, context: str, group_by: str) -> str:
+    if group_by == "day":
+        return day
+    if group_by == "context":
+        return context or "none"
+    if group_by == "month":
+        return day[:7]
+    year, week, _ = date.fromisoformat(day).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _empty_row() -> Dict:
+    return {"logs": 0, "successful": 0, "failed": 0, "items": 0, "calories": 0.0, "protein": 0.0,
+            "meal_ids": [], "foods": Counter(), "errors": Counter()}
+
+
+def _add_entry(row: Dict, entry: Dict) -> bool:
+    """
+    Tel een log entry op bij een record
+
+    Returns:
+        False als de maaltijd (meal_id) al in het record zit
+    """
+    api_result = entry.get('api_result') or {}
+    meal_id = api_result.get('meal_id')
+    if meal_id is not None and meal_id in row["meal_ids"]:
+        return False
+    row["logs"] += 1
+    if not entry.get('success'):
+        row["failed"] += 1
+        row["errors"][str(entry.get('error') or 'Unknown error')[:50]] += 1
+        return True
+    row["successful"] += 1
+    if meal_id is not None:
+        row["meal_ids"].append(meal_id)
+    for item in api_result.get('items') or []:
+        row["items"] += 1
+        row["calories"] += item.get('calories', 0) or 0
+        row["protein"] += item.get('protein', 0) or 0
+        if item.get('item_name'):
+            row["foods"][item['item_name'].lower()] += 1
+    return True
+
+
+def _key_of(entry: Dict) -> Tuple[str, str]:
+    return str(entry.get('timestamp', ''))[:10] or "unknown", entry.get('context') or ""
+
+
+class RollupIndex:
+    """
+    Rollup index in SQLite (WAL mode, dus te delen met andere processen)
+
+    Eén record per (tenant, dag, context) met logs, calorieën, eiwit, aantal
+    items, meal IDs en de meest gelogde items en fouten. Het index wordt per
+    geslaagde log bijgewerkt (`add`) en kan altijd opnieuw uit de ruwe store en
+    het archief opgebouwd worden (`rebuild`). Een jaar aan totalen kost zo
+    ongeveer 365 records in plaats van duizenden entries.
+    """
+
+    def __init__(self, path: str, tenant: str = None, busy_timeout: float = 5.0):
+        """
+        Args:
+            path: SQLite bestand (zie rollup_path)
+            tenant: Tenant voor lezen en schrijven (None = lezen over alle tenants)
+            busy_timeout: Seconden wachten op een schrijflock van een ander proces
+        """
+        self.path = path
+        self.tenant = tenant
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Eén verbinding per thread (sqlite3 verbindingen zijn niet thread-safe)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _require_tenant(self) -> str:
+        if self.tenant is None:
+            raise ValueError("RollupIndex zonder tenant is alleen-lezen")
+        return self.tenant
+
+    @property
+    def built(self) -> bool:
+        """Of het index (voor deze tenant) volledig is opgebouwd"""
+        query = "SELECT 1 FROM rollup_meta WHERE built_at IS NOT NULL"
+        params: Tuple = ()
+        if self.tenant is not None:
+            query += " AND tenant = ?"
+            params = (self.tenant,)
+        return self._connection().execute(query, params).fetchone() is not None
+
+    def mark_stale(self):
+        """Laat de volgende gebruiker het index opnieuw opbouwen (bijv. na een import)"""
+        if self.tenant is None:
+            self._connection().execute("UPDATE rollup_meta SET built_at = NULL")
+        else:
+            self._connection().execute("UPDATE rollup_meta SET built_at = NULL WHERE tenant = ?",
+                                       (self.tenant,))
+
+    def add(self, entry: Dict) -> bool:
+        """
+        Werk het record van een nieuwe log entry bij
+
+        Dubbele maaltijden (zelfde meal_id) worden niet nog eens geteld.
+
+        Returns:
+            True als de entry meegeteld is
+        """
+        tenant = self._require_tenant()
+        day, context = _key_of(entry)
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._read_row(connection, tenant, day, context)
+            added = _add_entry(row, entry)
+            if added:
+                self._write_row(connection, tenant, day, context, row)
+            connection.execute("COMMIT")
+            return added
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def rebuild(self, entries: Iterable[Dict], built_at: str = None) -> int:
+        """
+        Bouw het index van deze tenant opnieuw op uit alle log entries
+
+        Args:
+            entries: Alle entries (archief en ruwe log), in willekeurige volgorde
+            built_at: Tijdstip van de opbouw, voor rollup_meta
+
+        Returns:
+            Aantal records
+        """
+        tenant = self._require_tenant()
+        rows: Dict[Tuple[str, str], Dict] = {}
+        for entry in entries:
+            _add_entry(rows.setdefault(_key_of(entry), _empty_row()), entry)
+
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute("DELETE FROM rollup WHERE tenant = ?", (tenant,))
+            for (day, context), row in rows.items():
+                self._write_row(connection, tenant, day, context, row)
+            connection.execute("INSERT OR REPLACE INTO rollup_meta (tenant, built_at) VALUES (?, ?)",
+                               (tenant, built_at or date.today().isoformat()))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    @staticmethod
+    def _read_row(connection: sqlite3.Connection, tenant: str, day: str, context: str) -> Dict:
+        found = connection.execute(
+            "SELECT logs, successful, failed, items, calories, protein, meal_ids, foods, errors"
+            " FROM rollup WHERE tenant = ? AND day = ? AND context = ?", (tenant, day, context)).fetchone()
+        row = _empty_row()
+        if found:
+            row.update(zip(_COUNTERS, found[:6]))
+            row["meal_ids"] = json.loads(found[6])
+            row["foods"] = Counter(json.loads(found[7]))
+            row["errors"] = Counter(json.loads(found[8]))
+        return row
+
+    @staticmethod
+    def _write_row(connection: sqlite3.Connection, tenant: str, day: str, context: str, row: Dict):
+        connection.execute(
+            "INSERT OR REPLACE INTO rollup (tenant, day, context, logs, successful, failed, items,"
+            " calories, protein, meal_ids, foods, errors) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (tenant, day, context, *(row[key] for key in _COUNTERS), json.dumps(row["meal_ids"]),
+             json.dumps(dict(row["foods"].most_common(TOP_ITEMS_PER_ROW))),
+             json.dumps(dict(row["errors"].most_common(TOP_ITEMS_PER_ROW)))))
+
+    def rows(self, start: Union[date, str] = None, end: Union[date, str] = None) -> Iterator[Dict]:
+        """
+        Records met start <= dag < end, op dag en context gesorteerd
+
+        Returns:
+            Dicts met tenant, day, context, de tellers, meal_ids, foods en errors
+        """
+        query = ("SELECT tenant, day, context, logs, successful, failed, items, calories, protein,"
+                 " meal_ids, foods, errors FROM rollup WHERE 1 = 1")
+        params: List = []
+        if self.tenant is not None:
+            query += " AND tenant = ?"
+            params.append(self.tenant)
+        if start is not None:
+            query += " AND day >= ?"
+            params.append(_day(start))
+        if end is not None:
+            query += " AND day < ?"
+            params.append(_day(end))
+        for found in self._connection().execute(query + " ORDER BY day, context", params):
+            yield {
+                "tenant": found[0], "day": found[1], "context": found[2],
+                **dict(zip(_COUNTERS, found[3:9])),
+                "meal_ids": json.loads(found[9]),
+                "foods": json.loads(found[10]),
+                "errors": json.loads(found[11]),
+            }
+
+    def get_totals(self, start: Union[date, str] = None, end: Union[date, str] = None,
+                   group_by: str = None) -> Dict:
+        """
+        Totalen over een periode
+
+        Args:
+            start: Eerste dag (inclusief, date of YYYY-MM-DD)
+            end: Laatste dag (exclusief)
+            group_by: None, "day", "context", "week" of "month"
+
+        Returns:
+            Dict met start, end, logs, successful, failed, meals, items, calories,
+            protein en days_logged; met group_by ook groups (lijst met dezelfde
+            tellers plus key, op key gesorteerd)
+
+        Raises:
+            ValueError: Onbekende group_by
+        """
+        if group_by is not None and group_by not in GROUP_BY:
+            raise ValueError(f"group_by moet een van {', '.join(GROUP_BY)} zijn, niet {group_by!r}")
+
+        def empty():
+            return {**{key: 0 for key in _COUNTERS}, "meals": 0, "days": set()}
+
+        def add(total, row):
+            for key in _COUNTERS:
+                total[key] += row[key]
+            total["meals"] += len(row["meal_ids"])
+            if row["successful"]:
+                total["days"].add(row["day"])
+
+        def finish(total):
+            days = total.pop("days")
+            total["calories"] = round(total["calories"], 1)
+            total["protein"] = round(total["protein"], 1)
+            total["days_logged"] = len(days)
+            return total
+
+        overall = empty()
+        groups: Dict[str, Dict] = {}
+        for row in self.rows(start, end):
+            add(overall, row)
+            if group_by:
+                add(groups.setdefault(_group_key(row["day"], row["context"], group_by), empty()), row)
+
+        totals = {"start": _day(start), "end": _day(end), **finish(overall)}
+        if group_by:
+            totals["groups"] = [{"key": key, **finish(group)} for key, group in sorted(groups.items())]
+        return totals
+
+    def close(self):
+        """Sluit de verbinding van deze thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+# Vragen die lokaal uit het index beantwoord kunnen worden ("hoeveel kcal vandaag?")
+_TOTALS_QUESTION = re.compile(r"^(hoeveel|hoe veel|how much|how many)\b")
+_METRICS = (("calories", re.compile(r"\b(kcal|calorie\w*|kalorie\w*)\b")),
+            ("protein", re.compile(r"\b(eiwit\w*|protein\w*)\b")))
+_PERIODS = (("today", re.compile(r"\b(vandaag|today|aujourd hui|heute)\b")),
+            ("yesterday", re.compile(r"\b(gisteren|yesterday|hier|gestern)\b")),
+            ("week", re.compile(r"\b(deze week|this week|cette semaine|diese woche)\b")),
+            ("month", re.compile(r"\b(deze maand|this month|ce mois|diesen monat)\b")))
+
+
+def question_period(text: str, today: date = None) -> Optional[Tuple[str, date, date]]:
+    """
+    Periode in een genormaliseerde vraag (vandaag, gisteren, deze week of deze maand)
+
+    Returns:
+        (periode, start, end) met end exclusief, of None
+    """
+    period = next((name for name, pattern in _PERIODS if pattern.search(text)), None)
+    if period is None:
+        return None
+    today = today or date.today()
+    if period == "today":
+        return period, today, today + timedelta(days=1)
+    if period == "yesterday":
+        return period, today - timedelta(days=1), today
+    if period == "week":
+        return period, today - timedelta(days=today.weekday()), today + timedelta(days=1)
+    return period, today.replace(day=1), today + timedelta(days=1)
+
+
+def totals_question(question: str, today: date = None) -> Optional[Tuple[str, str, date, date]]:
+    """
+    Herken een eenvoudige totaalvraag (calorieën of eiwit over vandaag,
+    gisteren, deze week of deze maand)
+
+    Returns:
+        (metric, periode, start, end) met end exclusief, of None
+    """
+    text = normalize(question)
+    if not _TOTALS_QUESTION.match(text):
+        return None
+    metric = next((name for name, pattern in _METRICS if pattern.search(text)), None)
+    period = question_period(text, today)
+    if metric is None or period is None:
+        return None
+    return (metric, *period)
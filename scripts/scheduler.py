@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Scheduler
+In-process planner voor terugkerende samenvattingen en rapporten (vervangt cron subprocessen)
+"""
+
+import heapq
+import hashlib
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+
+def tenant_offset(tenant: str, spread: int) -> int:
+    """Vaste verschuiving in seconden per tenant, zodat niet iedereen om 20:00 start"""
+    if not spread:
+        return 0
+    digest = hashlib.sha256((tenant or "").encode('utf-8')).digest()
+    return int.from_bytes(digest[:4], 'big') % spread
+
+
+class Schedule:
+    """
+    Wanneer een job draait
+
+    Ofwel elke `every` seconden, ofwel dagelijks op `at` ("HH:MM"),
+    eventueel alleen op `weekday` (0 = maandag ... 6 = zondag).
+    """
+
+    def __init__(self, at: str = None, every: float = None, weekday: int = None, offset: int = 0):
+        if not at and not every:
+            raise ValueError("Schedule heeft 'at' of 'every' nodig")
+        self.every = every
+        self.weekday = weekday
+        self.offset = offset
+        if at:
+            hour, minute = at.split(':')
+            self.hour, self.minute = int(hour), int(minute)
+
+    @classmethod
+    def from_dict(cls, spec: Dict, offset: int = 0) -> "Schedule":
+        return cls(at=spec.get("at"), every=spec.get("every"), weekday=spec.get("weekday"), offset=offset)
+
+    def first_run(self, now: datetime) -> datetime:
+        """Eerste run; bij interval jobs valt de tenant verschuiving alleen hier"""
+        if self.every:
+            return now + timedelta(seconds=self.every + self.offset)
+        return self.next_run(now)
+
+    def next_run(self, after: datetime) -> datetime:
+        """Eerstvolgende moment ná `after`"""
+        if self.every:
+            return after + timedelta(seconds=self.every)
+
+        candidate = after.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        candidate += timedelta(seconds=self.offset)
+        while candidate <= after or (self.weekday is not None and candidate.weekday() != self.weekday):
+            candidate += timedelta(days=1)
+        return candidate
+
+
+class _Job:
+    __slots__ = ("name", "func", "schedule", "tenant", "low_priority", "runs", "failures", "last_run",
+                 "last_error")
+
+    def __init__(self, name: str, func: Callable, schedule: Schedule, tenant: str, low_priority: bool = True):
+        self.name = name
+        self.func = func
+        self.schedule = schedule
+        self.tenant = tenant
+        self.low_priority = low_priority
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None
+        self.last_error = None
+
+
+class JobScheduler:
+    """
+    Eén achtergrond thread die jobs op tijd uitvoert, na elkaar
+
+    Laag-prioritaire jobs (de default) wijken: als `can_run` aangeeft dat er
+    weinig ruimte is (bijv. de rate limit wordt door interactief gebruik
+    opgesoupeerd), wordt de job `defer_seconds` uitgesteld in plaats van direct
+    uitgevoerd. Jobs met low_priority=False (lokaal werk dat die ruimte niet
+    gebruikt) draaien altijd op tijd.
+    """
+
+    def __init__(self, can_run: Callable[[], bool] = None, defer_seconds: float = 60,
+                 on_result: Callable[[str, str, object], None] = None):
+        """
+        Args:
+            can_run: Optionele check of er nu ruimte is voor laag-prioritair werk
+            defer_seconds: Uitstel als can_run False geeft
+            on_result: Callback (job naam, tenant, resultaat) na elke geslaagde run
+        """
+        self.can_run = can_run
+        self.defer_seconds = defer_seconds
+        self.on_result = on_result
+        self._queue: List = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self.jobs: List[_Job] = []
+
+    def add_job(self, name: str, func: Callable, schedule: Schedule, tenant: str = None,
+                now: datetime = None, low_priority: bool = True):
+        """
+        Plan een job; de eerste run is het eerstvolgende moment volgens het schema
+
+        Args:
+            low_priority: Uitstellen zolang can_run False geeft; False voor jobs
+                          die geen gateway calls of credits gebruiken
+        """
+        job = _Job(name, func, schedule, tenant, low_priority)
+        first = schedule.first_run(now or datetime.now())
+        with self._cond:
+            self.jobs.append(job)
+            heapq.heappush(self._queue, (first, next(self._counter), job))
+            self._cond.notify()
+        return job
+
+    def next_runs(self) -> List[Dict]:
+        """Overzicht van geplande runs"""
+        with self._cond:
+            return [
+                {"job": job.name, "tenant": job.tenant, "next_run": when.isoformat(timespec='seconds')}
+                for when, _, job in sorted(self._queue, key=lambda e: (e[0], e[1]))
+            ]
+
+    def start(self):
+        """Start de scheduler thread (daemon)"""
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="dailynutri-scheduler", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Stop de scheduler na de lopende job"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def run_forever(self):
+        """Blokkerend draaien (voor de CLI)"""
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(1.0)
+        except KeyboardInterrupt:
+            self.stop()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._queue:
+                        delay = (self._queue[0][0] - datetime.now()).total_seconds()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(min(delay, 60))
+                    else:
+                        self._cond.wait()
+                if self._stopping:
+                    return
+                when, _, job = heapq.heappop(self._queue)
+
+            if job.low_priority and self.can_run and not self.can_run():
+                retry = datetime.now() + timedelta(seconds=self.defer_seconds)
+                with self._cond:
+                    heapq.heappush(self._queue, (retry, next(self._counter), job))
+                continue
+
+            self._execute(job)
+
+            with self._cond:
+                heapq.heappush(self._queue, (job.schedule.next_run(datetime.now()), next(self._counter), job))
+
+    def _execute(self, job: _Job):
+        job.last_run = datetime.now()
+        job.runs += 1
+        try:
+            result = job.func()
+            job.last_error = None
+            if self.on_result:
+                self.on_result(job.name, job.tenant, result)
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            print(f"⚠️ Geplande job '{job.name}' mislukt: {e}")
@@ -8,6 +8,7 @@ import os
 import sys
 import json
 from pathlib import Path
+from config_loader import get_loader, load_config
 
 def setup_dailynutri():
     """Setup DailyNutri integratie"""
@@ -15,32 +16,17 @@ def setup_dailynutri():
     print("=" * 50)
     
     # Check .env file
-    env_path = "/config/.openclaw/workspace/.env"
+    loader = get_loader()
+    env_path = loader.env_file
     
     if not os.path.exists(env_path):
         print(f"❌ .env file niet gevonden op: {env_path}")
         print("Maak eerst een .env file aan of geef het pad aan.")
         return False
     
-    # Check voor bestaande API key
-    api_key = None
+    # Check voor bestaande API key (environment, .env of config.json)
     try:
-        with open(env_path, 'r') as f:
-            content = f.read()
-            
-        # Zoek naar DailyNutri API key
-        for line in content.split('\n'):
-            line = line.strip()
-            if line.startswith('DAILY_NUTRI_API_KEY='):
-                api_key = line.split('=', 1)[1].strip()
-                break
-            elif line.startswith('Dailynutri_API_KEY='):
-                api_key = line.split('=', 1)[1].strip()
-                break
-            elif line.startswith('HAPKLIK_API_KEY='):
-                api_key = line.split('=', 1)[1].strip()
-                break
-    
+        api_key = loader.get().get("api_key")
     except Exception as e:
         print(f"❌ Fout bij lezen .env: {e}")
         return False
@@ -75,7 +61,7 @@ def test_api_key(api_key: str) -> bool:
     try:
         import requests
         
-        url = "https://relwosnejsszbqazxywz.supabase.co/functions/v1/api-gateway"
+        url = load_config()["api_url"]
         headers = {
             "Content-Type": "application/json",
             "X-API-Key": api_key
@@ -110,18 +96,22 @@ def test_api_key(api_key: str) -> bool:
 
 def create_config_file(api_key: str):
     """Maak configuratie file aan"""
-    config_dir = "/config/.openclaw/workspace/dailynutri/config"
-    config_file = os.path.join(config_dir, "config.json")
+    current = load_config()
+    config_file = get_loader().config_file
+    config_dir = os.path.dirname(config_file)
     
     os.makedirs(config_dir, exist_ok=True)
     
     config = {
         "api_key": api_key,
-        "api_url": "https://relwosnejsszbqazxywz.supabase.co/functions/v1/api-gateway",
-        "rate_limit": 60,  # requests per minuut
-        "language": "nl",
+        "api_url": current["api_url"],
+        "timeout": current["timeout"],
+        "rate_limit": current["rate_limit"],  # requests per minuut
+        "language": current["language"],
         "auto_log_context": True,
-        "log_file": "/config/.openclaw/workspace/dailynutri/logs/food_log.json",
+        "log_file": current["log_file"],
+        "max_log_entries": current["max_log_entries"],
+        "retention_days": current["retention_days"],
         "setup_date": "2026-02-25",
         "version": "1.0.0"
     }
@@ -133,7 +123,7 @@ def create_config_file(api_key: str):
         print(f"✅ Configuratie opgeslagen in: {config_file}")
         
         # Maak logs directory
-        logs_dir = "/config/.openclaw/workspace/dailynutri/logs"
+        logs_dir = os.path.dirname(config["log_file"])
         os.makedirs(logs_dir, exist_ok=True)
         print(f"✅ Logs directory aangemaakt: {logs_dir}")
         
@@ -181,15 +171,16 @@ def print_success_message():
     print("  python3 openclaw_integration.py report")
     
     print("\n🔧 Automatisering Tips:")
-    print("1. Gebruik cron jobs voor dagelijkse samenvattingen")
+    print("1. Start de scheduler voor dagelijkse samenvattingen: python3 openclaw_integration.py scheduler")
     print("2. Integreer met Telegram voor mobile logging")
-    print("3. Monitor rate limits (60 requests/minuut)")
+    rate_limit = load_config()["rate_limit"]
+    print(f"3. Monitor rate limits ({rate_limit} requests/minuut)")
     print("4. Gebruik context (breakfast/lunch/dinner/snack)")
     
     print("\n📞 Support:")
     print("• API Docs: https://dailynutri.app/api-docs")
     print("• API Keys: dailynutri.app/profile/api-keys")
-    print("• Rate Limits: 60 requests/minuut")
+    print(f"• Rate Limits: {rate_limit} requests/minuut")
     
     print("\n✅ Klaar voor gebruik!")
 
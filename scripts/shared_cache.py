@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Shared Cache
+Cache die gedeeld wordt door alle processen op de machine (bot, cron, agent
+subprocessen): SQLite in WAL mode, met TTL, LRU per namespace en invalidatie per tag
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Mapping, Optional
+from concurrency import StripedCounter
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    tag TEXT,
+    expires REAL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS cache_lru ON cache (namespace, accessed);
+CREATE INDEX IF NOT EXISTS cache_tag ON cache (namespace, tag);
+"""
+
+
+class SharedCache:
+    """
+    Key/value cache in één SQLite bestand
+
+    WAL mode laat lezers en één schrijver tegelijk toe, ook vanuit andere
+    processen. Elke namespace (bijv. "query", "memo") heeft een eigen
+    maximum; bij overschrijding gaan de minst recent gebruikte entries eruit.
+    Waarden zijn JSON. Fouten (vergrendeld, corrupt bestand) worden gemeld en
+    gedragen zich als een cache miss, zodat de cache nooit een call breekt.
+    """
+
+    def __init__(self, path: str, max_entries: Dict[str, int] = None, default_max: int = 1000,
+                 busy_timeout: float = 2.0):
+        """
+        Args:
+            path: SQLite bestand
+            max_entries: Maximum per namespace, bijv. {"memo": 500}
+            default_max: Maximum voor namespaces die niet in max_entries staan
+            busy_timeout: Seconden wachten op een schrijflock van een ander proces
+        """
+        self.path = path
+        self.max_entries = dict(max_entries or {})
+        self.default_max = default_max
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._counts = StripedCounter(("hits", "misses", "errors"))
+
+    def _connection(self) -> sqlite3.Connection:
+        """Eén verbinding per thread (sqlite3 verbindingen zijn niet thread-safe)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def _count(self, name: str):
+        self._counts.add(name)
+
+    def get(self, namespace: str, key: str, allow_expired: bool = False, touch: bool = True) -> Optional[Any]:
+        """
+        Waarde voor key, of None als hij ontbreekt of verlopen is
+
+        Args:
+            allow_expired: Geef ook een verlopen (nog niet verdrongen) waarde terug,
+                           voor als een vers antwoord te duur is
+            touch: Gebruik bijwerken voor de LRU (een korte schrijfactie); False
+                   = alleen lezen, bijv. als de aanroeper het later zelf bijwerkt
+        """
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None or (not allow_expired and row[1] is not None and row[1] <= now):
+                self._count("misses")
+                return None
+            if touch:
+                connection.execute("UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?",
+                                   (now, namespace, key))
+            self._count("hits")
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            self._report(e)
+            return None
+
+    def put(self, namespace: str, key: str, value: Any, ttl: float = None, tag: str = None):
+        """
+        Bewaar een waarde
+
+        Args:
+            ttl: Geldigheid in seconden (None = tot eviction of invalidatie)
+            tag: Groep voor invalidate, bijv. de tenant
+        """
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self._write(connection, namespace, key, value, ttl, tag, now)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, TypeError) as e:
+            self._report(e)
+
+    def update(self, namespace: str, key: str, change: Callable[[Optional[Any]], Optional[Any]],
+               ttl: float = None, tag: str = None) -> Optional[Any]:
+        """
+        Lees, wijzig en bewaar een waarde in één transactie (atomair, ook tussen processen)
+
+        Args:
+            change: Krijgt de huidige waarde (None als hij ontbreekt of verlopen is)
+                    en geeft de nieuwe terug; None = niets bewaren
+            ttl: Geldigheid van de nieuwe waarde in seconden
+            tag: Groep voor invalidate
+
+        Returns:
+            De nieuwe waarde, of None
+        """
+        return self.update_many(namespace, {key: change}, ttl, tag).get(key)
+
+    def update_many(self, namespace: str, changes: Mapping[str, Callable[[Optional[Any]], Optional[Any]]],
+                    ttl: float = None, tag: str = None) -> Dict[str, Any]:
+        """
+        Zoals update, voor meerdere keys in één transactie (één schrijflock voor de hele batch)
+
+        Returns:
+            Nieuwe waarde per key (keys waarvoor change None gaf ontbreken)
+        """
+        now = time.time()
+        values, found = {}, 0
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for key, change in changes.items():
+                    row = connection.execute(
+                        "SELECT value, expires FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+                    ).fetchone()
+                    current = json.loads(row[0]) if row is not None and (row[1] is None or row[1] > now) else None
+                    found += current is not None
+                    value = change(current)
+                    if value is not None:
+                        self._write(connection, namespace, key, value, ttl, tag, now)
+                        values[key] = value
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self._report(e)
+            return {}
+        self._counts.add("hits", found)
+        self._counts.add("misses", len(changes) - found)
+        return values
+
+    def _write(self, connection: sqlite3.Connection, namespace: str, key: str, value: Any,
+               ttl: Optional[float], tag: Optional[str], now: float):
+        """
+        Schrijf een waarde (binnen een transactie)
+
+        Verlopen entries blijven staan tot de namespace vol is: `get` met
+        allow_expired kan ze dan nog teruggeven als een vers antwoord te duur
+        is. Boven het maximum gaan eerst verlopen, dan minst recent gebruikte
+        entries eruit.
+        """
+        limit = self.max_entries.get(namespace, self.default_max)
+        connection.execute(
+            "INSERT OR REPLACE INTO cache (namespace, key, value, tag, expires, accessed)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (namespace, key, json.dumps(value, default=str), tag, now + ttl if ttl else None, now))
+        (count,) = connection.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?",
+                                      (namespace,)).fetchone()
+        if count > limit:
+            connection.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE namespace = ?"
+                " ORDER BY (expires IS NOT NULL AND expires <= ?) DESC, accessed LIMIT ?)",
+                (namespace, now, count - limit))
+
+    def invalidate(self, namespace: str, tag: str = None) -> int:
+        """
+        Verwijder entries van een namespace (alleen die met `tag` als die gegeven is)
+
+        Returns:
+            Aantal verwijderde entries
+        """
+        try:
+            connection = self._connection()
+            if tag is None:
+                cursor = connection.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+            else:
+                cursor = connection.execute("DELETE FROM cache WHERE namespace = ? AND tag = ?",
+                                            (namespace, tag))
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            self._report(e)
+            return 0
+
+    def count(self, namespace: str) -> int:
+        try:
+            (count,) = self._connection().execute(
+                "SELECT COUNT(*) FROM cache WHERE namespace = ?", (namespace,)).fetchone()
+            return count
+        except sqlite3.Error as e:
+            self._report(e)
+            return 0
+
+    def stats(self) -> Dict:
+        """Hits, misses en fouten van dit proces"""
+        return self._counts.snapshot()
+
+    def _report(self, error: Exception):
+        self._count("errors")
+        print(f"⚠️ Gedeelde cache niet beschikbaar: {error}")
+
+    def close(self):
+        """Sluit de verbinding van deze thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
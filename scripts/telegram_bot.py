@@ -7,20 +7,54 @@ Laat je food loggen via Telegram berichten
 import os
 import sys
 import json
-from typing import Dict, Optional
-from api_client import DailyNutriAPIClient, log_food, query_food
+import math
+import atexit
+import sqlite3
+import threading
+from typing import Callable, Dict, Hashable, List, Optional
+from api_client import DailyNutriAPIClient, OverloadedError, log_food, query_food
+from intent_router import IntentRouter, LOG, QUERY, GREETING, THANKS, HELP
+from bot_templates import DEFAULT_LANGUAGE, render, render_items, split_message, static
+from config_loader import store_paths
+from food_search import FoodSearchIndex, food_question, food_reply, food_search_path
+from meal_aggregator import MealAggregator
+from profiling import enable_from_config
+
+# Gateway fout (DailyNutriAPIError.code) -> vaste bot reply
+_ERROR_TEMPLATES = {
+    "rate_limited": "rate_limited",
+    "auth": "auth_error",
+    "credits": "credits_exhausted",
+    "forbidden": "forbidden",
+    "server": "gateway_unavailable",
+    "timeout": "gateway_unavailable",
+    "transport": "gateway_unavailable",
+    "overloaded": "busy",
+    "budget": "budget_reached",
+}
 
 class DailyNutriTelegramBot:
     """Integratie tussen DailyNutri API en Telegram"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, language: str = None, instant_memo: bool = False,
+                 warm_up_on_start: bool = False, send: Callable[[Hashable, List[str]], None] = None):
         """
         Initializeer de Telegram bot integratie
         
         Args:
             api_key: DailyNutri API key
+            language: Taal van de vaste bot antwoorden (nl/en/fr/de), default uit config
+            instant_memo: Bekende maaltijden direct beantwoorden uit de nutrition memo
+                          en de log op de achtergrond versturen
+            warm_up_on_start: Direct op de achtergrond warm_up() draaien (resident bot)
+            send: Callback (chat_id, berichten) voor antwoorden die later komen:
+                  handle_chat_message voegt snel opeenvolgende food berichten per
+                  chat samen tot één log (aggregate_window). Zonder callback (en
+                  zonder callback per chat) worden die antwoorden geprint
         """
         self.client = DailyNutriAPIClient(api_key)
+        self.language = language or self.client.config.get("language", DEFAULT_LANGUAGE)
+        self.instant_memo = instant_memo
         self.commands = {
             '/log': self.handle_log,
             '/query': self.handle_query,
@@ -30,6 +64,38 @@ class DailyNutriTelegramBot:
             '/protein': self.handle_protein,
             '/help': self.handle_help
         }
+        self.router = IntentRouter()
+        # Zoekindex van de integratie op deze machine (alleen gebruikt als het opgebouwd is)
+        self.food_search = FoodSearchIndex(food_search_path(store_paths(self.client.config)[0]),
+                                           tenant=self.client.tenant)
+        self.send = send
+        self._chat_senders: Dict[Hashable, Callable[[Hashable, List[str]], None]] = {}
+        self.aggregator = MealAggregator(self, self._deliver)
+        # Resident bot zonder __main__: profiling volgens `profile` (of DAILY_NUTRI_PROFILE)
+        self.profiler = (enable_from_config("telegram_bot", self.client.config)
+                         if self.client.config.get("profile") else None)
+        if warm_up_on_start:
+            threading.Thread(target=self.warm_up, name="dailynutri-warmup", daemon=True).start()
+    
+    def warm_up(self) -> Dict:
+        """
+        Maak de bot klaar voor het eerste bericht
+        
+        Vult de connection pool van de client tot pool_size en laat de router
+        en de vaste antwoorden één keer lopen.
+        
+        Returns:
+            Readiness rapport van DailyNutriAPIClient.warm_up
+        """
+        self.router.classify("warm-up")
+        static("help", self.language)
+        report = self.client.warm_up(self.client.pool_size)
+        if report["ready"]:
+            print(f"🔥 Bot klaar: {report['connections']} verbinding(en) naar {report['host']}"
+                  f" in {report['connect_ms']} ms")
+        else:
+            print(f"⚠️ Warm-up onvolledig: {report['error']}")
+        return report
     
     def handle_message(self, telegram_message: str) -> str:
         """
@@ -42,14 +108,15 @@ class DailyNutriTelegramBot:
             Response tekst voor Telegram
         """
         if not telegram_message or not telegram_message.strip():
-            return "❌ Leeg bericht. Stuur iets als: 'Ik heb een appel gegeten' of '/help' voor commands."
+            return static("empty", self.language)
         
         message = telegram_message.strip()
         
         # Check voor commands
         if message.startswith('/'):
-            parts = message.split(' ', 1)
-            command = parts[0].lower()
+            parts = message.split(maxsplit=1)
+            # In groepen stuurt Telegram /log@BotNaam
+            command = parts[0].split('@', 1)[0].lower()
             args = parts[1] if len(parts) > 1 else ""
             
             if command in self.commands:
@@ -57,137 +124,249 @@ class DailyNutriTelegramBot:
             else:
                 return self.handle_unknown_command(command)
         
-        # Geen command = probeer als food log
-        return self.handle_log(message)
+        # Geen command: lokaal classificeren zodat vragen en smalltalk
+        # niet als food log naar de API gaan
+        intent = self.router.classify(message)
+        
+        if intent.kind == LOG:
+            return self.handle_log(message)
+        elif intent.kind == QUERY:
+            return self.handle_query(message)
+        elif intent.kind == GREETING:
+            return static("greeting", intent.language or self.language)
+        elif intent.kind == THANKS:
+            return static("thanks", intent.language or self.language)
+        elif intent.kind == HELP:
+            return static("help", intent.language or self.language)
+        else:
+            return render("not_understood", self.language, reason=intent.reason)
+    
+    def handle_chat_message(self, chat_id: Hashable, telegram_message: str,
+                            send: Callable[[Hashable, List[str]], None] = None) -> Optional[List[str]]:
+        """
+        Verwerk een bericht van een chat (de weg voor alle chat input)
+
+        Food berichten die snel na elkaar komen worden per chat één log; het
+        antwoord daarop komt later via `send`. Andere berichten sluiten eerst
+        een open maaltijd af en worden direct beantwoord.
+
+        Args:
+            send: Callback voor de latere antwoorden van deze chat
+                  (default: die van de constructor)
+
+        Returns:
+            Het antwoord in delen, of None als het bericht bij een open maaltijd
+            is gezet (dat antwoord komt via `send`)
+        """
+        if send is not None:
+            self._chat_senders[chat_id] = send
+        return self.aggregator.submit(chat_id, telegram_message)
+    
+    def _deliver(self, chat_id: Hashable, chunks: List[str]):
+        """Antwoord op een samengevoegde maaltijd naar de callback van de chat"""
+        send = self._chat_senders.get(chat_id) or self.send or _print_reply
+        send(chat_id, chunks)
+    
+    def close(self):
+        """Verstuur open maaltijden (bij afsluiten van de bot)"""
+        self.aggregator.close()
+    
+    def handle_message_chunks(self, telegram_message: str) -> List[str]:
+        """
+        Verwerk een Telegram bericht en knip het antwoord op in verstuurbare delen
+        
+        Args:
+            telegram_message: Bericht van Telegram gebruiker
+        
+        Returns:
+            Lijst met berichten die elk binnen het Telegram limiet passen
+        """
+        return split_message(self.handle_message(telegram_message))
     
     def handle_log(self, food_description: str) -> str:
         """Verwerk food logging"""
         if not food_description:
-            return "❌ Geef een beschrijving van wat je gegeten hebt. Bijv: 'Ik heb een broodje kaas gegeten'"
+            return static("log_usage", self.language)
+        
+        if self.instant_memo:
+            memo = self.client.lookup_memo(food_description)
+            if memo:
+                self.client.submit_log(food_description).add_done_callback(self._report_background_log)
+                return static("logged_estimated", self.language) + render_items(memo["items"], self.language)
         
         try:
             result = self.client.log_food(food_description)
             
+            if result.get('duplicate'):
+                return static("duplicate", self.language) + render_items(result.get('items') or [], self.language)
+            
             if result.get('action') == 'logged':
-                reply = result.get('reply', '✅ Genoteerd!')
+                reply = result.get('reply') or static("logged", self.language)
                 
                 # Voeg item details toe indien beschikbaar
-                if 'items' in result and result['items']:
-                    items_text = "\n\n📋 Details:"
-                    for item in result['items']:
-                        name = item.get('item_name', 'Onbekend')
-                        cals = item.get('calories', 0)
-                        protein = item.get('protein', 0)
-                        items_text += f"\n• {name}: {cals} kcal, {protein}g eiwit"
-                    reply += items_text
-                
-                return reply
+                return reply + render_items(result.get('items') or [], self.language)
             else:
-                return f"⚠️ {result.get('reply', 'Onverwachte response')}"
-                
-        except ValueError as e:
-            return f"❌ Fout: {str(e)}"
+                return render("unexpected_response", self.language,
+                              reply=result.get('reply', 'Onverwachte response'))
+        
+        except OverloadedError as e:
+            # Een maaltijd laat je niet vallen: later versturen, tenzij ook die wachtrij vol is
+            future = self.client.defer_log(food_description)
+            if future is None:
+                return self._error_reply(e)
+            future.add_done_callback(self._report_background_log)
+            return static("queued", self.language)
         except Exception as e:
-            return f"❌ Onverwachte fout: {str(e)}"
+            return self._error_reply(e)
+    
+    def _error_reply(self, error: Exception) -> str:
+        """Reply voor een mislukte call, op basis van het type fout"""
+        key = _ERROR_TEMPLATES.get(getattr(error, "code", None))
+        if key == "rate_limited":
+            return render(key, self.language, seconds=math.ceil(error.retry_after))
+        if key:
+            return static(key, self.language)
+        if isinstance(error, ValueError):
+            return render("error", self.language, error=error)
+        return render("unexpected_error", self.language, error=error)
+    
+    @staticmethod
+    def _report_background_log(future):
+        """Meld mislukte achtergrond logs (de gebruiker kreeg al een antwoord)"""
+        error = future.exception()
+        if error:
+            print(f"⚠️ Achtergrond log mislukt: {error}")
     
     def handle_query(self, question: str) -> str:
         """Verwerk voedingsquery"""
         if not question:
-            return "❌ Stel een vraag over je voeding. Bijv: 'Wat heb ik gisteren gegeten?'"
+            return static("query_usage", self.language)
+        
+        local = self._local_food_answer(question)
+        if local is not None:
+            return local
         
         try:
             result = self.client.query_food_history(question)
-            return result.get('reply', '⚠️ Geen antwoord ontvangen')
-        except ValueError as e:
-            return f"❌ Fout: {str(e)}"
+            return result.get('reply') or static("no_answer", self.language)
         except Exception as e:
-            return f"❌ Onverwachte fout: {str(e)}"
+            return self._error_reply(e)
     
-    def handle_today(self, args: str = "") -> str:
-        """Samenvatting van vandaag"""
+    def _local_food_answer(self, question: str) -> Optional[str]:
+        """Antwoord op "wanneer/hoe vaak at ik X?" uit het lokale zoekindex, of None (ook zonder treffer)"""
+        if not self.client.config.get("local_food_search"):
+            return None
+        parsed = food_question(question)
+        if parsed is None:
+            return None
+        try:
+            if not self.food_search.built:
+                return None
+            result = self.food_search.search(parsed.food, parsed.start, parsed.end, limit=1)
+        except sqlite3.Error as e:
+            print(f"⚠️ Lokaal zoekindex niet beschikbaar: {e}")
+            return None
+        if not result["count"]:
+            return None
+        return food_reply(parsed, result, self.language)
+    
+    def _handle_summary(self, fetch, empty_key: str) -> str:
+        """Gedeelde afhandeling van de vaste samenvatting commands"""
         try:
-            result = self.client.get_today_summary()
-            return result.get('reply', '⚠️ Geen data voor vandaag')
+            result = fetch()
+            return result.get('reply') or static(empty_key, self.language)
         except Exception as e:
-            return f"❌ Fout: {str(e)}"
+            return self._error_reply(e)
+    
+    def handle_today(self, args: str = "") -> str:
+        """Samenvatting van vandaag"""
+        return self._handle_summary(self.client.get_today_summary, "no_today")
     
     def handle_yesterday(self, args: str = "") -> str:
         """Wat gisteren gegeten"""
-        try:
-            result = self.client.get_yesterday_food()
-            return result.get('reply', '⚠️ Geen data voor gisteren')
-        except Exception as e:
-            return f"❌ Fout: {str(e)}"
+        return self._handle_summary(self.client.get_yesterday_food, "no_yesterday")
     
     def handle_calories(self, args: str = "") -> str:
         """Calorieën vandaag"""
-        try:
-            result = self.client.get_calories_today()
-            return result.get('reply', '⚠️ Geen calorie data voor vandaag')
-        except Exception as e:
-            return f"❌ Fout: {str(e)}"
+        return self._handle_summary(self.client.get_calories_today, "no_calories")
     
     def handle_protein(self, args: str = "") -> str:
         """Eiwit deze week"""
-        try:
-            result = self.client.get_protein_this_week()
-            return result.get('reply', '⚠️ Geen eiwit data voor deze week')
-        except Exception as e:
-            return f"❌ Fout: {str(e)}"
+        return self._handle_summary(self.client.get_protein_this_week, "no_protein")
     
     def handle_help(self, args: str = "") -> str:
         """Toon help"""
-        help_text = """🍎 DailyNutri Telegram Commands:
-
-📝 Food Loggen:
-• Stuur gewoon een bericht: "Ik heb een appel gegeten"
-• Of gebruik: /log <beschrijving>
-  Bijv: /log 2 boterhammen met pindakaas
-
-📊 Queries:
-• /query <vraag> - Stel vraag over voeding
-  Bijv: /query Wat heb ik gisteren gegeten?
-• /today - Samenvatting van vandaag
-• /yesterday - Wat gisteren gegeten
-• /calories - Calorieën vandaag
-• /protein - Eiwit deze week
-
-ℹ️ Info:
-• /help - Toon deze help
-• Taal: API antwoordt in je Hapklik profieltaal
-• Meerdere items: "2 eieren, toast en koffie"
-• Specifiek: "150g kipfilet" ipv "kip"
-
-Voorbeelden:
-• "Net een banaan en koffie gehad"
-• "Lunch: salade met kip en dressing"
-• /query Hoeveel calorieën heb ik deze week gehad?
-"""
-        return help_text
+        return static("help", self.language)
     
     def handle_unknown_command(self, command: str) -> str:
         """Onbekend command"""
-        return f"❌ Onbekend command: {command}\nGebruik /help voor beschikbare commands."
+        return render("unknown_command", self.language, command=command)
+
+
+def _print_reply(chat_id: Hashable, chunks: List[str]):
+    """Default `send`: print het antwoord (CLI)"""
+    print("🤖 Bot Response:")
+    for chunk in chunks:
+        print("-" * 40)
+        print(chunk)
+    print("-" * 40)
+
+
+# Eén blijvende bot per API key voor process_telegram_message met een chat_id,
+# zodat berichten uit verschillende calls samengevoegd kunnen worden
+_resident_bots: Dict[Optional[str], DailyNutriTelegramBot] = {}
+_resident_lock = threading.Lock()
+
 
+def _resident_bot(api_key: str = None) -> DailyNutriTelegramBot:
+    with _resident_lock:
+        bot = _resident_bots.get(api_key)
+        if bot is None:
+            bot = _resident_bots[api_key] = DailyNutriTelegramBot(api_key)
+        return bot
 
-def process_telegram_message(message: str, api_key: str = None) -> str:
+
+@atexit.register
+def _close_resident_bots():
+    """Open maaltijden niet kwijtraken als het proces stopt"""
+    with _resident_lock:
+        bots = list(_resident_bots.values())
+    for bot in bots:
+        bot.close()
+
+
+def process_telegram_message(message: str, api_key: str = None, chat_id: Hashable = None,
+                             send: Callable[[Hashable, List[str]], None] = None) -> Optional[str]:
     """
     Eenvoudige functie om Telegram berichten te verwerken
     
+    Met een chat_id gaat het bericht via een blijvende bot per API key, die
+    snel opeenvolgende food berichten van een chat samenvoegt tot één log
+    (aggregate_window). Het antwoord op zo'n maaltijd komt later via `send`.
+    
     Args:
         message: Telegram bericht
         api_key: Optionele API key
+        chat_id: Chat waar het bericht vandaan komt
+        send: Callback (chat_id, berichten) voor het latere antwoord (default: print)
     
     Returns:
-        Response voor Telegram
+        Response voor Telegram, of None als het antwoord later via `send` komt
     """
-    bot = DailyNutriTelegramBot(api_key)
-    return bot.handle_message(message)
+    if chat_id is None:
+        bot = DailyNutriTelegramBot(api_key)
+        return bot.handle_message(message)
+    chunks = _resident_bot(api_key).handle_chat_message(chat_id, message, send)
+    return None if chunks is None else "\n".join(chunks)
 
 
 if __name__ == "__main__":
     """Test de Telegram bot"""
     import sys
+    from profiling import pop_profile_flag
+
+    # --profile[=sample|cprofile] of DAILY_NUTRI_PROFILE; SIGUSR1 schakelt tijdens de run
+    enable_from_config("telegram_bot", mode=pop_profile_flag(sys.argv))
     
     def print_usage():
         print("Usage: python telegram_bot.py <message>")
@@ -203,12 +382,12 @@ if __name__ == "__main__":
     message = ' '.join(sys.argv[1:])
     
     try:
-        bot = DailyNutriTelegramBot()
-        response = bot.handle_message(message)
-        print("🤖 Bot Response:")
-        print("-" * 40)
-        print(response)
-        print("-" * 40)
+        # Zelfde weg als een chat; bij afsluiten gaat een open maaltijd direct weg
+        bot = DailyNutriTelegramBot(send=_print_reply)
+        chunks = bot.handle_chat_message("cli", message)
+        if chunks is not None:
+            _print_reply("cli", chunks)
+        bot.close()
     
     except Exception as e:
         print(f"❌ Fout: {e}")
@@ -88,7 +88,7 @@ print("1. Voeg API key toe aan .env file")
 print("2. Run: python3 setup.py")
 print("3. Test met: python3 api_client.py log 'test'")
 print("4. Integreer met OpenClaw workflows")
-print("5. Setup cron jobs voor automatische samenvattingen")
+print("5. Start de scheduler voor automatische samenvattingen: python3 openclaw_integration.py scheduler")
 
 print("\n✅ Implementatie klaar - wacht op API key!")
 print("=" * 50)
\ No newline at end of file
@@ -19,7 +19,8 @@ def test_skill_structure():
         "scripts/api_client.py",
         "scripts/telegram_bot.py",
         "scripts/openclaw_integration.py",
-        "scripts/setup.py"
+        "scripts/setup.py",
+        "scripts/log_store.py"
     ]
     
     skill_dir = Path(__file__).parent.parent
@@ -187,6 +188,1818 @@ def test_setup_script():
         print(f"❌ Error testing setup script: {e}")
         return False
 
+def test_log_store():
+    """Test concurrent writers on the log store"""
+    print("\n🧪 Testing log store...")
+    
+    try:
+        import tempfile
+        import threading
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            "log_store", 
+            Path(__file__).parent / "log_store.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "food_log.json")
+            store = module.LogStore(path, max_entries=1000)
+            
+            def writer(n):
+                for i in range(10):
+                    store.append({"writer": n, "i": i})
+            
+            threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            
+            if len(store.read()) != 80:
+                print(f"❌ Expected 80 entries, found {len(store.read())}")
+                return False
+            print("✅ No entries lost with concurrent writers")
+            
+            # Tail reads and timestamp cursors
+            page_path = os.path.join(tmp, "paged.jsonl")
+            paged = module.LogStore(page_path, max_entries=0)
+            paged.append_many([{"timestamp": f"2026-01-{d:02d}T12:00:00"} for d in range(1, 31)])
+            last = paged.read(3)
+            older = paged.read_page(2, before="2026-01-10T00:00:00")["entries"]
+            newer = paged.read_page(2, after="2026-01-10T12:00:00")["entries"]
+            if ([e["timestamp"][8:10] for e in last] != ["28", "29", "30"]
+                    or [e["timestamp"][8:10] for e in older] != ["08", "09"]
+                    or [e["timestamp"][8:10] for e in newer] != ["11", "12"]):
+                print("❌ Tail reader or cursor paging returned wrong entries")
+                return False
+            print("✅ Tail reader and cursor paging work")
+            
+            # Two writers (e.g. two processes) whose entries arrive out of order: a slow
+            # gateway call stamped earlier is appended after a newer entry
+            racing_path = os.path.join(tmp, "racing.jsonl")
+            fast, slow = module.LogStore(racing_path, max_entries=0), module.LogStore(racing_path, max_entries=0)
+            fast.append_many([{"timestamp": "2026-02-01T12:00:05", "writer": "fast"},
+                              {"timestamp": "2026-02-01T12:00:09", "writer": "fast"}])
+            slow.append_many([{"timestamp": "2026-02-01T12:00:07", "writer": "slow"},
+                              {"timestamp": "2026-02-01T12:00:01", "writer": "slow"}])
+            in_range = fast.read_range("2026-02-01T12:00:00", "2026-02-01T12:00:08")
+            page = fast.read_page(2, before="2026-02-01T12:00:08")["entries"]
+            timestamps = [e["timestamp"] for e in fast.read()]
+            if (len(in_range) != 3 or [e["timestamp"][-2:] for e in page] != ["05", "07"]
+                    or timestamps != sorted(timestamps)):
+                print(f"❌ Out-of-order appends skipped by range reads: {timestamps}")
+                return False
+            
+            # While a compaction or import holds the compaction lock past lock_timeout, an
+            # out-of-order batch waits for it instead of being appended unsorted
+            import threading
+            import time
+            waiting = module.LogStore(racing_path, max_entries=0, lock_timeout=0.05)
+            held, finished = threading.Event(), threading.Event()
+
+            def hold_compaction():
+                with waiting.compaction_lock():
+                    held.set()
+                    time.sleep(0.3)
+                finished.set()
+
+            holder = threading.Thread(target=hold_compaction)
+            holder.start()
+            held.wait()
+            waiting.append({"timestamp": "2026-02-01T12:00:03", "writer": "late"})
+            holder.join()
+            timestamps = [e["timestamp"] for e in waiting.read()]
+            if not finished.is_set() or timestamps != sorted(timestamps) or len(timestamps) != 5:
+                print(f"❌ Out-of-order batch appended while compaction held the lock: {timestamps}")
+                return False
+            print("✅ Out-of-order appends from two writers stay sorted and readable")
+            
+            # A legacy JSON array log is migrated, a corrupt one kept aside
+            legacy = os.path.join(tmp, "legacy.json")
+            with open(legacy, 'w') as f:
+                json.dump([{"old": 1}, {"old": 2}], f)
+            migrated = module.LogStore(legacy + "l", legacy_path=legacy)
+            if len(migrated.read()) != 2:
+                print("❌ Legacy log was not migrated")
+                return False
+            with open(legacy, 'w') as f:
+                f.write("[{broken")
+            module.LogStore(legacy + "l2", legacy_path=legacy).append({"after": "corrupt"})
+            quarantined = [f for f in os.listdir(tmp) if ".corrupt-" in f]
+            if not quarantined:
+                print("❌ Corrupt log was not quarantined")
+                return False
+            print("✅ Legacy log migrated, corrupt log quarantined")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing log store: {e}")
+        return False
+
+def test_intent_router():
+    """Test local message classification"""
+    print("\n🧪 Testing intent router...")
+    
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            "intent_router", 
+            Path(__file__).parent / "intent_router.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        router = module.IntentRouter()
+        cases = [
+            ("Ik heb een broodje kaas gegeten", module.LOG),
+            ("2 boterhammen met pindakaas", module.LOG),
+            ("hoeveel kcal vandaag?", module.QUERY),
+            ("How much protein did I have this week?", module.QUERY),
+            ("Combien de calories aujourd'hui ?", module.QUERY),
+            ("Wie viel Eiweiß heute?", module.QUERY),
+            ("Hoi!", module.GREETING),
+            ("merci", module.THANKS),
+            ("Top!", module.THANKS),
+            ("oké", module.THANKS),
+            ("top pizza", module.LOG),
+            ("ok banaan", module.LOG),
+            ("super salade", module.LOG),
+            ("oke, koffie", module.LOG),
+            ("👍👍", module.JUNK),
+            ("   ", module.EMPTY),
+        ]
+        
+        for message, expected in cases:
+            intent = router.classify(message)
+            if intent.kind != expected:
+                print(f"❌ '{message}' classified as {intent.kind}, expected {expected}")
+                return False
+        
+        print(f"✅ {len(cases)} messages classified correctly")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing intent router: {e}")
+        return False
+
+def test_bot_templates():
+    """Test reply rendering and Telegram chunking"""
+    print("\n🧪 Testing bot templates...")
+    
+    try:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            "bot_templates", 
+            Path(__file__).parent / "bot_templates.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        for language in ("nl", "en", "fr", "de"):
+            if not module.static("help", language).startswith("🍎"):
+                print(f"❌ Missing help text for '{language}'")
+                return False
+        
+        items = [{"item_name": f"item {i}", "calories": 100, "protein": 5} for i in range(300)]
+        text = "✅ Genoteerd!" + module.render_items(items)
+        chunks = module.split_message(text)
+        if len(chunks) < 2 or any(len(c) > module.TELEGRAM_MESSAGE_LIMIT for c in chunks):
+            print("❌ Long replies are not split within the Telegram limit")
+            return False
+        if "\n".join(chunks) != text:
+            print("❌ Chunking changed the reply text")
+            return False
+        
+        print(f"✅ 300 items rendered into {len(chunks)} Telegram messages")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing bot templates: {e}")
+        return False
+
+def test_config_loader():
+    """Test config merging, caching and hot reload"""
+    print("\n🧪 Testing config loader...")
+    
+    try:
+        import tempfile
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            "config_loader", 
+            Path(__file__).parent / "config_loader.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            env_file = os.path.join(tmp, ".env")
+            config_file = os.path.join(tmp, "config.json")
+            with open(env_file, 'w') as f:
+                f.write("HAPKLIK_API_KEY=hk_from_env_file\nDAILY_NUTRI_TIMEOUT=12\n")
+            with open(config_file, 'w') as f:
+                json.dump({"api_url": "http://localhost:9999", "timeout": 5, "rate_limit": 30}, f)
+            
+            loader = module.ConfigLoader(env_file, config_file, check_interval=0)
+            config = loader.get()
+            if (config["api_key"] != "hk_from_env_file" or config["timeout"] != 12.0
+                    or config["api_url"] != "http://localhost:9999" or config["rate_limit"] != 30):
+                print(f"❌ Unexpected merged config: {dict(config)}")
+                return False
+            if loader.get() is not config:
+                print("❌ Unchanged config was parsed again")
+                return False
+            print("✅ .env overrides config.json and result is cached")
+            
+            with open(config_file, 'w') as f:
+                json.dump({"api_url": "http://localhost:8888", "rate_limit": 30}, f)
+            if loader.get()["api_url"] != "http://localhost:8888":
+                print("❌ Changed config.json was not reloaded")
+                return False
+            print("✅ Config reloaded after file change")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing config loader: {e}")
+        return False
+
+def test_idempotency():
+    """Test idempotency keys and duplicate detection"""
+    print("\n🧪 Testing idempotency...")
+    
+    try:
+        import tempfile
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            "idempotency", 
+            Path(__file__).parent / "idempotency.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        a = module.idempotency_key("t1", "2 Boterhammen  met kaas", "lunch", now=1000)
+        b = module.idempotency_key("t1", "2 boterhammen met kaas.", "Lunch", now=1010)
+        c = module.idempotency_key("t2", "2 boterhammen met kaas", "lunch", now=1000)
+        if a != b or a == c:
+            print("❌ Idempotency keys are not deterministic per tenant")
+            return False
+        print("✅ Idempotency keys are deterministic per tenant")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dedup.json")
+            first = module.DedupIndex(path, window=60)
+            key = module.content_key("t1", "koffie")
+            if first.check(key)[0] != module.NEW or first.check(key)[0] != module.PENDING:
+                print("❌ In-flight log was not detected")
+                return False
+            first.complete(key, {"action": "logged"})
+            
+            # A second process sees the same log through the shared file
+            second = module.DedupIndex(path, window=60)
+            status, result = second.check(key)
+            if status != module.DUPLICATE or result != {"action": "logged"}:
+                print("❌ Duplicate log was not detected across instances")
+                return False
+            print("✅ Duplicate logs are dropped within the window")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing idempotency: {e}")
+        return False
+
+def test_nutrition_memo():
+    """Test description canonicalization and the nutrition memo"""
+    print("\n🧪 Testing nutrition memo...")
+    
+    try:
+        import tempfile
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            "nutrition_memo", 
+            Path(__file__).parent / "nutrition_memo.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        same = [
+            "Twee boterhammen met pindakaas en koffie",
+            "koffie, 2 boterhammen met pindakaas",
+            "Ik heb 2 boterhammen met pindakaas en koffie gehad",
+        ]
+        if len({module.canonicalize(d) for d in same}) != 1:
+            print(f"❌ Descriptions not canonicalized alike: {[module.canonicalize(d) for d in same]}")
+            return False
+        if module.canonicalize("150 gram kipfilet") != module.canonicalize("150g Kipfilet"):
+            print("❌ Units not normalized")
+            return False
+        print("✅ Descriptions canonicalized")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "memo.json")
+            memo = module.NutritionMemo(path, max_entries=2)
+            memo.record("t1", "koffie", [{"item_name": "koffie", "calories": 2}])
+            other = module.NutritionMemo(path)
+            hit = other.lookup("t1", "Koffie.")
+            if not hit or hit["total_calories"] != 2 or other.lookup("t2", "koffie"):
+                print("❌ Memo lookup failed")
+                return False
+            memo.record("t1", "thee", [{"item_name": "thee", "calories": 1}])
+            memo.record("t1", "appel", [{"item_name": "appel", "calories": 52}])
+            if memo.lookup("t1", "koffie") is not None:
+                print("❌ Memo is not bounded")
+                return False
+            print("✅ Memo shared between instances and bounded")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing nutrition memo: {e}")
+        return False
+
+def test_scheduler():
+    """Test schedules, tenant spreading and deferral of scheduled jobs"""
+    print("\n🧪 Testing scheduler...")
+    
+    try:
+        import time
+        import importlib.util
+        from datetime import datetime
+        spec = importlib.util.spec_from_file_location(
+            "scheduler", 
+            Path(__file__).parent / "scheduler.py"
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        
+        now = datetime(2026, 3, 4, 21, 0)  # woensdag
+        daily = module.Schedule(at="20:00", offset=90)
+        weekly = module.Schedule(at="20:30", weekday=6)
+        if daily.next_run(now) != datetime(2026, 3, 5, 20, 1, 30):
+            print(f"❌ Wrong daily run: {daily.next_run(now)}")
+            return False
+        if weekly.next_run(now) != datetime(2026, 3, 8, 20, 30):
+            print(f"❌ Wrong weekly run: {weekly.next_run(now)}")
+            return False
+        print("✅ Schedules computed")
+        
+        offsets = {module.tenant_offset(f"tenant-{i}", 1800) for i in range(50)}
+        if len(offsets) < 40 or not all(0 <= o < 1800 for o in offsets):
+            print("❌ Tenants not spread over the window")
+            return False
+        print("✅ Tenants spread over the window")
+        
+        runs = []
+        allowed = [False]
+        scheduler = module.JobScheduler(can_run=lambda: allowed[0], defer_seconds=0.05)
+        local_runs = []
+        scheduler = module.JobScheduler(can_run=lambda: allowed[0], defer_seconds=0.05)
+        scheduler.add_job("summary", lambda: runs.append(1), module.Schedule(every=0.05))
+        scheduler.add_job("compact", lambda: local_runs.append(1), module.Schedule(every=0.05),
+                          low_priority=False)
+        scheduler.start()
+        time.sleep(0.3)
+        deferred = len(runs)
+        local_while_deferred = len(local_runs)
+        allowed[0] = True
+        time.sleep(0.3)
+        scheduler.stop(timeout=2)
+        if deferred or not runs:
+            print("❌ Jobs not deferred while there is no headroom")
+            return False
+        print("✅ Jobs deferred until there is headroom")
+        if not local_while_deferred:
+            print("❌ Local job deferred along with gateway jobs")
+            return False
+        print("✅ Local jobs run on time without headroom")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing scheduler: {e}")
+        return False
+
+def test_reports():
+    """Test parallel bulk reports across tenants"""
+    print("\n🧪 Testing bulk reports...")
+    
+    try:
+        import tempfile
+        from datetime import date, datetime, timedelta
+        import reports
+        from log_store import LogStore
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            stores = {}
+            for tenant in ("a", "b"):
+                stores[tenant] = os.path.join(tmp, tenant, "food_log.jsonl")
+                os.makedirs(os.path.dirname(stores[tenant]))
+                start = datetime(2026, 3, 1)
+                LogStore(stores[tenant], max_entries=0).append_many([
+                    {
+                        "timestamp": (start + timedelta(hours=12 * i)).isoformat(),
+                        "success": i % 4 != 0,
+                        "api_result": {"items": [{"item_name": "Appel", "calories": 50, "protein": 1}]}
+                    }
+                    for i in range(120)
+                ])
+            
+            serial = reports.ReportEngine(stores, workers=1).build(date(2026, 3, 1), date(2026, 4, 30), "month")
+            parallel = reports.ReportEngine(stores, workers=2).build(date(2026, 3, 1), date(2026, 4, 30), "month")
+            if serial != parallel:
+                print("❌ Parallel reports differ from serial reports")
+                return False
+            march = serial[0]
+            if (march["tenant"], march["period"], march["logs"], march["days_logged"]) != ("a", "2026-03", 62, 31):
+                print(f"❌ Wrong monthly aggregate: {march}")
+                return False
+            print("✅ Shards merged into monthly reports per tenant")
+            
+            if not reports.render_csv(serial).startswith("tenant,period,") or not reports.render_text(serial):
+                print("❌ Reports not rendered")
+                return False
+            print("✅ Reports rendered as text, JSON and CSV")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing reports: {e}")
+        return False
+
+def test_retention():
+    """Test compaction of old log entries into archive segments and daily aggregates"""
+    print("\n🧪 Testing log retention...")
+    
+    try:
+        import tempfile
+        from datetime import date, datetime, timedelta
+        import reports
+        from log_store import LogStore
+        from retention import Compactor
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "food_log.jsonl")
+            store = LogStore(path, max_entries=0)
+            start = datetime(2026, 3, 1)
+            store.append_many([
+                {
+                    "timestamp": (start + timedelta(hours=12 * i)).isoformat(),
+                    "success": i % 4 != 0,
+                    "api_result": {"items": [{"item_name": "Appel", "calories": 50, "protein": 1}]}
+                }
+                for i in range(120)
+            ])
+            before = reports.ReportEngine({"a": path}, workers=1).build(date(2026, 3, 1), date(2026, 4, 30))
+            
+            compactor = Compactor(store, retention_days=14)
+            result = compactor.compact(now=datetime(2026, 4, 30))
+            kept = store.read()
+            if result["archived"] + len(kept) != 120 or kept[0]["timestamp"] < "2026-04-16":
+                print(f"❌ Wrong entries compacted: {result}")
+                return False
+            if len(list(compactor.read_archive())) != result["archived"]:
+                print("❌ Archived entries not readable")
+                return False
+            print("✅ Old entries moved to compressed archive segments")
+            
+            if compactor.compact(now=datetime(2026, 4, 30))["archived"] != 0:
+                print("❌ Repeated compaction archived entries twice")
+                return False
+            after = reports.ReportEngine({"a": path}, workers=1).build(date(2026, 3, 1), date(2026, 4, 30))
+            if before != after:
+                print("❌ Reports changed after compaction")
+                return False
+            print("✅ Reports over compacted days use daily aggregates")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing retention: {e}")
+        return False
+
+def test_log_export():
+    """Test streaming export and import of the log history"""
+    print("\n🧪 Testing log export/import...")
+    
+    try:
+        import json
+        import time
+        import tempfile
+        import threading
+        from datetime import datetime, timedelta
+        import log_export
+        from log_store import LogStore, atomic_write
+        from retention import Compactor, load_daily
+        
+        start = datetime(2026, 1, 1)
+        entries = [
+            {
+                "timestamp": (start + timedelta(hours=6 * i)).isoformat(),
+                "description": f"maaltijd {i}",
+                "success": True,
+                "api_result": {"action": "logged", "items": [{"item_name": "appel", "calories": 50}]}
+            }
+            for i in range(400)
+        ]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            source = LogStore(os.path.join(tmp, "source", "food_log.jsonl"), max_entries=0)
+            source.append_many(entries)
+            
+            out = os.path.join(tmp, "export.jsonl")
+            count = log_export.export_history(source, out, since="2026-01-10", until="2026-02-01")
+            if count != 22 * 4:
+                print(f"❌ Date range filter exported {count} entries")
+                return False
+            log_export.export_history(source, os.path.join(tmp, "export.csv"))
+            with open(os.path.join(tmp, "export.csv")) as f:
+                if not f.readline().startswith("timestamp,description,"):
+                    print("❌ CSV export has no header")
+                    return False
+            print("✅ History exported with date range filter")
+            
+            # Import into a store that already has a newer entry: old entries are merged in order
+            target = LogStore(os.path.join(tmp, "target", "food_log.jsonl"), max_entries=0)
+            target.append({"timestamp": "2026-03-01T00:00:00", "success": True})
+            stats = log_export.import_history(target, log_export.read_file(out), batch_size=25)
+            imported = target.read()
+            timestamps = [e["timestamp"] for e in imported]
+            if stats["imported"] != count or timestamps != sorted(timestamps) or imported[0] != entries[36]:
+                print(f"❌ Import not merged in order: {stats}")
+                return False
+            print("✅ Import backfilled in batches, log stays sorted")
+
+            # All batches go through one streaming merge; appends during the merge are kept
+            streamed = LogStore(os.path.join(tmp, "streamed", "food_log.jsonl"), max_entries=0)
+            streamed.append({"timestamp": "2026-03-01T00:00:00", "success": True})
+            writer = LogStore(streamed.path, max_entries=0)
+            stream_merge, merges = streamed._stream_merge, []
+
+            def counting_merge(runs, out_path):
+                if not merges:
+                    writer.append({"timestamp": "2026-03-02T00:00:00", "success": True})
+                merges.append(len(runs))
+                return stream_merge(runs, out_path)
+
+            streamed._stream_merge = counting_merge
+            stats = log_export.import_history(streamed, iter(entries[:100]), batch_size=25)
+            timestamps = [e["timestamp"] for e in streamed.read()]
+            leftovers = [n for n in os.listdir(os.path.dirname(streamed.path)) if n.startswith(".")]
+            if merges != [4] or len(timestamps) != 102 or timestamps != sorted(timestamps) \
+                    or timestamps[-1] != "2026-03-02T00:00:00" or leftovers:
+                print(f"❌ Import not merged in one pass: {merges} {len(timestamps)} {leftovers}")
+                return False
+            print("✅ Import batches merged in one streaming pass, concurrent appends kept")
+
+            # A compaction that moves the watermark while an import waits: the import
+            # must split on the new watermark, not on one it read before
+            racing = LogStore(os.path.join(tmp, "racing", "food_log.jsonl"), max_entries=0)
+            racing.append({"timestamp": "2026-03-01T00:00:00", "success": True})
+            compactor = Compactor(racing)
+            held, done = threading.Event(), threading.Event()
+
+            def compaction():
+                with racing.compaction_lock():
+                    held.set()
+                    time.sleep(0.2)
+                    state = load_daily(racing.path)
+                    state["compacted_before"] = "2026-01-20"
+                    atomic_write(compactor.aggregates_path, json.dumps(state).encode('utf-8'))
+                done.set()
+
+            thread = threading.Thread(target=compaction)
+            thread.start()
+            held.wait()
+            stats = log_export.import_history(racing, iter(entries[:120]))
+            thread.join()
+            raw = racing.read()
+            if not done.is_set() or stats != {"imported": 44, "archived": 76, "skipped": 0} \
+                    or min(e["timestamp"] for e in raw) < "2026-01-20":
+                print(f"❌ Import used a stale compaction watermark: {stats}")
+                return False
+            print("✅ Import waits for a running compaction and splits on its watermark")
+
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing log export: {e}")
+        return False
+
+def test_compression():
+    """Test compression negotiation and transfer stats against the mock gateway"""
+    print("\n🧪 Testing gateway compression...")
+    
+    try:
+        import tempfile
+        import api_client
+        from config_loader import load_config
+        from mock_gateway import MockGateway
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            config = dict(load_config(), api_url=gateway.url, log_file=os.path.join(tmp, "food_log.jsonl"),
+                          compress_requests=True, compress_min_bytes=100)
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            
+            result = client.query_food_history("Hoeveel eiwit heb ik deze week gehad?")
+            sample = client.stats.recent[-1]
+            if not result.get("reply") or sample["encoding"] != "gzip" \
+                    or sample["bytes_received"] >= sample["bytes_received_raw"]:
+                print(f"❌ Response not compressed: {sample}")
+                return False
+            print("✅ Compressed response negotiated and decoded")
+            
+            client.send_message("brood met kaas, " * 60)
+            sample = client.stats.recent[-1]
+            if sample["status"] != 200 or sample["bytes_sent"] >= sample["bytes_sent_raw"]:
+                print(f"❌ Request body not compressed: {sample}")
+                return False
+            summary = client.transfer_stats()
+            if summary["requests"] != 2 or summary["bytes_received"] != gateway.stats["bytes_out"]:
+                print(f"❌ Transfer stats don't match the gateway: {summary}")
+                return False
+            print("✅ Request bodies compressed and bytes/latency counted")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing compression: {e}")
+        return False
+
+def test_error_model():
+    """Test typed gateway errors and how the bot and integration use them"""
+    print("\n🧪 Testing error model...")
+    
+    try:
+        import tempfile
+        import api_client
+        import telegram_bot
+        from config_loader import load_config
+        
+        class FakeResponse:
+            def __init__(self, status_code, headers=None):
+                self.status_code = status_code
+                self.headers = headers or {}
+                self.text = "{}"
+        
+        expected = {
+            400: api_client.InvalidRequestError, 401: api_client.AuthError,
+            402: api_client.CreditsExhaustedError, 403: api_client.ForbiddenError,
+            429: api_client.RateLimitedError, 503: api_client.ServerError,
+        }
+        for status, error_type in expected.items():
+            error = api_client.error_for_status(FakeResponse(status, {"Retry-After": "7"}))
+            if type(error) is not error_type or not isinstance(error, ValueError):
+                print(f"❌ Status {status} classified as {type(error).__name__}")
+                return False
+        limited = api_client.error_for_status(FakeResponse(429, {"Retry-After": "7"}))
+        if not limited.retryable or limited.retry_after != 7 or api_client.error_for_status(FakeResponse(401)).retryable:
+            print("❌ Retry information wrong")
+            return False
+        print("✅ Status codes map to typed, retry-aware errors")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            config = dict(load_config(), api_url="http://127.0.0.1:9/", timeout=2.0,
+                          log_file=os.path.join(tmp, "food_log.jsonl"))
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            try:
+                client.query_food_history("Wat heb ik gisteren gegeten?")
+                print("❌ Unreachable gateway did not raise")
+                return False
+            except api_client.TransportError as e:
+                if not e.retryable:
+                    print("❌ Transport error not retryable")
+                    return False
+        
+        bot = telegram_bot.DailyNutriTelegramBot.__new__(telegram_bot.DailyNutriTelegramBot)
+        bot.language = "en"
+        reply = bot._error_reply(limited)
+        if "7 seconds" not in reply or "Try again" not in reply:
+            print(f"❌ Bot reply for rate limit: {reply}")
+            return False
+        print("✅ Bot replies per error type")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing error model: {e}")
+        return False
+
+def test_profiling():
+    """Test stack sampling, cProfile output and the --profile flag"""
+    print("\n🧪 Testing profiling...")
+    
+    try:
+        import time
+        import pstats
+        import tempfile
+        import threading
+        import profiling
+        
+        argv = ["prog", "summary", "--profile=cprofile"]
+        if profiling.pop_profile_flag(argv) != "cprofile" or argv != ["prog", "summary"]:
+            print("❌ --profile flag not parsed")
+            return False
+        
+        def busy_loop(stop):
+            while not stop.is_set():
+                sum(i * i for i in range(1000))
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            stop = threading.Event()
+            worker = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+            profiler = profiling.Profiler("test", output_dir=tmp, fmt="collapsed", interval=0.001)
+            worker.start()
+            profiler.start()
+            time.sleep(0.2)
+            path = profiler.stop()
+            stop.set()
+            worker.join()
+            with open(path) as f:
+                lines = f.read().splitlines()
+            if not any(line.startswith("busy;") and "busy_loop" in line for line in lines):
+                print(f"❌ Busy thread missing from collapsed stacks: {lines[:3]}")
+                return False
+            print("✅ Sampler writes collapsed stacks per thread")
+            
+            profiler = profiling.Profiler("test", output_dir=tmp, interval=0.001)
+            profiler.toggle()
+            deadline = time.time() + 0.1
+            while time.time() < deadline:
+                sum(i * i for i in range(1000))
+            path = profiler.toggle()
+            with open(path) as f:
+                document = json.load(f)
+            if not path.endswith(".speedscope.json") or document["profiles"][0]["type"] != "sampled":
+                print("❌ Speedscope output invalid")
+                return False
+            print("✅ Toggle writes a speedscope profile")
+            
+            profiler = profiling.Profiler("test", mode="cprofile", output_dir=tmp)
+            profiler.start()
+            sum(i * i for i in range(10000))
+            path = profiler.stop()
+            if pstats.Stats(path).total_calls == 0:
+                print("❌ cProfile output empty")
+                return False
+            print("✅ cProfile output readable by pstats")
+            
+            # A resident bot (no __main__) enables profiling from the config in its constructor
+            from config_loader import get_loader
+            from telegram_bot import DailyNutriTelegramBot
+            overrides = {"DAILY_NUTRI_PROFILE": "sample", "DAILY_NUTRI_PROFILE_DIR": tmp,
+                         "DAILY_NUTRI_LOG_FILE": os.path.join(tmp, "food_log.jsonl")}
+            previous = {name: os.environ.get(name) for name in overrides}
+            os.environ.update(overrides)
+            try:
+                get_loader().reload()
+                bot = DailyNutriTelegramBot(api_key="hk_test_key")
+                second = DailyNutriTelegramBot(api_key="hk_test_key")
+                profiler = bot.profiler
+                if profiler is None or not profiler.running or second.profiler is not profiler:
+                    print("❌ Resident bot did not enable profiling from the config")
+                    return False
+                path = profiler.stop()
+                if not path or not path.startswith(tmp):
+                    print(f"❌ Resident bot profile not written: {path}")
+                    return False
+            finally:
+                profiling._enabled.pop("telegram_bot", None)
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+                get_loader().reload()
+            print("✅ Resident bot profiles when profiling is configured")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing profiling: {e}")
+        return False
+
+def test_warm_up():
+    """Test connection warm-up and pool reuse against the mock gateway"""
+    print("\n🧪 Testing warm-up...")
+    
+    try:
+        import tempfile
+        import api_client
+        from config_loader import load_config
+        from mock_gateway import MockGateway
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            config = dict(load_config(), api_url=gateway.url, log_file=os.path.join(tmp, "food_log.jsonl"),
+                          pool_size=2)
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            
+            report = client.warm_up(connections=2)
+            if not report["ready"] or report["connections"] != 2 or gateway.stats["connections"] != 2:
+                print(f"❌ Warm-up did not open the pool: {report}, {gateway.stats}")
+                return False
+            if gateway.stats["requests"] != 0:
+                print("❌ Warm-up sent a gateway message")
+                return False
+            print("✅ Warm-up resolves and pre-connects without gateway calls")
+            
+            client.query_food_history("Wat heb ik gisteren gegeten?")
+            client.query_food_history("Hoeveel eiwit deze week?")
+            if gateway.stats["connections"] != 2:
+                print(f"❌ Requests opened new connections: {gateway.stats}")
+                return False
+            print("✅ Requests reuse the warmed connections")
+            
+            config["api_url"] = "http://127.0.0.1:9/"
+            cold = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            report = cold.warm_up()
+            if report["ready"] or not report["error"]:
+                print(f"❌ Unreachable gateway reported ready: {report}")
+                return False
+            print("✅ Unreachable gateway reported as not ready")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing warm-up: {e}")
+        return False
+
+def test_meal_aggregator():
+    """Test per-chat aggregation of quick successive messages into one log"""
+    print("\n🧪 Testing meal aggregator...")
+    
+    try:
+        import time
+        import tempfile
+        import api_client
+        import telegram_bot
+        from config_loader import get_loader, load_config
+        from intent_router import IntentRouter
+        from meal_aggregator import MealAggregator, merge_parts
+        from mock_gateway import MockGateway
+        
+        merged = merge_parts(["lunch:", "broodje kaas", "en een appel."])
+        if merged != "lunch: broodje kaas en een appel":
+            print(f"❌ Parts merged as {merged!r}")
+            return False
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            config = dict(load_config(), api_url=gateway.url, log_file=os.path.join(tmp, "food_log.jsonl"))
+            bot = telegram_bot.DailyNutriTelegramBot.__new__(telegram_bot.DailyNutriTelegramBot)
+            bot.client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            bot.language = "nl"
+            bot.instant_memo = False
+            bot.router = IntentRouter()
+            
+            sent = []
+            aggregator = MealAggregator(bot, lambda chat, chunks: sent.append((chat, chunks)), window=0.3)
+            for message in ("lunch", "broodje kaas", "en een appel"):
+                if aggregator.submit(1, message) is not None:
+                    print(f"❌ Log message {message!r} answered immediately")
+                    return False
+            aggregator.submit(2, "koffie")
+            time.sleep(0.6)
+            
+            chats = sorted(chat for chat, _ in sent)
+            if chats != [1, 2] or gateway.stats["requests"] != 2:
+                print(f"❌ Expected one reply and one call per chat: {sent}, {gateway.stats}")
+                return False
+            print("✅ Quick messages merged into one call and one reply per chat")
+            
+            aggregator.submit(1, "yoghurt")
+            reply = aggregator.submit(1, "hoi")
+            if len(sent) != 3 or not reply:
+                print("❌ Non-log message did not flush the open meal first")
+                return False
+            print("✅ Other messages flush the open meal and are answered directly")
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            overrides = {"DAILY_NUTRI_API_URL": gateway.url, "DAILY_NUTRI_LOG_FILE": os.path.join(tmp, "food_log.jsonl"),
+                         "DAILY_NUTRI_AGGREGATE_WINDOW": "0.3"}
+            previous = {name: os.environ.get(name) for name in overrides}
+            os.environ.update(overrides)
+            try:
+                get_loader().reload()
+                sent = []
+                bot = telegram_bot.DailyNutriTelegramBot(api_key="hk_test_key", language="nl",
+                                                         send=lambda chat, chunks: sent.append((chat, chunks)))
+                replies = [bot.handle_chat_message(7, message) for message in ("ontbijt", "yoghurt", "met muesli")]
+                bot.close()
+                if replies != [None, None, None] or len(sent) != 1 or gateway.stats["requests"] != 1:
+                    print(f"❌ Bot did not coalesce chat messages: {replies} {sent}")
+                    return False
+                
+                # The public entry point: one resident bot per key, chat_id selects the meal
+                delivered = []
+                replies = [telegram_bot.process_telegram_message(message, api_key="hk_test_key", chat_id=8,
+                                                                 send=lambda chat, chunks: delivered.append(chat))
+                           for message in ("lunch", "broodje kaas", "en een appel")]
+                time.sleep(0.6)
+                if replies != [None, None, None] or delivered != [8] or gateway.stats["requests"] != 2:
+                    print(f"❌ process_telegram_message did not coalesce: {replies} {delivered} {gateway.stats}")
+                    return False
+                if not telegram_bot.process_telegram_message("hoi", api_key="hk_test_key", chat_id=8):
+                    print("❌ Greeting via process_telegram_message not answered directly")
+                    return False
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+                get_loader().reload()
+        print("✅ Bot coalesces fragmented chat messages into one log")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing meal aggregator: {e}")
+        return False
+
+def test_admission():
+    """Test bounded queues, load shedding and the adaptive concurrency limit"""
+    print("\n🧪 Testing admission control...")
+    
+    try:
+        import time
+        import threading
+        import tempfile
+        import api_client
+        import telegram_bot
+        from admission import AdaptiveLimit, AdmissionController, AdmissionRejected, DeferredQueue, TENANT_QUEUE_FULL
+        from config_loader import load_config
+        from mock_gateway import MockGateway
+        
+        limit = AdaptiveLimit(initial=4, maximum=8, target_latency=1.0)
+        for _ in range(40):
+            limit.observe(0.1)
+        grown = limit.limit
+        limit.observe(2.0)
+        limit.observe(2.0)  # binnen dezelfde periode: maar één keer verlagen
+        if grown != 8 or limit.limit != 5:
+            print(f"❌ AIMD limit went {grown} -> {limit.limit}")
+            return False
+        print("✅ Limit grows on fast calls and backs off once on slow ones")
+        
+        # A gateway that normally takes 8s is not overloaded; a lasting slowdown becomes the new normal
+        steady = AdaptiveLimit(initial=4, maximum=8, target_latency=5.0)
+        for _ in range(40):
+            steady.observe(8.0)
+        grown = steady.limit
+        for _ in range(30):
+            steady.observe(40.0)
+        if grown != 8 or steady.limit <= steady.minimum or steady.baseline < 20:
+            print(f"❌ Limit judged against a fixed target: {grown} -> {steady.limit}")
+            return False
+        shedding = AdaptiveLimit(initial=8, maximum=8, target_latency=5.0)
+        shedding.observe(8.0)
+        shedding.observe(8.0, overloaded=True)  # timeout, 5xx of 429
+        if shedding.limit != 5:
+            print("❌ Overload signal ignored")
+            return False
+        print("✅ Slow-but-normal gateway keeps its limit and recovers after a lasting slowdown")
+        
+        controller = AdmissionController(AdaptiveLimit(initial=1, maximum=1), max_queue=2,
+                                         max_queue_per_tenant=1, queue_timeout=2.0)
+        release = threading.Event()
+        
+        def hold():
+            with controller.admit("a"):
+                release.wait()
+        
+        holder = threading.Thread(target=hold)
+        holder.start()
+        while controller.stats()["in_flight"] == 0:
+            time.sleep(0.01)
+        waiter = threading.Thread(target=lambda: (controller.acquire("a"), controller.release(0.1)))
+        waiter.start()
+        while controller.stats()["queued"] == 0:
+            time.sleep(0.01)
+        started = time.monotonic()
+        try:
+            controller.acquire("a")
+            print("❌ Full tenant queue admitted a call")
+            return False
+        except AdmissionRejected as e:
+            if e.reason != TENANT_QUEUE_FULL or time.monotonic() - started > 0.1:
+                print(f"❌ Shedding not immediate: {e.reason}")
+                return False
+        release.set()
+        holder.join()
+        waiter.join()
+        stats = controller.stats()
+        if stats["admitted"] != 2 or stats["shed"] != 1 or stats["queue_max_ms"] <= 0:
+            print(f"❌ Admission stats wrong: {stats}")
+            return False
+        print("✅ Bounded tenant queue sheds immediately and records queue time")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            config = dict(load_config(), api_url="http://127.0.0.1:9/", log_file=os.path.join(tmp, "food_log.jsonl"))
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            client.admission = AdmissionController(AdaptiveLimit(initial=1, maximum=1), max_queue=0)
+            client.admission.in_flight = 1
+            try:
+                client.query_food_history("Wat heb ik gisteren gegeten?")
+                print("❌ Overloaded client did not refuse")
+                return False
+            except api_client.OverloadedError as e:
+                bot = telegram_bot.DailyNutriTelegramBot.__new__(telegram_bot.DailyNutriTelegramBot)
+                bot.language = "nl"
+                if not e.retryable or "druk" not in bot._error_reply(e):
+                    print("❌ Overload not reported as busy")
+                    return False
+        print("✅ Client refuses fast with OverloadedError and the bot replies busy")
+        
+        # Food logs gaan bij overbelasting in een begrensde uitgestelde wachtrij in plaats van verloren
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            config = dict(load_config(), api_url=gateway.url, log_file=os.path.join(tmp, "food_log.jsonl"))
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            client.admission = AdmissionController(AdaptiveLimit(initial=1, maximum=1), max_queue=0)
+            client.admission.in_flight = 1
+            client.deferred = DeferredQueue(max_per_tenant=1, retry_delay=0.05,
+                                            retry_on=lambda error: isinstance(error, api_client.OverloadedError))
+            bot = telegram_bot.DailyNutriTelegramBot.__new__(telegram_bot.DailyNutriTelegramBot)
+            bot.client, bot.language, bot.instant_memo = client, "nl", False
+            queued = bot.handle_log("broodje kaas")
+            full = bot.handle_log("appel")
+            if "wachtrij" not in queued or "druk" not in full or gateway.stats["requests"]:
+                print(f"❌ Overloaded log not deferred: {queued!r} / {full!r}")
+                return False
+            client.admission.in_flight = 0
+            deadline = time.monotonic() + 5
+            while client.admission_stats()["deferred"]["completed"] == 0 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            deferred = client.admission_stats()["deferred"]
+            if (deferred["completed"], deferred["rejected"], deferred["pending"]) != (1, 1, 0) \
+                    or gateway.stats["requests"] != 1 or deferred["queue_max_ms"] <= 0:
+                print(f"❌ Deferred log not sent later: {deferred}")
+                return False
+        print("✅ Overloaded logs are queued for later and only refused when that queue is full")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            config = dict(load_config(), api_url="http://127.0.0.1:9/", log_file=os.path.join(tmp, "food_log.jsonl"),
+                          rate_limit=1)
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            try:
+                client.query_food_history("Wat heb ik gisteren gegeten?")
+            except api_client.DailyNutriAPIError:
+                pass  # geen gateway; de call nam wel de enige plek van deze minuut
+            started = time.monotonic()
+            try:
+                client.query_food_history("Wat heb ik vandaag gegeten?")
+                print("❌ Rate limited call was sent")
+                return False
+            except api_client.OverloadedError as e:
+                if e.reason != "rate_limit" or time.monotonic() - started > 1.0:
+                    print(f"❌ Rate limiter blocked instead of shedding: {e.reason}")
+                    return False
+        print("✅ Rate limiter wait counts toward the queue timeout")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing admission control: {e}")
+        return False
+
+def test_transport():
+    """Test record/replay transport and the mock gateway's latency and error injection"""
+    print("\n🧪 Testing transport and mock gateway...")
+    
+    try:
+        import tempfile
+        import api_client
+        from config_loader import load_config
+        from mock_gateway import MockGateway
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            cassette = os.path.join(tmp, "gateway.jsonl")
+            base = dict(load_config(), log_file=os.path.join(tmp, "food_log.jsonl"))
+            
+            with MockGateway(latency=0.05) as gateway:
+                client = api_client.DailyNutriAPIClient(
+                    "hk_test_key", config=dict(base, api_url=gateway.url, transport="record", cassette=cassette))
+                recorded = [client.query_food_history("Wat heb ik gisteren gegeten?"),
+                            client.send_message("broodje kaas en een appel")]
+                if client.stats.recent[-1]["latency"] < 0.05:
+                    print("❌ Mock latency not applied")
+                    return False
+            with open(cassette) as f:
+                if "hk_test_key" in f.read():
+                    print("❌ API key written to the cassette")
+                    return False
+            
+            replay = api_client.DailyNutriAPIClient(
+                "hk_test_key", config=dict(base, api_url="http://127.0.0.1:9/", transport="replay", cassette=cassette,
+                                             shared_cache=False))
+            replayed = [replay.query_food_history("Wat heb ik gisteren gegeten?"),
+                        replay.send_message("broodje kaas en een appel")]
+            if replayed != recorded or not replayed[1].get("items"):
+                print("❌ Replay differs from the recording")
+                return False
+            try:
+                replay.send_message("iets wat nooit is opgenomen")
+                print("❌ Unrecorded request did not fail")
+                return False
+            except api_client.TransportError:
+                pass
+            print("✅ Recorded gateway traffic replays offline without the key")
+            
+            with MockGateway(errors={429: 1.0}, seed=1) as gateway:
+                client = api_client.DailyNutriAPIClient("hk_test_key", config=dict(base, api_url=gateway.url))
+                try:
+                    client.send_message("broodje kaas")
+                    print("❌ Injected 429 not raised")
+                    return False
+                except api_client.RateLimitedError as e:
+                    if e.retry_after != 2 or gateway.stats["statuses"] != {"429": 1}:
+                        print(f"❌ Injected 429 wrong: {e.retry_after}, {gateway.stats}")
+                        return False
+            print("✅ Mock gateway injects status codes with realistic headers")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing transport: {e}")
+        return False
+
+def test_shared_cache():
+    """Test the cross-process SQLite cache for query answers and the nutrition memo"""
+    print("\n🧪 Testing shared cache...")
+    
+    try:
+        import time
+        import tempfile
+        import subprocess
+        import api_client
+        from config_loader import load_config
+        from concurrent.futures import ThreadPoolExecutor
+        from mock_gateway import MockGateway
+        from nutrition_memo import NutritionMemo
+        from shared_cache import SharedCache
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            cache = SharedCache(path, max_entries={"query": 2})
+            cache.put("query", "a", {"reply": "A"}, tag="t1")
+            cache.put("query", "b", {"reply": "B"}, tag="t2")
+            cache.get("query", "a")
+            cache.put("query", "c", {"reply": "C"}, ttl=0.05, tag="t1")
+            if cache.get("query", "b") is not None or cache.get("query", "a") != {"reply": "A"}:
+                print("❌ LRU eviction removed the wrong entry")
+                return False
+            time.sleep(0.1)
+            if cache.get("query", "c") is not None:
+                print("❌ Expired entry returned")
+                return False
+            # Verlopen entries blijven bruikbaar als fallback tot de namespace vol is
+            if cache.get("query", "c", allow_expired=True) != {"reply": "C"}:
+                print("❌ Expired entry purged before the namespace was full")
+                return False
+            cache.put("query", "d", {"reply": "D"}, tag="t2")
+            if cache.get("query", "c", allow_expired=True) is not None or cache.get("query", "a") != {"reply": "A"}:
+                print("❌ Eviction did not drop the expired entry first")
+                return False
+            
+            # Een ander proces ziet dezelfde entries
+            script = ("import sys; sys.path.insert(0, sys.argv[1]); from shared_cache import SharedCache; "
+                      "print(SharedCache(sys.argv[2]).get('query', 'a')['reply'])")
+            output = subprocess.run([sys.executable, "-c", script, str(Path(__file__).parent), path],
+                                    capture_output=True, text=True, timeout=30).stdout.strip()
+            if output != "A":
+                print(f"❌ Other process read {output!r}")
+                return False
+            print("✅ Entries shared across processes with TTL and LRU eviction")
+            
+            # Memo hits are batched and written back atomically, so every process (here: connection) counts
+            memo_path = os.path.join(tmp, "memo.sqlite3")
+            bot_memo = NutritionMemo(cache=SharedCache(memo_path))
+            cron_memo = NutritionMemo(cache=SharedCache(memo_path))
+            bot_memo.record("t1", "appel", [{"item_name": "Appel", "calories": 52}])
+            with ThreadPoolExecutor(4) as pool:
+                list(pool.map(lambda n: (bot_memo if n % 2 else cron_memo).lookup("t1", "Appel."), range(100)))
+            bot_memo.flush_hits()
+            cron_memo.flush_hits()
+            cron_memo.record("t1", "appel", [{"item_name": "Appel", "calories": 55}])
+            entry = bot_memo.lookup("t1", "appel")
+            if entry["hits"] != 101 or entry["total_calories"] != 55:
+                print(f"❌ Memo hits not persisted across processes: {entry}")
+                return False
+            # A lookup is a plain read: it does not wait for another process's write lock
+            import sqlite3
+            writer = sqlite3.connect(memo_path, isolation_level=None)
+            writer.execute("BEGIN IMMEDIATE")
+            started = time.monotonic()
+            found = cron_memo.lookup("t1", "appel")
+            writer.execute("ROLLBACK")
+            writer.close()
+            if found is None or time.monotonic() - started > 0.5:
+                print("❌ Memo lookup waited for the write lock")
+                return False
+            print("✅ Memo hit counts shared across processes, lookups never take the write lock")
+            
+            with MockGateway() as gateway:
+                config = dict(load_config(), api_url=gateway.url, log_file=os.path.join(tmp, "food_log.jsonl"))
+                bot_client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+                cron_client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+                first = bot_client.get_today_summary()
+                second = cron_client.get_today_summary()
+                if gateway.stats["requests"] != 1 or not second.get("cached") or second["reply"] != first["reply"]:
+                    print(f"❌ Second client did not reuse the answer: {gateway.stats}")
+                    return False
+                cron_client.log_food("appel")
+                bot_client.get_today_summary()
+                if gateway.stats["requests"] != 3:
+                    print("❌ New log did not invalidate the cached answer")
+                    return False
+                if bot_client.lookup_memo("appel") is None:
+                    print("❌ Memo not shared through the cache")
+                    return False
+            print("✅ Query answers reused between clients and invalidated by new logs")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing shared cache: {e}")
+        return False
+
+def test_events():
+    """Test the event bus and the background store/metrics consumers of the integration"""
+    print("\n🧪 Testing event hooks...")
+    
+    try:
+        import time
+        import threading
+        import tempfile
+        from events import BLOCK, DROP, MEAL_LOGGED, EventBus
+        from config_loader import get_loader
+        from mock_gateway import MockGateway
+        
+        bus = EventBus(queue_size=2)
+        seen = []
+        gate = threading.Event()
+        bus.subscribe("ordered", lambda event, payload: seen.append(payload["n"]), [MEAL_LOGGED], overflow=BLOCK)
+        bus.subscribe("slow", lambda event, payload: gate.wait(5), [MEAL_LOGGED], overflow=DROP)
+        for n in range(10):
+            bus.emit(MEAL_LOGGED, {"n": n})
+        gate.set()
+        bus.flush()
+        stats = bus.stats()
+        bus.close()
+        if seen != list(range(10)):
+            print(f"❌ Events out of order or lost: {seen}")
+            return False
+        if not stats["consumers"]["slow"]["dropped"] or stats["consumers"]["ordered"]["dropped"]:
+            print(f"❌ Overflow not handled per consumer: {stats['consumers']}")
+            return False
+        print("✅ Order kept per consumer; full DROP queue counts drops, BLOCK loses nothing")
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            overrides = {"DAILY_NUTRI_API_URL": gateway.url,
+                         "DAILY_NUTRI_LOG_FILE": os.path.join(tmp, "food_log.jsonl")}
+            previous = {name: os.environ.get(name) for name in overrides}
+            os.environ.update(overrides)
+            try:
+                from openclaw_integration import OpenClawDailyNutriIntegration
+                get_loader().reload()
+                integrator = OpenClawDailyNutriIntegration(api_key="hk_test_key")
+                
+                saved = []
+                save = integrator._save_log_entry
+                
+                def slow_save(entry):
+                    time.sleep(0.3)
+                    save(entry)
+                    saved.append(entry)
+                
+                integrator._save_log_entry = slow_save
+                started = time.perf_counter()
+                result = integrator.log_from_openclaw("appel")
+                elapsed = time.perf_counter() - started
+                if result.get("status") != "success" or elapsed >= 0.3 or saved:
+                    print(f"❌ Log waited for the store ({elapsed:.2f}s, saved={len(saved)})")
+                    return False
+                integrator.query_from_openclaw("Wat at ik vandaag?")
+                history = integrator.get_log_history()
+                if len(saved) != 1 or len(history) != 1:
+                    print(f"❌ Entry not persisted after the event: {history}")
+                    return False
+                integrator.close()
+                stats = integrator.event_stats()
+                if stats["metrics"]["meals_logged"] != 1 or stats["metrics"]["queries"] != 1:
+                    print(f"❌ Metrics consumer missed events: {stats}")
+                    return False
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+                get_loader().reload()
+        print("✅ Log returns before the store write; history and metrics catch up")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing event hooks: {e}")
+        return False
+
+def test_rollup():
+    """Test the per-day rollup index and its use by totals, reports and local questions"""
+    print("\n🧪 Testing rollup index...")
+    
+    try:
+        import tempfile
+        from datetime import date, timedelta
+        from config_loader import get_loader
+        from mock_gateway import MockGateway
+        from reports import ReportEngine
+        from rollup import RollupIndex
+        
+        def entry(day, context, meal_id, calories, success=True):
+            return {"timestamp": f"{day}T12:00:00", "description": "test", "context": context,
+                    "success": success,
+                    "api_result": {"meal_id": meal_id, "items": [
+                        {"item_name": "appel", "calories": calories, "protein": 1.0}]}}
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            start = date(2025, 1, 1)
+            year = [entry((start + timedelta(days=n)).isoformat(), "lunch", n, 100) for n in range(365)]
+            extra = [entry("2025-01-01", "dinner", 1000, 50), entry("2025-01-01", None, None, 0, success=False)]
+            
+            built = RollupIndex(os.path.join(tmp, "built.sqlite3"), tenant="t1")
+            records = built.rebuild(year + extra)
+            incremental = RollupIndex(os.path.join(tmp, "incremental.sqlite3"), tenant="t1")
+            for e in year + extra + year[:3]:  # dubbele meal_ids tellen niet mee
+                incremental.add(e)
+            totals = built.get_totals(start, date(2026, 1, 1))
+            if records != 367 or totals != incremental.get_totals(start, date(2026, 1, 1)):
+                print(f"❌ Incremental and rebuilt index differ ({records} records)")
+                return False
+            if totals["calories"] != 36550 or totals["meals"] != 366 or totals["days_logged"] != 365:
+                print(f"❌ Wrong year totals: {totals}")
+                return False
+            by_context = built.get_totals("2025-01-01", "2025-01-02", group_by="context")
+            if [(g["key"], g["calories"], g["failed"]) for g in by_context["groups"]] != \
+                    [("dinner", 50, 0), ("lunch", 100, 0), ("none", 0, 1)]:
+                print(f"❌ Wrong grouping by context: {by_context['groups']}")
+                return False
+            if len(built.get_totals(start, date(2026, 1, 1), group_by="month")["groups"]) != 12:
+                print("❌ Wrong grouping by month")
+                return False
+            print("✅ A year of totals from 365 daily records; rebuild matches incremental updates")
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            log_file = os.path.join(tmp, "food_log.jsonl")
+            overrides = {"DAILY_NUTRI_API_URL": gateway.url, "DAILY_NUTRI_LOG_FILE": log_file,
+                         "DAILY_NUTRI_LOCAL_TOTALS": "1"}
+            previous = {name: os.environ.get(name) for name in overrides}
+            os.environ.update(overrides)
+            try:
+                from openclaw_integration import OpenClawDailyNutriIntegration
+                get_loader().reload()
+                integrator = OpenClawDailyNutriIntegration(api_key="hk_test_key")
+                integrator.log_from_openclaw("appel", "breakfast")
+                integrator.get_totals()  # bouwt het index op uit de bestaande log
+                integrator.log_from_openclaw("broodje kaas", "lunch")
+                today = date.today()
+                totals = integrator.get_totals(today, today + timedelta(days=1), group_by="context")
+                if totals["meals"] != 2 or [g["key"] for g in totals["groups"]] != ["breakfast", "lunch"]:
+                    print(f"❌ Logs missing from the index: {totals}")
+                    return False
+                
+                requests_before = gateway.stats["requests"]
+                answer = integrator.query_from_openclaw("Hoeveel calorieën heb ik vandaag gehad?")
+                if gateway.stats["requests"] != requests_before or f"{totals['calories']:.0f} kcal" not in answer["reply"]:
+                    print(f"❌ Totals question not answered locally: {answer}")
+                    return False
+                
+                report = ReportEngine({"t1": log_file}, workers=1).build(today, today)
+                if report[0]["total_calories"] != totals["calories"] or "Last 7 days" not in integrator.generate_weekly_report():
+                    print(f"❌ Reports disagree with the index: {report}")
+                    return False
+                integrator.close()
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+                get_loader().reload()
+        print("✅ Totals, local questions and reports read from the index")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing rollup index: {e}")
+        return False
+
+def test_local_service():
+    """Test the local JSON-RPC service and the wrapper/CLI shim"""
+    print("\n🧪 Testing local service...")
+    
+    try:
+        import time
+        import socket
+        import tempfile
+        from concurrent.futures import ThreadPoolExecutor
+        from config_loader import get_loader
+        from mock_gateway import MockGateway
+        from local_service import (IntegrationService, ServiceClient, ServiceError, ServiceUnavailable,
+                                   METHOD_NOT_FOUND, INVALID_PARAMS)
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            address = ("unix:" + os.path.join(tmp, "service.sock")) if hasattr(socket, "AF_UNIX") else "127.0.0.1:0"
+            overrides = {"DAILY_NUTRI_API_URL": gateway.url,
+                         "DAILY_NUTRI_LOG_FILE": os.path.join(tmp, "food_log.jsonl")}
+            previous = {name: os.environ.get(name) for name in list(overrides) + ["DAILY_NUTRI_SERVICE_ADDRESS"]}
+            os.environ.update(overrides)
+            try:
+                import openclaw_integration
+                get_loader().reload()
+                with IntegrationService(openclaw_integration.OpenClawDailyNutriIntegration("hk_test_key"),
+                                        address) as service:
+                    os.environ["DAILY_NUTRI_SERVICE_ADDRESS"] = service.address
+                    get_loader().reload()
+                    client = ServiceClient()
+                    client.call("health")
+                    started = time.perf_counter()
+                    for _ in range(100):
+                        client.call("health")
+                    per_call_ms = (time.perf_counter() - started) * 10
+                    if per_call_ms > 5:
+                        print(f"❌ Service call overhead {per_call_ms:.2f} ms")
+                        return False
+                    print(f"✅ Warm service call overhead {per_call_ms:.2f} ms")
+                    
+                    # De wrappers gaan via de service in plaats van een eigen integratie
+                    result = openclaw_integration.log_food_openclaw("appel", "lunch")
+                    history = client.call("history", limit=5)
+                    calls = client.call("health")["calls"]
+                    if result.get("status") != "success" or len(history) != 1 or calls.get("log") != 1:
+                        print(f"❌ Wrapper did not use the service: {result} {calls}")
+                        return False
+                    
+                    # One client shared by a thread pool; the wrappers reuse one client per process
+                    shared = openclaw_integration._shared_service_client(get_loader().get())
+                    before = client.call("health")["calls"]["health"]
+                    with ThreadPoolExecutor(8) as pool:
+                        statuses = list(pool.map(lambda _: shared.call("health")["status"], range(200)))
+                    after = client.call("health")["calls"]["health"]
+                    if statuses != ["ok"] * 200 or after - before != 201 \
+                            or openclaw_integration._shared_service_client(get_loader().get()) is not shared:
+                        print(f"❌ Shared service client not thread-safe or not reused: {after - before}")
+                        return False
+                    
+                    for method, params, code in (("drop_tables", {}, METHOD_NOT_FOUND),
+                                                 ("log", {"food": "appel"}, INVALID_PARAMS)):
+                        try:
+                            client.call(method, **params)
+                            print(f"❌ {method} did not fail")
+                            return False
+                        except ServiceError as e:
+                            if e.code != code:
+                                print(f"❌ Wrong error code for {method}: {e.code}")
+                                return False
+                    client.close()
+                
+                try:
+                    ServiceClient().call("health")
+                    print("❌ Service still reachable after stop")
+                    return False
+                except ServiceUnavailable:
+                    pass
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+                get_loader().reload()
+        print("✅ Wrappers use a running service; JSON-RPC errors and fallback work")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing local service: {e}")
+        return False
+
+def test_accounting():
+    """Test per-tenant credit accounting and budget-aware throttling"""
+    print("\n🧪 Testing credit accounting...")
+    
+    try:
+        import time
+        import tempfile
+        import api_client
+        from accounting import CreditLedger, OK, THROTTLED, EXHAUSTED, LOG, QUERY, SUMMARY
+        from config_loader import load_config
+        from mock_gateway import MockGateway
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            ledger = CreditLedger(os.path.join(tmp, "accounting.sqlite3"), "t1", costs={"log": 1},
+                                  daily_budget=10, soft_limit=0.8)
+            for _ in range(7):
+                ledger.record(LOG, success=True)
+            ledger.record(LOG, success=False)  # fouten kosten geen credits
+            states = [ledger.status()]
+            ledger.record(LOG, success=True)
+            states.append(ledger.status())
+            throttled = (ledger.allow(SUMMARY), ledger.allow(LOG))
+            ledger.record(LOG, success=True)
+            ledger.record(LOG, success=True)
+            states.append(ledger.status())
+            if states != [OK, THROTTLED, EXHAUSTED] or throttled != (False, True) or ledger.allow(LOG):
+                print(f"❌ Wrong budget states: {states} {throttled}")
+                return False
+            usage = ledger.summary()["by_kind"]["today"]["log"]
+            if usage != {"calls": 11, "errors": 1, "credits": 10}:
+                print(f"❌ Wrong usage: {usage}")
+                return False
+            print("✅ Budget moves from ok to throttled (low priority only) to exhausted")
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            config = dict(load_config(), api_url=gateway.url, log_file=os.path.join(tmp, "food_log.jsonl"),
+                          daily_credit_budget=4, budget_soft_limit=0.5, query_cache_ttl=0.05)
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            summary = client.get_today_summary()
+            client.query_food_history("Welke groenten at ik?")
+            time.sleep(0.1)
+            requests_before = gateway.stats["requests"]
+            stale = client.get_today_summary()
+            if not stale.get("stale") or stale["reply"] != summary["reply"] or gateway.stats["requests"] != requests_before:
+                print(f"❌ Throttled summary did not come from the cache: {stale}")
+                return False
+            try:
+                client.get_yesterday_food()
+                print("❌ Low-priority call allowed while throttled")
+                return False
+            except api_client.BudgetExceededError:
+                pass
+            client.log_food("appel")
+            client.query_food_history("Wat at ik vandaag?")
+            try:
+                client.log_food("peer")
+                print("❌ Call allowed over budget")
+                return False
+            except api_client.BudgetExceededError:
+                pass
+            usage = client.usage()
+            counts = {kind: totals["calls"] for kind, totals in usage["by_kind"]["today"].items()}
+            if usage["status"] != EXHAUSTED or counts != {LOG: 1, QUERY: 2, SUMMARY: 1}:
+                print(f"❌ Wrong usage after budget: {usage}")
+                return False
+            print("✅ Client serves stale answers, refuses low priority, then stops at the budget")
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway(errors="402=1") as gateway:
+            config = dict(load_config(), api_url=gateway.url, log_file=os.path.join(tmp, "food_log.jsonl"))
+            client = api_client.DailyNutriAPIClient("hk_test_key", config=config)
+            try:
+                client.log_food("appel")
+            except api_client.CreditsExhaustedError:
+                pass
+            if client.ledger.status() != EXHAUSTED or client.ledger.allow(SUMMARY) or not client.ledger.allow(LOG):
+                print("❌ 402 did not throttle low-priority work")
+                return False
+        print("✅ A 402 pauses low-priority work for the rest of the day")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing credit accounting: {e}")
+        return False
+
+def test_food_search():
+    """Test the local full-text food search and its use by the query and bot paths"""
+    print("\n🧪 Testing food search...")
+    
+    try:
+        import time
+        import tempfile
+        from datetime import date, timedelta
+        from config_loader import get_loader
+        from mock_gateway import MockGateway
+        from food_search import COUNT, LAST, FoodSearchIndex, food_question
+        
+        def entry(timestamp, description, names, meal_id, success=True):
+            return {"timestamp": timestamp, "description": description, "context": "lunch", "success": success,
+                    "api_result": {"meal_id": meal_id, "items": [{"item_name": n, "calories": 100} for n in names]}}
+        
+        questions = {
+            "Wanneer heb ik voor het laatst zalm gegeten?": (LAST, "zalm", None),
+            "Hoe vaak heb ik deze week kipfilet gegeten?": (COUNT, "kipfilet", "week"),
+            "How often did I eat pizza this month?": (COUNT, "pizza", "month"),
+            "Wann habe ich zuletzt Käse gegessen?": (LAST, "käse", None),
+            "Quand ai-je mangé des pommes pour la dernière fois ?": (LAST, "pommes", None),
+        }
+        for question, expected in questions.items():
+            parsed = food_question(question)
+            if parsed is None or (parsed.kind, parsed.food, parsed.period) != expected:
+                print(f"❌ Misread {question!r}: {parsed}")
+                return False
+        if food_question("Wanneer is de volgende update?") or food_question("Hoeveel kcal vandaag?"):
+            print("❌ Non-food question recognised as food question")
+            return False
+        print("✅ When/how-often questions recognised in NL/EN/FR/DE")
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            index = FoodSearchIndex(os.path.join(tmp, "search.sqlite3"), tenant="t1")
+            start = date(2022, 1, 1)
+            foods = ["Zalmfilet", "Kipfilet", "Räucherlachs", "Crème brûlée", "Appels", "Havermout"]
+            years = [entry(f"{start + timedelta(days=n // 3)}T{8 + n % 3 * 5:02d}:00:00", "test",
+                           [foods[n % len(foods)], "Rijst"], n) for n in range(3 * 365 * 3)]
+            years.append(entry("2025-01-01T12:00:00", "zalm", ["Zalm"], "failed", success=False))
+            if index.rebuild(years) != len(years) - 1 or index.add(years[0]):
+                print("❌ Wrong number of indexed meals")
+                return False
+            index.add(entry("2025-01-02T12:00:00", "zalm met spinazie", ["Zalm", "Spinazie"], "new"))
+            
+            expected = {"zalm": 549, "zlam": 549, "lachs": 548, "creme": 547, "brulee": 547, "appel": 547,
+                        "kipfilet rijst": 548, "pizza": 0}
+            began = time.perf_counter()
+            for text, count in expected.items():
+                result = index.search(text)
+                if result["count"] != count:
+                    print(f"❌ Search {text!r} found {result['count']} meals, expected {count}")
+                    return False
+            elapsed = (time.perf_counter() - began) * 1000
+            latest = index.search("zalm", limit=1)["matches"][0]
+            if latest["description"] != "zalm met spinazie" or latest["items"] != ["Zalm"]:
+                print(f"❌ Wrong latest match: {latest}")
+                return False
+            if index.search("zalm", "2022-01-01", "2022-01-08")["count"] != 4:
+                print("❌ Date range not applied")
+                return False
+            print(f"✅ Prefix, compound, accent and typo matches over 3 years of logs ({elapsed:.0f} ms)")
+
+            # Fuzzy and compound terms only when the word itself is not in the logs
+            index.add(entry("2025-01-03T12:00:00", "kaas", ["Kaas"], "kaas"))
+            index.add(entry("2025-01-04T12:00:00", "haas", ["Haas"], "haas"))
+            index.add(entry("2025-01-05T12:00:00", "koek", ["Eierkoek"], "eierkoek"))
+            index.add(entry("2025-01-06T12:00:00", "ontbijt", ["Ei"], "ei"))
+            counts = {text: index.search(text)["count"] for text in ("kaas", "haas", "ei", "kas")}
+            if counts != {"kaas": 1, "haas": 1, "ei": 1, "kas": 1}:
+                print(f"❌ Exact words counted look-alikes: {counts}")
+                return False
+            print("✅ Kaas does not count haas, ei does not count eierkoek")
+        
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            log_file = os.path.join(tmp, "food_log.jsonl")
+            overrides = {"DAILY_NUTRI_API_URL": gateway.url, "DAILY_NUTRI_LOG_FILE": log_file,
+                         "DAILY_NUTRI_LOCAL_FOOD_SEARCH": "1"}
+            previous = {name: os.environ.get(name) for name in overrides}
+            os.environ.update(overrides)
+            try:
+                from openclaw_integration import OpenClawDailyNutriIntegration
+                from telegram_bot import DailyNutriTelegramBot
+                get_loader().reload()
+                integrator = OpenClawDailyNutriIntegration(api_key="hk_test_key")
+                integrator.log_from_openclaw("gegrilde zalm", "dinner")
+                integrator.search_food("zalm")  # bouwt het index op uit de bestaande log
+                integrator.log_from_openclaw("zalm", "lunch")
+                
+                requests_before = gateway.stats["requests"]
+                answer = integrator.query_from_openclaw("Hoe vaak heb ik zalm gegeten?")
+                if gateway.stats["requests"] != requests_before or "2×" not in answer["reply"]:
+                    print(f"❌ Food question not answered locally: {answer}")
+                    return False
+                
+                bot = DailyNutriTelegramBot(api_key="hk_test_key", language="en")
+                reply = bot.handle_message("How often did I eat zalm?")
+                if gateway.stats["requests"] != requests_before or "2×" not in reply:
+                    print(f"❌ Bot did not use the local index: {reply}")
+                    return False
+                
+                # Een lokale misser is geen "nooit": andere apparaten loggen alleen bij de gateway
+                answer = integrator.query_from_openclaw("Wanneer heb ik voor het laatst pizza gegeten?")
+                reply = bot.handle_message("When did I last eat salmon?")
+                if gateway.stats["requests"] != requests_before + 2 or "Geen pizza" in answer["reply"] \
+                        or "No salmon" in reply:
+                    print(f"❌ Local miss answered as never eaten: {answer} {reply}")
+                    return False
+                integrator.close()
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+                get_loader().reload()
+        print("✅ Local hits answered without a gateway call, misses go to the gateway")
+        
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error testing food search: {e}")
+        return False
+
+def test_thread_safety():
+    """Test logging from a thread pool against the mock gateway"""
+    print("\n🧪 Testing thread safety...")
+
+    try:
+        import io
+        import json
+        import time
+        import tempfile
+        import threading
+        from contextlib import redirect_stdout
+        from concurrent.futures import ThreadPoolExecutor
+        from admission import AdmissionController, AdaptiveLimit
+        from concurrency import StripedCounter
+        from config_loader import get_loader
+        from mock_gateway import MockGateway
+
+        counter = StripedCounter(("logs",))
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(lambda _: [counter.add("logs") for _ in range(1000)], range(8)))
+        if counter.snapshot() != {"logs": 8000}:
+            print(f"❌ Striped counter lost updates: {counter.snapshot()}")
+            return False
+        print("✅ Striped counter adds up across threads")
+
+        threads, per_thread = 64, 5
+        expected = threads * per_thread
+        with tempfile.TemporaryDirectory() as tmp, MockGateway() as gateway:
+            overrides = {"DAILY_NUTRI_API_URL": gateway.url,
+                         "DAILY_NUTRI_LOG_FILE": os.path.join(tmp, "food_log.jsonl"),
+                         "DAILY_NUTRI_RATE_LIMIT": "0", "DAILY_NUTRI_USE_SERVICE": "0"}
+            previous = {name: os.environ.get(name) for name in overrides}
+            os.environ.update(overrides)
+            try:
+                from openclaw_integration import OpenClawDailyNutriIntegration
+                get_loader().reload()
+                integrator = OpenClawDailyNutriIntegration(api_key="hk_test_key")
+                # Eigen admission, zodat de pool niet op de wachtrij per tenant afketst
+                integrator.client.admission = AdmissionController(
+                    AdaptiveLimit(initial=8, maximum=16), max_queue=expected, max_queue_per_tenant=expected,
+                    queue_timeout=60)
+                integrator.get_totals()
+                integrator.search_food("maaltijd")  # indexen opgebouwd, consumers werken ze bij
+                barrier = threading.Barrier(threads)
+
+                def worker(number):
+                    barrier.wait()
+                    return [integrator.log_from_openclaw(f"maaltijd {number} nummer {k}", "lunch")
+                            for k in range(per_thread)]
+
+                began = time.perf_counter()
+                with redirect_stdout(io.StringIO()), ThreadPoolExecutor(threads) as pool:
+                    results = [result for batch in pool.map(worker, range(threads)) for result in batch]
+                elapsed = time.perf_counter() - began
+                integrator.flush()
+
+                entries = list(integrator.store.iter_range(None))
+                with open(integrator.client.dedup.path, 'r') as f:
+                    dedup_keys = len(json.load(f))
+                counts = {
+                    "success": sum(1 for result in results if result["status"] == "success"),
+                    "stored": len({entry["description"] for entry in entries if entry.get("success")}),
+                    "metrics": integrator.event_stats()["metrics"]["meals_logged"],
+                    "transfers": integrator.client.transfer_stats()["requests"],
+                    "booked": integrator.client.usage()["by_kind"]["today"]["log"]["calls"],
+                    "totals": integrator.get_totals()["meals"],
+                    "searchable": integrator.search_food("maaltijd")["count"],
+                    "dedup": dedup_keys,
+                }
+                integrator.close()
+            finally:
+                for name, value in previous.items():
+                    if value is None:
+                        os.environ.pop(name, None)
+                    else:
+                        os.environ[name] = value
+                get_loader().reload()
+
+        lost = {name: count for name, count in counts.items() if count != expected}
+        timestamps = [entry["timestamp"] for entry in entries]
+        if lost or len(entries) != expected or timestamps != sorted(timestamps):
+            print(f"❌ Entries lost under {threads} threads: {lost} ({len(entries)} stored)")
+            return False
+        print(f"✅ {expected} logs from {threads} threads: none lost in store, indexes, counters or dedup "
+              f"({elapsed:.1f}s)")
+
+        try:
+            integrator.client.headers = {}
+            print("❌ Request config can be replaced")
+            return False
+        except AttributeError:
+            pass
+        try:
+            integrator.client.headers["X-Extra"] = "1"
+            print("❌ Request headers can be changed")
+            return False
+        except TypeError:
+            pass
+        print("✅ Request config is a read-only snapshot")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Error testing thread safety: {e}")
+        return False
+
 def generate_test_report():
     """Generate test report"""
     print("\n" + "=" * 50)
@@ -199,7 +2012,31 @@ def generate_test_report():
         ("API Client", test_api_client_structure()),
         ("Telegram Bot", test_telegram_bot_structure()),
         ("OpenClaw Integration", test_openclaw_integration_structure()),
-        ("Setup Script", test_setup_script())
+        ("Setup Script", test_setup_script()),
+        ("Log Store", test_log_store()),
+        ("Intent Router", test_intent_router()),
+        ("Bot Templates", test_bot_templates()),
+        ("Config Loader", test_config_loader()),
+        ("Idempotency", test_idempotency()),
+        ("Nutrition Memo", test_nutrition_memo()),
+        ("Scheduler", test_scheduler()),
+        ("Bulk Reports", test_reports()),
+        ("Log Retention", test_retention()),
+        ("Log Export", test_log_export()),
+        ("Compression", test_compression()),
+        ("Error Model", test_error_model()),
+        ("Profiling", test_profiling()),
+        ("Warm-up", test_warm_up()),
+        ("Meal Aggregator", test_meal_aggregator()),
+        ("Admission Control", test_admission()),
+        ("Transport", test_transport()),
+        ("Shared Cache", test_shared_cache()),
+        ("Event Hooks", test_events()),
+        ("Rollup Index", test_rollup()),
+        ("Local Service", test_local_service()),
+        ("Credit Accounting", test_accounting()),
+        ("Food Search", test_food_search()),
+        ("Thread Safety", test_thread_safety())
     ]
     
     passed = sum(1 for _, result in tests if result)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+DailyNutri Transport
+Verwisselbare HTTP laag voor de API client: live (requests), opnemen naar een
+cassette of afspelen uit een cassette, voor reproduceerbare tests zonder gateway
+"""
+
+import os
+import gzip
+import json
+import time
+import threading
+import requests
+from collections import deque
+from typing import Dict, Mapping, Optional
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib.parse import urlsplit
+
+MODES = ("http", "record", "replay")
+
+# Response headers die in een cassette bewaard blijven (body staat er uitgepakt in)
+_KEEP_HEADERS = ("Content-Type", "Retry-After", "Allow")
+
+
+class SessionTransport:
+    """Live transport: requests.Session met een pool van `pool_size` keep-alive verbindingen"""
+
+    def __init__(self, pool_size: int = 4):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def send(self, method: str, url: str, headers: Dict = None, body: bytes = None,
+             timeout: float = None, stream: bool = False) -> requests.Response:
+        """
+        Verstuur een request; netwerkfouten komen als requests excepties
+
+        Met `stream` blijft de verbinding bezet tot de body gelezen is.
+        """
+        return self.session.request(method, url, headers=headers, data=body, timeout=timeout, stream=stream)
+
+
+def _message_of(body: Optional[bytes], headers: Mapping) -> Optional[str]:
+    """Het bericht uit een (eventueel gzip) JSON body, als sleutel voor de cassette"""
+    if not body:
+        return None
+    if (headers or {}).get("Content-Encoding") == "gzip":
+        body = gzip.decompress(body)
+    try:
+        return json.loads(body).get("message")
+    except (ValueError, AttributeError):
+        return None
+
+
+def _build_response(method: str, url: str, recorded: Dict) -> requests.Response:
+    """requests.Response uit een opgenomen response"""
+    content = recorded.get("body", "").encode('utf-8')
+    response = requests.Response()
+    response.status_code = recorded["status"]
+    response.headers = CaseInsensitiveDict(recorded.get("headers") or {})
+    response.headers["Content-Length"] = str(len(content))
+    response._content = content
+    response.encoding = "utf-8"
+    response.url = url
+    response.request = requests.Request(method, url).prepare()
+    return response
+
+
+class RecordingTransport:
+    """
+    Stuurt door naar een ander transport en schrijft elke interactie naar een cassette
+
+    De cassette is JSONL: per regel method, pad, bericht, status, body, een paar
+    headers en de latency (of de fout: timeout/connection). API keys en
+    andere request headers worden niet bewaard.
+    """
+
+    def __init__(self, inner, path: str):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def send(self, method: str, url: str, headers: Dict = None, body: bytes = None,
+             timeout: float = None, stream: bool = False) -> requests.Response:
+        interaction = {
+            "method": method,
+            "path": urlsplit(url).path,
+            "message": _message_of(body, headers),
+        }
+        started = time.perf_counter()
+        try:
+            response = self.inner.send(method, url, headers=headers, body=body, timeout=timeout, stream=stream)
+        except requests.exceptions.Timeout:
+            interaction.update(error="timeout", latency=round(time.perf_counter() - started, 4))
+            self._append(interaction)
+            raise
+        except requests.exceptions.ConnectionError:
+            interaction.update(error="connection", latency=round(time.perf_counter() - started, 4))
+            self._append(interaction)
+            raise
+        interaction.update(
+            status=response.status_code,
+            headers={name: response.headers[name] for name in _KEEP_HEADERS if name in response.headers},
+            body=response.text,
+            latency=round(time.perf_counter() - started, 4),
+        )
+        self._append(interaction)
+        return response
+
+    def _append(self, interaction: Dict):
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(interaction, ensure_ascii=False) + "\n")
+
+
+class ReplayTransport:
+    """
+    Speelt een cassette af zonder netwerk
+
+    Requests worden gematcht op method en bericht; meerdere opnames van
+    hetzelfde bericht komen in volgorde terug (de laatste blijft herhalen).
+    Met `replay_latency` wacht elk antwoord zo lang als bij de opname, zodat
+    ook latency experimenten reproduceerbaar zijn.
+    """
+
+    def __init__(self, path: str, replay_latency: bool = False):
+        self.path = path
+        self.replay_latency = replay_latency
+        self._lock = threading.Lock()
+        self._interactions: Dict[tuple, deque] = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                key = (interaction["method"], interaction.get("message"))
+                self._interactions.setdefault(key, deque()).append(interaction)
+
+    def send(self, method: str, url: str, headers: Dict = None, body: bytes = None,
+             timeout: float = None, stream: bool = False) -> requests.Response:
+        key = (method, _message_of(body, headers))
+        with self._lock:
+            queue = self._interactions.get(key)
+            if not queue and method == "OPTIONS":
+                # Warm-up zonder opname: er is geen verbinding om op te warmen
+                return _build_response(method, url, {"status": 204})
+            if not queue:
+                raise requests.exceptions.ConnectionError(
+                    f"Geen opname in {self.path} voor {method} {key[1]!r}")
+            interaction = queue.popleft() if len(queue) > 1 else queue[0]
+
+        if self.replay_latency:
+            time.sleep(min(interaction.get("latency", 0), timeout or float("inf")))
+        if interaction.get("error") == "timeout":
+            raise requests.exceptions.Timeout(f"Opgenomen timeout voor {key[1]!r}")
+        if interaction.get("error"):
+            raise requests.exceptions.ConnectionError(f"Opgenomen verbindingsfout voor {key[1]!r}")
+        return _build_response(method, url, interaction)
+
+
+def create_transport(config: Mapping, pool_size: int = 4):
+    """
+    Transport volgens de config: `transport` = http, record of replay, met `cassette` als pad
+
+    Raises:
+        ValueError: Onbekende mode of record/replay zonder cassette
+    """
+    mode = config.get("transport") or "http"
+    if mode not in MODES:
+        raise ValueError(f"Transport moet een van {', '.join(MODES)} zijn, niet {mode!r}")
+    if mode == "http":
+        return SessionTransport(pool_size)
+    cassette = config.get("cassette")
+    if not cassette:
+        raise ValueError(f"Transport {mode} vereist een cassette (DAILY_NUTRI_CASSETTE)")
+    if mode == "record":
+        return RecordingTransport(SessionTransport(pool_size), cassette)
+    return ReplayTransport(cassette, replay_latency=bool(config.get("replay_latency")))